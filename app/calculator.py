@@ -2,114 +2,63 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import date
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 from .config import IncentivosConfig
-from .utils import normalize_int, normalize_list_value, parse_iso_date
-
-
-@dataclass
-class BarResult:
-    slot: int
-    codigo: Optional[int]
-    paga: Optional[bool]
-    monto: Optional[int]
-    error: Optional[str]
-    missing: bool = False
-
-
-def _get_cf(custom_fields: Dict[str, Any], key: str) -> Any:
-    # En tu cuenta: keys suelen ser nombres. Igual soportamos IDs por si acaso.
-    return custom_fields.get(key) or custom_fields.get(str(key))
+from .deal_memo import DealMemo
+from .deal_record import Deal, deal_fecha, deal_fields
+from .metrics import CALC_SECONDS
+from .rules import BarResult, RulePlan, get_plan
 
 
 def calc_bar(slot: int, cfg: IncentivosConfig, custom_fields: Dict[str, Any]) -> BarResult:
-    r = cfg.bars[str(slot)]
-    raw = _get_cf(custom_fields, r.field_id)
-
-    raw_id, raw_label = normalize_list_value(raw)
-    raw_int = normalize_int(raw_id or raw_label)
-
-    if raw_int is None:
-        # Regla solicitada: si falta BAR en un deal, no se "cancela" el deal.
-        # Simplemente se omite este BAR del conteo/suma.
-        return BarResult(slot=slot, codigo=None, paga=None, monto=None, error=None, missing=True)
-
-    if slot in (4, 5, 6) and not cfg.extras_enabled:
-        # Extras apagados => no cuentan para monto
-        return BarResult(slot=slot, codigo=raw_int, paga=False, monto=0, error=None)
+    return get_plan(cfg).bars[slot - 1].evaluate(custom_fields)
 
-    # Regla solicitada (última): los montos reales son el MISMO código en pesos.
-    # - Si viene el código mínimo (ej 1,2,3,4,5,6) => monto = ese código (pesos)
-    # - Si viene el código máximo (ej 8001,5002,...) => monto = ese código (pesos)
-    # - Si el campo no viene / null => missing (se omite del conteo y suma)
-    max_values = r.max_values or [r.max]
-    if raw_int in max_values:
-        return BarResult(slot=slot, codigo=raw_int, paga=True, monto=raw_int, error=None)
 
-    if raw_int == r.min:
-        return BarResult(slot=slot, codigo=raw_int, paga=False, monto=raw_int, error=None)
-
-    return BarResult(
-        slot=slot,
-        codigo=raw_int,
-        paga=None,
-        monto=None,
-        error=f"Valor inválido (esperado {r.min} o {r.max})",
-    )
+def get_collaborators(cfg: IncentivosConfig, custom_fields: Dict[str, Any]) -> Dict[str, Dict[str, Optional[str]]]:
+    return get_plan(cfg).collaborators(custom_fields)
 
 
-def get_collaborators(cfg: IncentivosConfig, custom_fields: Dict[str, Any]) -> Dict[str, Dict[str, Optional[str]]]:
-    out: Dict[str, Dict[str, Optional[str]]] = {}
-    for role, fid in cfg.collaborator_field_ids.items():
-        raw = _get_cf(custom_fields, fid)
-        oid, label = normalize_list_value(raw)
-        out[role] = {"id": oid, "label": label or oid}
-    return out
+def deal_fecha_cirugia(cfg: IncentivosConfig, deal: Deal) -> Optional[date]:
+    return deal_fecha(get_plan(cfg), deal)
 
 
-def calc_deal(cfg: IncentivosConfig, deal: Dict[str, Any]) -> Dict[str, Any]:
-    cf = deal.get("custom_fields") or {}
+def calc_deal(cfg: IncentivosConfig, deal: Deal) -> Dict[str, Any]:
+    """Detalle de un deal (payload de Sell o DealRecord)."""
+    with CALC_SECONDS.time("calc_deal"):
+        plan = get_plan(cfg)
+        return _calc_deal(plan, deal, deal_fecha(plan, deal))
 
-    fecha_cirugia = parse_iso_date(_get_cf(cf, cfg.fecha_cirugia_field_id))
-    errors: List[str] = []
-    if fecha_cirugia is None:
-        errors.append(f"Falta fecha_cirugia (campo '{cfg.fecha_cirugia_field_id}')")
 
-    bars: Dict[str, Any] = {}
+def _eval_bars(
+    plan: RulePlan, codes: Sequence[Optional[int]]
+) -> Tuple[List[BarResult], Dict[str, int], List[str]]:
+    results: List[BarResult] = []
     slot_totals: Dict[str, int] = {}
-
-    for slot in range(1, 7):
-        br = calc_bar(slot, cfg, cf)
-        bars[str(slot)] = {
-            "codigo": br.codigo,
-            "paga": br.paga,
-            "monto": br.monto,
-            "error": br.error,
-            "missing": br.missing,
-        }
+    errors: List[str] = []
+    for bar, code in zip(plan.bars, codes):
+        br = bar.evaluate_code(code)
+        results.append(br)
         if br.error:
-            errors.append(f"BAR{slot}: {br.error}")
+            errors.append(f"BAR{bar.slot}: {br.error}")
         if br.monto is not None:
-            slot_totals[str(slot)] = int(br.monto)
+            slot_totals[str(bar.slot)] = int(br.monto)
+    return results, slot_totals, errors
 
-    collaborators = get_collaborators(cfg, cf)
 
+def _person_totals(
+    plan: RulePlan, collaborators: Dict[str, Dict[str, Optional[str]]], slot_totals: Dict[str, int]
+) -> Dict[str, Dict[str, Any]]:
     # Pago por rol
     person_totals: Dict[str, Dict[str, Any]] = {}
-    role_to_slots = {
-        "c1": ("1", "4"),
-        "c2": ("2", "5"),
-        "c3": ("3", "6"),
-    }
 
-    for role, (s_base, s_extra) in role_to_slots.items():
+    for role, s_base, s_extra in plan.role_slots:
         person = collaborators.get(role) or {"id": None, "label": None}
         pid = person.get("id") or role
         label = person.get("label")
 
-        base = int(slot_totals.get(s_base) or 0)
-        extra = int(slot_totals.get(s_extra) or 0)
+        base = slot_totals.get(s_base) or 0
+        extra = slot_totals.get(s_extra) or 0
 
         if pid not in person_totals:
             person_totals[pid] = {"label": label or pid, "base": 0, "extra": 0, "total": 0, "roles": []}
@@ -118,6 +67,40 @@ def calc_deal(cfg: IncentivosConfig, deal: Dict[str, Any]) -> Dict[str, Any]:
         person_totals[pid]["extra"] += extra
         person_totals[pid]["total"] += base + extra
         person_totals[pid]["roles"].append(role)
+    return person_totals
+
+
+@dataclass(slots=True)
+class BarDetail:
+    """Un BAR en el detalle de `calc_deal` (mismo JSON que el dict de antes, sin armar el dict)."""
+
+    codigo: Optional[int]
+    paga: Optional[bool]
+    monto: Optional[int]
+    error: Optional[str]
+    missing: bool
+
+
+@dataclass(slots=True)
+class DealErrors:
+    """Entrada de auditoría de `deal_errors` en los resultados mensuales."""
+
+    deal_id: Any
+    errors: Tuple[str, ...]
+
+
+def _calc_deal(plan: RulePlan, deal: Deal, fecha_cirugia: Optional[date]) -> Dict[str, Any]:
+    codes, collaborators = deal_fields(plan, deal)
+
+    results, slot_totals, bar_errors = _eval_bars(plan, codes)
+    errors: List[str] = [plan.missing_fecha_error] if fecha_cirugia is None else []
+    errors.extend(bar_errors)
+
+    bars: Dict[str, BarDetail] = {
+        str(br.slot): BarDetail(br.codigo, br.paga, br.monto, br.error, br.missing) for br in results
+    }
+
+    person_totals = _person_totals(plan, collaborators, slot_totals)
 
     return {
         "deal_id": deal.get("id"),
@@ -133,75 +116,457 @@ def calc_deal(cfg: IncentivosConfig, deal: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+# Estado de un BAR dentro del aporte de un deal => contador de counts_by_slot
+BAR_MISSING, BAR_INVALID, BAR_PAGA, BAR_NO_PAGA, BAR_OTHER = range(5)
+_COUNT_KEYS = ("missing", "invalid", "pagados", "no_pagados", None)
+
+
+class DealContribution:
+    """Aporte compacto de un deal a los agregados de su mes.
+
+    - bars: ((slot, estado, monto), ...) con estado BAR_*
+    - persons: ((pid, label, base, extra, total), ...)
+    - errors: mensajes de auditoría del deal
+
+    Se crea sólo con la fecha (pre-filtro) y se evalúa completo recién cuando
+    el deal cae dentro de un mes pedido (`evaluated`).
+    """
+
+    __slots__ = ("deal_id", "fecha", "bars", "persons", "errors")
+
+    def __init__(self, deal_id: Any, fecha: Optional[date]):
+        self.deal_id = deal_id
+        self.fecha = fecha
+        self.bars: Optional[Tuple[Tuple[str, int, int], ...]] = None
+        self.persons: Tuple[Tuple[str, Any, int, int, int], ...] = ()
+        self.errors: Tuple[str, ...] = ()
+
+    @property
+    def evaluated(self) -> bool:
+        return self.bars is not None
+
+    def evaluate(self, plan: RulePlan, deal: Deal) -> "DealContribution":
+        return self.evaluate_parsed(plan, *deal_fields(plan, deal))
+
+    def evaluate_parsed(
+        self,
+        plan: RulePlan,
+        codes: Sequence[Optional[int]],
+        collaborators: Dict[str, Dict[str, Optional[str]]],
+    ) -> "DealContribution":
+        """Evalúa las reglas de `plan` sobre campos ya parseados (códigos BAR y colaboradores).
+
+        Sirve para evaluar varias configs sobre el mismo deal parseando una sola vez.
+        """
+        bars = []
+        slot_totals: Dict[str, int] = {}
+        errors = [plan.missing_fecha_error] if self.fecha is None else []
+        for bar, code in zip(plan.bars, codes):
+            br = bar.evaluate_code(code)
+            state = _bar_state(br)
+            if state == BAR_INVALID:
+                errors.append(f"BAR{bar.slot}: {br.error}")
+            if br.monto is not None:
+                slot_totals[str(br.slot)] = int(br.monto)
+            bars.append((str(br.slot), state, int(br.monto or 0)))
+
+        person_totals = _person_totals(plan, collaborators, slot_totals)
+        self.persons = tuple(
+            (pid, p["label"], p["base"], p["extra"], p["total"]) for pid, p in person_totals.items()
+        )
+        self.errors = tuple(errors)
+        self.bars = tuple(bars)
+        return self
+
+    @classmethod
+    def from_detail(cls, detail: Dict[str, Any], fecha: Optional[date]) -> "DealContribution":
+        """Aporte armado desde un resultado de `calc_deal`, sin volver a evaluar las reglas."""
+        c = cls(detail["deal_id"], fecha)
+        c.bars = tuple((slot, _bar_state(b), int(b.monto or 0)) for slot, b in detail["bars"].items())
+        c.persons = tuple(
+            (pid, p["label"], p["base"], p["extra"], p["total"]) for pid, p in detail["person_totals"].items()
+        )
+        c.errors = tuple(detail["errors"])
+        return c
+
+
+def _bar_state(br: Union[BarResult, BarDetail]) -> int:
+    if br.missing:
+        return BAR_MISSING
+    if br.error:
+        return BAR_INVALID
+    if br.paga is True:
+        return BAR_PAGA
+    if br.paga is False:
+        return BAR_NO_PAGA
+    return BAR_OTHER
+
+
+def deal_contribution(plan: RulePlan, deal: Deal, memo: Optional[DealMemo] = None) -> DealContribution:
+    """Aporte (posiblemente sin evaluar) de un deal, reutilizando el memo si aplica."""
+    key = None
+    if memo is not None:
+        did = deal.get("id")
+        updated_at = deal.get("updated_at")
+        if did is not None and updated_at:
+            key = (did, updated_at, plan.config_hash)
+            found = memo.get(key)
+            if found is not None:
+                return found
+
+    c = DealContribution(deal.get("id"), deal_fecha(plan, deal))
+    if key is not None:
+        memo.put(key, c)
+    return c
+
+
 def month_bounds(year: int, month: int) -> Tuple[date, date]:
     start = date(year, month, 1)
     end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
     return start, end
 
 
-def calc_month(cfg: IncentivosConfig, deals: List[Dict[str, Any]], year: int, month: int) -> Dict[str, Any]:
-    start, end = month_bounds(year, month)
-
-    totals_by_slot = {str(i): 0 for i in range(1, 7)}
-    counts_by_slot = {str(i): {"pagados": 0, "no_pagados": 0, "missing": 0, "invalid": 0} for i in range(1, 7)}
-
-    totals_by_person: Dict[str, Dict[str, Any]] = {}
-
-    processed = 0
-    month_matched = 0
-    deal_errors: List[Dict[str, Any]] = []
-
-    for deal in deals:
-        processed += 1
-        d = calc_deal(cfg, deal)
-
-        fc = parse_iso_date(d.get("fecha_cirugia"))
-        if fc is None or not (start <= fc < end):
-            continue
-        month_matched += 1
+class MonthAggregator:
+    """Agrega deals a los totales de un mes a medida que llegan (página a página).
+
+    Mantiene sólo los agregados y un set de ids ya vistos (dedupe incremental),
+    no la lista de deals ni los resultados por deal. `result()` devuelve el mismo
+    esquema que `calc_month`. Con `audit=False` no se guarda `deal_errors` (queda vacío).
+    """
+
+    def __init__(
+        self,
+        cfg: IncentivosConfig,
+        year: int,
+        month: int,
+        dedupe: bool = True,
+        memo: Optional[DealMemo] = None,
+        audit: bool = True,
+    ):
+        self.cfg = cfg
+        self.plan = get_plan(cfg)
+        self.memo = memo
+        self.year = year
+        self.month = month
+        self.start, self.end = month_bounds(year, month)
+
+        self.totals_by_slot = {str(i): 0 for i in range(1, 7)}
+        self.counts_by_slot = {
+            str(i): {"pagados": 0, "no_pagados": 0, "missing": 0, "invalid": 0} for i in range(1, 7)
+        }
+        self.totals_by_person: Dict[str, Dict[str, Any]] = {}
+
+        self.processed = 0
+        self.month_matched = 0
+        # Auditoría en orden de llegada, como calc_month (un deal repetido aparece dos
+        # veces); la clave es un correlativo y `_error_ids` lleva deal_id -> correlativo
+        # para que `remove` la quite en O(1)
+        self._deal_errors: Dict[int, DealErrors] = {}
+        self._error_ids: Dict[Any, int] = {}
+        self._error_seq = 0
+        self.audit = audit
+
+        self._seen: Optional[set] = set() if dedupe else None
+
+    @property
+    def deal_errors(self) -> List[DealErrors]:
+        return list(self._deal_errors.values())
+
+    def add_errors(self, deal_id: Any, errors: Tuple[str, ...]) -> None:
+        """Agrega una entrada al final de `deal_errors`."""
+        seq = self._error_seq
+        self._error_seq += 1
+        self._deal_errors[seq] = DealErrors(deal_id, errors)
+        if deal_id is not None:
+            self._error_ids[deal_id] = seq
+
+    def _repeated(self, deal: Deal) -> bool:
+        did = deal.get("id")
+        if did is None:
+            return False
+        if did in self._seen:
+            return True
+        self._seen.add(did)
+        return False
+
+    def add(self, deal: Deal) -> bool:
+        """Agrega un deal (payload o DealRecord). Devuelve True si cae dentro del mes."""
+        if self._seen is not None and self._repeated(deal):
+            return False
+
+        self.processed += 1
+        # Pre-filtro barato: sólo la fecha; los deals fuera del mes no se evalúan.
+        c = deal_contribution(self.plan, deal, self.memo)
+        fc = c.fecha
+        if fc is None or not (self.start <= fc < self.end):
+            return False
+        if not c.evaluated:
+            c.evaluate(self.plan, deal)
+        self.apply(c)
+        return True
+
+    def add_detail(self, deal: Deal) -> Optional[Dict[str, Any]]:
+        """Como `add`, pero devuelve el detalle `calc_deal` del deal si cae dentro del mes.
+
+        Las reglas se evalúan una sola vez: el aporte al mes sale del mismo detalle.
+        """
+        if self._seen is not None and self._repeated(deal):
+            return None
+
+        self.processed += 1
+        fc = deal_fecha(self.plan, deal)
+        if fc is None or not (self.start <= fc < self.end):
+            return None
+        detail = _calc_deal(self.plan, deal, fc)
+        self.apply(DealContribution.from_detail(detail, fc))
+        return detail
+
+    def apply(self, c: DealContribution) -> None:
+        """Suma el aporte de un deal que ya se sabe dentro del mes."""
+        self.month_matched += 1
 
         # Regla solicitada: si falta un BAR, se suman solo los que existan.
         # Si hay valores inválidos, se reporta en auditoría pero no se pierde el resto del deal.
-        if d["errors"]:
-            deal_errors.append({"deal_id": d["deal_id"], "errors": d["errors"]})
-
-        for slot in range(1, 7):
-            slot_s = str(slot)
-            b = d["bars"][slot_s]
-            if b.get("missing"):
-                counts_by_slot[slot_s]["missing"] += 1
-                continue
-            if b.get("error"):
-                counts_by_slot[slot_s]["invalid"] += 1
+        if c.errors and self.audit:
+            self.add_errors(c.deal_id, c.errors)
+
+        for slot_s, state, monto in c.bars or ():
+            if state == BAR_MISSING or state == BAR_INVALID:
+                self.counts_by_slot[slot_s][_COUNT_KEYS[state]] += 1
                 continue
             # Existe y es válido
-            totals_by_slot[slot_s] += int(b["monto"] or 0)
-            if b["paga"] is True:
-                counts_by_slot[slot_s]["pagados"] += 1
-            elif b["paga"] is False:
-                counts_by_slot[slot_s]["no_pagados"] += 1
-
-        for pid, pdata in d["person_totals"].items():
-            if pid not in totals_by_person:
-                totals_by_person[pid] = {
-                    "label": pdata.get("label") or pid,
-                    "base": 0,
-                    "extra": 0,
-                    "total": 0,
-                    "deals": 0,
+            self.totals_by_slot[slot_s] += monto
+            if state != BAR_OTHER:
+                self.counts_by_slot[slot_s][_COUNT_KEYS[state]] += 1
+
+        for pid, label, base, extra, total in c.persons:
+            tp = self.totals_by_person.get(pid)
+            if tp is None:
+                tp = self.totals_by_person[pid] = {"label": label or pid, "base": 0, "extra": 0, "total": 0, "deals": 0}
+            tp["base"] += base
+            tp["extra"] += extra
+            tp["total"] += total
+            tp["deals"] += 1
+
+    def remove(self, c: DealContribution) -> None:
+        """Resta un aporte previamente sumado con `apply` (O(1) por deal)."""
+        self.month_matched -= 1
+        if c.errors:
+            seq = self._error_ids.pop(c.deal_id, None)
+            if seq is not None:
+                self._deal_errors.pop(seq, None)
+
+        for slot_s, state, monto in c.bars or ():
+            if state == BAR_MISSING or state == BAR_INVALID:
+                self.counts_by_slot[slot_s][_COUNT_KEYS[state]] -= 1
+                continue
+            self.totals_by_slot[slot_s] -= monto
+            if state != BAR_OTHER:
+                self.counts_by_slot[slot_s][_COUNT_KEYS[state]] -= 1
+
+        for pid, _label, base, extra, total in c.persons:
+            tp = self.totals_by_person[pid]
+            tp["deals"] -= 1
+            if tp["deals"] == 0:
+                # Sin deals en el mes: la persona desaparece, igual que en un recálculo completo
+                del self.totals_by_person[pid]
+                continue
+            tp["base"] -= base
+            tp["extra"] -= extra
+            tp["total"] -= total
+
+    def add_many(self, deals: Iterable[Deal]) -> None:
+        for deal in deals:
+            self.add(deal)
+
+    def merge_result(self, part: Dict[str, Any]) -> None:
+        """Suma un resultado parcial (`result()` de otro trozo de deals del mismo mes).
+
+        Mezclar los trozos en el orden original da exactamente el `calc_month`
+        serial: personas y auditoría quedan en orden de primera aparición.
+        `processed_deals` no se toca (lo fija quien reparte los trozos).
+        """
+        self.month_matched += part["month_matched_deals"]
+        for slot_s, total in part["totals_by_slot"].items():
+            self.totals_by_slot[slot_s] += total
+            for k, n in part["counts_by_slot"][slot_s].items():
+                self.counts_by_slot[slot_s][k] += n
+        for pid, pdata in part["totals_by_person"].items():
+            tp = self.totals_by_person.get(pid)
+            if tp is None:
+                tp = self.totals_by_person[pid] = {
+                    "label": pdata["label"], "base": 0, "extra": 0, "total": 0, "deals": 0
                 }
-            totals_by_person[pid]["base"] += int(pdata.get("base") or 0)
-            totals_by_person[pid]["extra"] += int(pdata.get("extra") or 0)
-            totals_by_person[pid]["total"] += int(pdata.get("total") or 0)
-            totals_by_person[pid]["deals"] += 1
+            for k in ("base", "extra", "total", "deals"):
+                tp[k] += pdata[k]
+        for entry in part["deal_errors"]:
+            self.add_errors(entry.deal_id, tuple(entry.errors))
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "month": f"{self.year:04d}-{self.month:02d}",
+            "window": {"start": self.start.isoformat(), "end_exclusive": self.end.isoformat()},
+            "processed_deals": self.processed,
+            "month_matched_deals": self.month_matched,
+            "totals_by_slot": self.totals_by_slot,
+            "counts_by_slot": self.counts_by_slot,
+            "totals_by_person": self.totals_by_person,
+            "deal_errors": self.deal_errors,
+        }
 
-    return {
-        "month": f"{year:04d}-{month:02d}",
-        "window": {"start": start.isoformat(), "end_exclusive": end.isoformat()},
-        "processed_deals": processed,
-        "month_matched_deals": month_matched,
-        "totals_by_slot": totals_by_slot,
-        "counts_by_slot": counts_by_slot,
-        "totals_by_person": totals_by_person,
-        "deal_errors": deal_errors,
-    }
+
+def calc_month(
+    cfg: IncentivosConfig,
+    deals: Iterable[Deal],
+    year: int,
+    month: int,
+    memo: Optional[DealMemo] = None,
+) -> Dict[str, Any]:
+    with CALC_SECONDS.time("calc_month"):
+        agg = MonthAggregator(cfg, year, month, dedupe=False, memo=memo)
+        agg.add_many(deals)
+        return agg.result()
+
+
+def iter_months(start: Tuple[int, int], end: Tuple[int, int]) -> Iterator[Tuple[int, int]]:
+    """(year, month) desde `start` hasta `end`, ambos inclusive."""
+    year, month = start
+    while (year, month) <= end:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class RangeAggregator:
+    """Agrega un rango de meses en UNA pasada: cada deal se evalúa una vez y se
+    asigna al mes de su fecha_cirugia.
+
+    Cada mes de `result()["months"]` es idéntico a `calc_month` sobre el mismo
+    snapshot (incluido `processed_deals`, que cuenta todos los deals procesados).
+    Con `sparse=True` sólo se crean (y se devuelven) los meses que reciben algún deal.
+    """
+
+    def __init__(
+        self,
+        cfg: IncentivosConfig,
+        start: Tuple[int, int],
+        end: Tuple[int, int],
+        dedupe: bool = True,
+        memo: Optional[DealMemo] = None,
+        sparse: bool = False,
+    ):
+        if start > end:
+            raise ValueError("Rango inválido: from > to")
+        self.cfg = cfg
+        self.plan = get_plan(cfg)
+        self.memo = memo
+        self.start = start
+        self.end = end
+        self.sparse = sparse
+        self.months: Dict[Tuple[int, int], MonthAggregator] = (
+            {} if sparse else {ym: MonthAggregator(cfg, *ym, dedupe=False) for ym in iter_months(start, end)}
+        )
+        self.processed = 0
+        self._seen: Optional[set] = set() if dedupe else None
+
+    def add(self, deal: Deal) -> bool:
+        if self._seen is not None:
+            did = deal.get("id")
+            if did is not None:
+                if did in self._seen:
+                    return False
+                self._seen.add(did)
+
+        self.processed += 1
+        c = deal_contribution(self.plan, deal, self.memo)
+        fc = c.fecha
+        if fc is None:
+            return False
+        ym = (fc.year, fc.month)
+        agg = self.months.get(ym)
+        if agg is None:
+            if not self.sparse or not (self.start <= ym <= self.end):
+                return False
+            try:
+                agg = self.months[ym] = MonthAggregator(self.cfg, *ym, dedupe=False)
+            except ValueError:
+                # 9999-12: el fin del mes no es una fecha representable; queda fuera como sin fecha
+                return False
+        if not c.evaluated:
+            c.evaluate(self.plan, deal)
+        agg.apply(c)
+        return True
+
+    def add_many(self, deals: Iterable[Deal]) -> None:
+        for deal in deals:
+            self.add(deal)
+
+    def result(self) -> Dict[str, Any]:
+        months: Dict[str, Dict[str, Any]] = {}
+        totals_by_slot = {str(i): 0 for i in range(1, 7)}
+        counts_by_slot = {
+            str(i): {"pagados": 0, "no_pagados": 0, "missing": 0, "invalid": 0} for i in range(1, 7)
+        }
+        totals_by_person: Dict[str, Dict[str, Any]] = {}
+        month_matched = 0
+        deal_errors_count = 0
+
+        for _ym, agg in sorted(self.months.items()):
+            agg.processed = self.processed
+            out = agg.result()
+            months[out["month"]] = out
+
+            month_matched += agg.month_matched
+            deal_errors_count += len(agg.deal_errors)
+            for slot_s, total in agg.totals_by_slot.items():
+                totals_by_slot[slot_s] += total
+                for k, n in agg.counts_by_slot[slot_s].items():
+                    counts_by_slot[slot_s][k] += n
+            for pid, pdata in agg.totals_by_person.items():
+                if pid not in totals_by_person:
+                    totals_by_person[pid] = {"label": pdata["label"], "base": 0, "extra": 0, "total": 0, "deals": 0}
+                for k in ("base", "extra", "total", "deals"):
+                    totals_by_person[pid][k] += pdata[k]
+
+        return {
+            "from": f"{self.start[0]:04d}-{self.start[1]:02d}",
+            "to": f"{self.end[0]:04d}-{self.end[1]:02d}",
+            "months": months,
+            "totals": {
+                "processed_deals": self.processed,
+                "month_matched_deals": month_matched,
+                "totals_by_slot": totals_by_slot,
+                "counts_by_slot": counts_by_slot,
+                "totals_by_person": totals_by_person,
+                "deal_errors_count": deal_errors_count,
+            },
+        }
+
+
+def calc_range(
+    cfg: IncentivosConfig,
+    deals: Iterable[Deal],
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+    memo: Optional[DealMemo] = None,
+) -> Dict[str, Any]:
+    """Como `calc_month` para cada mes de [start, end], en una sola pasada."""
+    with CALC_SECONDS.time("calc_range"):
+        agg = RangeAggregator(cfg, start, end, dedupe=False, memo=memo)
+        agg.add_many(deals)
+        return agg.result()
+
+
+def summarize_deals(cfg: IncentivosConfig, deals: List[Deal]) -> Optional[Dict[str, Any]]:
+    """Agrega un conjunto suelto de deals por mes de fecha_cirugia.
+
+    Mismo esquema que `calc_range`, pero sólo con los meses que tienen deals (un
+    deal por id). None si ningún deal tiene fecha_cirugia.
+    """
+    plan = get_plan(cfg)
+    months = [(f.year, f.month) for f in (deal_fecha(plan, d) for d in deals) if f]
+    if not months:
+        return None
+    with CALC_SECONDS.time("calc_range"):
+        agg = RangeAggregator(cfg, min(months), max(months), dedupe=True, sparse=True)
+        agg.add_many(deals)
+        return agg.result()
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .calculator import MonthAggregator, RangeAggregator
+from .config import IncentivosConfig
+from .deal_record import Deal, DealRecord
+from .rules import RulePlan, get_plan
+from .utils import normalize_list_value
+
+# Motor por lotes (columnar) para recálculos grandes: auditorías de años de deals.
+# NumPy es opcional (`pip install numpy`); sin NumPy se usa el cálculo normal.
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende del entorno
+    np = None
+
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def _month_key(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+class DealColumns:
+    """Snapshot de deals normalizado a columnas (una fila por deal).
+
+    - month_key: año*12 + mes-1 de fecha_cirugia (-1 si no hay fecha)
+    - codes / present: código entero de cada BAR (6 columnas) y si vino
+    - person / label: colaborador (pid y label ya resueltos) por rol (3 columnas),
+      como índices a `pids` / `labels`
+
+    La normalización (leer custom_fields) es lo único que se hace deal por deal;
+    los agregados salen de operaciones vectorizadas sobre estas columnas.
+    """
+
+    def __init__(self, plan: RulePlan, deals: Iterable[Deal]):
+        if np is None:
+            raise RuntimeError("El motor columnar requiere numpy (pip install numpy)")
+        self.plan = plan
+        self.deal_ids: List[Any] = []
+        self.pids: List[str] = []
+        self.labels: List[str] = []
+        pid_index: Dict[str, int] = {}
+        label_index: Dict[str, int] = {}
+
+        month_key: List[int] = []
+        codes: List[int] = []
+        present: List[bool] = []
+        person: List[int] = []
+        label: List[int] = []
+
+        # Los valores crudos se repiten mucho (mismos códigos, mismos colaboradores):
+        # se normalizan una vez por valor (los dicts de Sell no son hasheables => sin memo).
+        bar_keys = [(bar, {}) for bar in plan.bars]
+        role_keys = [
+            (role, plan.cfg.collaborator_field_ids.get(role), {}) for role, _s_base, _s_extra in plan.role_slots
+        ]
+
+        def intern(pid: str, lab: str) -> Tuple[int, int]:
+            i = pid_index.get(pid)
+            if i is None:
+                i = pid_index[pid] = len(self.pids)
+                self.pids.append(pid)
+            j = label_index.get(lab)
+            if j is None:
+                j = label_index[lab] = len(self.labels)
+                self.labels.append(lab)
+            return i, j
+
+        # DealRecord: ya viene normalizado; sólo falta indexar colaboradores
+        record_roles = [role for role, _key in plan.collaborator_keys]
+        record_people: Dict[Tuple[str, Any], Tuple[int, int]] = {}
+
+        for deal in deals:
+            self.deal_ids.append(deal.get("id"))
+            if isinstance(deal, DealRecord):
+                deal.check(plan)
+                fecha = deal.fecha
+                month_key.append(_month_key(fecha.year, fecha.month) if fecha is not None else -1)
+                for code in deal.codes:
+                    if code is None:
+                        codes.append(0)
+                        present.append(False)
+                    else:
+                        codes.append(code if _INT64_MIN < code <= _INT64_MAX else _INT64_MIN)
+                        present.append(True)
+                by_role = dict(zip(record_roles, deal.collaborators))
+                for role, _key, _seen in role_keys:
+                    pair = by_role.get(role, (None, None))
+                    found = record_people.get((role, pair))
+                    if found is None:
+                        oid, lab = pair
+                        pid = oid or role
+                        found = record_people[(role, pair)] = intern(pid, lab or pid)
+                    person.append(found[0])
+                    label.append(found[1])
+                continue
+
+            cf = deal.get("custom_fields") or {}
+            fecha = plan.fecha(cf)
+            month_key.append(_month_key(fecha.year, fecha.month) if fecha is not None else -1)
+
+            for bar, seen in bar_keys:
+                raw = cf.get(bar.key)
+                found = seen.get(raw) if isinstance(raw, (str, int)) else None
+                if found is None:
+                    code = bar.code(cf)
+                    if code is None:
+                        found = (0, False)
+                    else:
+                        # Fuera de int64 nunca calza con min/paga: queda inválido, como en calc_bar
+                        found = (code if _INT64_MIN < code <= _INT64_MAX else _INT64_MIN, True)
+                    if isinstance(raw, (str, int)):
+                        seen[raw] = found
+                codes.append(found[0])
+                present.append(found[1])
+
+            for role, key, seen in role_keys:
+                raw = cf.get(key) if key is not None else None
+                found = seen.get(raw) if raw is None or isinstance(raw, (str, int)) else None
+                if found is None:
+                    oid, lab = normalize_list_value(raw)
+                    # Igual que _person_totals: sin id => el rol; sin label => el id
+                    pid = oid or role
+                    found = intern(pid, (lab or oid) or pid)
+                    if raw is None or isinstance(raw, (str, int)):
+                        seen[raw] = found
+                person.append(found[0])
+                label.append(found[1])
+
+        n = len(self.deal_ids)
+        n_roles = len(plan.role_slots)
+        self.month_key = np.asarray(month_key, dtype=np.int64)
+        self.codes = np.asarray(codes, dtype=np.int64).reshape(n, len(plan.bars))
+        self.present = np.asarray(present, dtype=bool).reshape(n, len(plan.bars))
+        self.person = np.asarray(person, dtype=np.int64).reshape(n, n_roles)
+        self.label = np.asarray(label, dtype=np.int64).reshape(n, n_roles)
+
+    def __len__(self) -> int:
+        return len(self.deal_ids)
+
+    def aggregate(self, months: Dict[Tuple[int, int], MonthAggregator]) -> None:
+        """Llena cada MonthAggregator con los totales de sus deals (group-by por mes)."""
+        plan = self.plan
+        targets = sorted(months)
+        keys = np.asarray([_month_key(*ym) for ym in targets], dtype=np.int64)
+        for agg in months.values():
+            agg.processed = len(self)
+        if not len(self) or not len(keys):
+            return
+
+        rows = np.nonzero(np.isin(self.month_key, keys))[0]
+        group = np.searchsorted(keys, self.month_key[rows])
+        n_groups = len(keys)
+        matched = np.bincount(group, minlength=n_groups)
+
+        # --- Estado de cada BAR (mismas reglas que CompiledBar.evaluate_code) ---
+        codes = self.codes[rows]
+        present = self.present[rows]
+        n_bars = len(plan.bars)
+        paga = np.zeros_like(present)
+        no_paga = np.zeros_like(present)
+        invalid = np.zeros_like(present)
+        monto = np.zeros_like(codes)
+        for j, bar in enumerate(plan.bars):
+            col = codes[:, j]
+            has = present[:, j]
+            if bar.extras_off:
+                # Extras apagados: cualquier código cuenta como no pagado con monto 0
+                no_paga[:, j] = has
+                continue
+            paga_codes = [c for c in bar.paga_codes if _INT64_MIN < c <= _INT64_MAX]
+            is_paga = has & np.isin(col, paga_codes)
+            is_min = has & ~is_paga & (col == bar.min)
+            paga[:, j] = is_paga
+            no_paga[:, j] = is_min
+            invalid[:, j] = has & ~is_paga & ~is_min
+            monto[:, j] = np.where(is_paga | is_min, col, 0)
+
+        totals = np.zeros((n_groups, n_bars), dtype=np.int64)
+        np.add.at(totals, group, monto)
+        counts = {}
+        for name, mask in (
+            ("pagados", paga),
+            ("no_pagados", no_paga),
+            ("missing", ~present),
+            ("invalid", invalid),
+        ):
+            c = np.zeros((n_groups, n_bars), dtype=np.int64)
+            np.add.at(c, group, mask.astype(np.int64))
+            counts[name] = c
+
+        # --- Personas: una ocurrencia por (deal, rol), agrupadas por (mes, pid) ---
+        person = self.person[rows]
+        n_roles = person.shape[1]
+        base_cols = [int(s_base) - 1 for _role, s_base, _s_extra in plan.role_slots]
+        extra_cols = [int(s_extra) - 1 for _role, _s_base, s_extra in plan.role_slots]
+        base = monto[:, base_cols].ravel()
+        extra = monto[:, extra_cols].ravel()
+        # Misma persona en dos roles del mismo deal => un solo deal para esa persona
+        repeated = np.zeros_like(person, dtype=bool)
+        for r in range(1, n_roles):
+            repeated[:, r] = (person[:, :r] == person[:, r : r + 1]).any(axis=1)
+
+        occ_group = np.repeat(group, n_roles)
+        occ_key = occ_group * len(self.pids) + person.ravel()
+        uniq, first, inverse = np.unique(occ_key, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        p_base = np.zeros(len(uniq), dtype=np.int64)
+        p_extra = np.zeros(len(uniq), dtype=np.int64)
+        np.add.at(p_base, inverse, base)
+        np.add.at(p_extra, inverse, extra)
+        p_deals = np.bincount(inverse[~repeated.ravel()], minlength=len(uniq))
+        occ_label = self.label[rows].ravel()
+
+        # --- Volcar a los agregadores (orden de aparición, igual que calc_month) ---
+        aggs = [months[ym] for ym in targets]
+        for g, agg in enumerate(aggs):
+            agg.month_matched = int(matched[g])
+            for j, bar in enumerate(plan.bars):
+                slot_s = str(bar.slot)
+                agg.totals_by_slot[slot_s] = int(totals[g, j])
+                for name, c in counts.items():
+                    agg.counts_by_slot[slot_s][name] = int(c[g, j])
+
+        for k in np.argsort(first, kind="stable"):
+            g = int(uniq[k]) // len(self.pids)
+            pid = self.pids[int(uniq[k]) % len(self.pids)]
+            b, e = int(p_base[k]), int(p_extra[k])
+            aggs[g].totals_by_person[pid] = {
+                "label": self.labels[int(occ_label[first[k]])],
+                "base": b,
+                "extra": e,
+                "total": b + e,
+                "deals": int(p_deals[k]),
+            }
+
+        # Auditoría: los BAR inválidos de cada deal como máscara de bits => mensajes
+        pattern = invalid.astype(np.int64) @ (1 << np.arange(n_bars, dtype=np.int64))
+        bad = np.nonzero(pattern)[0]
+        messages: Dict[int, Tuple[str, ...]] = {}
+        for i, bits, g in zip(rows[bad].tolist(), pattern[bad].tolist(), group[bad].tolist()):
+            errors = messages.get(bits)
+            if errors is None:
+                errors = messages[bits] = tuple(
+                    f"BAR{bar.slot}: {bar.invalid_error}" for j, bar in enumerate(plan.bars) if bits >> j & 1
+                )
+            aggs[g].add_errors(self.deal_ids[i], errors)
+
+
+def calc_month_columnar(
+    cfg: IncentivosConfig, deals: Iterable[Deal], year: int, month: int
+) -> Dict[str, Any]:
+    """Igual que `calc_month`, calculado por columnas."""
+    agg = MonthAggregator(cfg, year, month, dedupe=False)
+    DealColumns(get_plan(cfg), deals).aggregate({(year, month): agg})
+    return agg.result()
+
+
+def calc_range_columnar(
+    cfg: IncentivosConfig,
+    deals: Iterable[Deal],
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+) -> Dict[str, Any]:
+    """Igual que `calc_range`, calculado por columnas."""
+    agg = RangeAggregator(cfg, start, end, dedupe=False)
+    columns = DealColumns(agg.plan, deals)
+    columns.aggregate(agg.months)
+    agg.processed = len(columns)
+    return agg.result()
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import logging
+import os
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, NamedTuple, Optional, List, Tuple
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -18,6 +23,22 @@ class BarRule(BaseModel):
     max_values: Optional[list[int]] = None
     amount: int = 0
 
+    @model_validator(mode="before")
+    @classmethod
+    def _from_node_format(cls, data: Any) -> Any:
+        # Formato del config Node: {"field_name": ..., "allowed": [min, paga1, paga2, ...]}
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+        if "field_id" not in data and "field_name" in data:
+            data["field_id"] = data.pop("field_name")
+        allowed = data.pop("allowed", None)
+        if allowed and "min" not in data:
+            data["min"] = allowed[0]
+            data["max"] = allowed[1] if len(allowed) > 1 else allowed[0]
+            data.setdefault("max_values", list(allowed[1:]) or None)
+        return data
+
 
 class IncentivosConfig(BaseModel):
     # Contexto negocio
@@ -34,6 +55,22 @@ class IncentivosConfig(BaseModel):
 
     timezone: str = "America/Sao_Paulo"
 
+    # Plan de evaluación compilado (ver app.rules.get_plan)
+    _plan: Any = PrivateAttr(default=None)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_node_format(cls, data: Any) -> Any:
+        # El config Node usa *_field_name(s) en vez de *_field_id(s)
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+        if "fecha_cirugia_field_id" not in data and "fecha_cirugia_field_name" in data:
+            data["fecha_cirugia_field_id"] = data.pop("fecha_cirugia_field_name")
+        if "collaborator_field_ids" not in data and "collaborator_field_names" in data:
+            data["collaborator_field_ids"] = data.pop("collaborator_field_names")
+        return data
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
@@ -47,6 +84,44 @@ class Settings(BaseSettings):
     # API tuning
     per_page: int = Field(100, alias="SELL_PER_PAGE")
     timeout_s: float = Field(30.0, alias="SELL_TIMEOUT_S")
+    # Máximo de requests simultáneos a Sell (etapas + páginas especulativas)
+    concurrency: int = Field(4, alias="SELL_CONCURRENCY")
+    # Token bucket de requests/s (0 = sin tope fijo; con 429 el scheduler igual se adapta)
+    rate_per_s: float = Field(0.0, alias="SELL_RATE_PER_S")
+    rate_burst: int = Field(0, alias="SELL_RATE_BURST")
+    rate_adaptive: bool = Field(True, alias="SELL_RATE_ADAPTIVE")
+    # Deals pedidos en paralelo por /v1/deals/batch (el scheduler de Sell sigue mandando)
+    deals_batch_concurrency: int = Field(8, alias="DEALS_BATCH_CONCURRENCY")
+
+    # Pool HTTP compartido por todo el proceso (ver app.main.create_app)
+    pool_max_connections: int = Field(20, alias="SELL_POOL_MAX_CONNECTIONS")
+    pool_max_keepalive: int = Field(10, alias="SELL_POOL_MAX_KEEPALIVE")
+    keepalive_expiry_s: float = Field(30.0, alias="SELL_KEEPALIVE_EXPIRY_S")
+    http2: bool = Field(False, alias="SELL_HTTP2")
+
+    # Cache mensual en memoria (equivalente a MONTHLY_* del servicio Node)
+    monthly_cache_enabled: bool = Field(True, alias="MONTHLY_CACHE_ENABLED")
+    monthly_refresh_every_s: float = Field(600.0, alias="MONTHLY_REFRESH_EVERY_S")
+    monthly_prefetch_months: int = Field(2, alias="MONTHLY_PREFETCH_MONTHS")
+    monthly_cache_max_months: int = Field(6, alias="MONTHLY_CACHE_MAX_MONTHS")
+    monthly_cache_max_age_s: float = Field(1200.0, alias="MONTHLY_CACHE_MAX_AGE_S")
+
+    # "v2": descarga etapas completas y filtra fecha localmente.
+    # "search": Search API v3 con proyección y filtro de fecha en el servidor (fallback a v2 si 403).
+    monthly_fetch_mode: str = Field("v2", alias="MONTHLY_FETCH_MODE")
+
+    # Snapshot local de deals con sync incremental por updated_at
+    deal_store_enabled: bool = Field(True, alias="DEAL_STORE_ENABLED")
+    deal_store_full_resync_s: float = Field(6 * 3600.0, alias="DEAL_STORE_FULL_RESYNC_S")
+
+    # Agregados mensuales en vivo (restar/sumar por deal); requieren DEAL_STORE_ENABLED
+    live_aggregates_enabled: bool = Field(True, alias="LIVE_AGGREGATES_ENABLED")
+
+    # Memo LRU de aportes por deal (deal_id, updated_at, config_hash); 0 = deshabilitado
+    deal_memo_max_entries: int = Field(50_000, alias="DEAL_MEMO_MAX_ENTRIES")
+
+    # Cada cuántos segundos se revisa (stat) si cambió el config JSON; igual que CONFIG_CACHE_S en Node
+    config_cache_s: float = Field(30.0, alias="CONFIG_CACHE_S")
 
     # Server
     host: str = Field("0.0.0.0", alias="HOST")
@@ -62,3 +137,96 @@ def load_incentivos_config(path: str | Path) -> IncentivosConfig:
 
     raw: Dict[str, Any] = json.loads(p.read_text(encoding="utf-8"))
     return IncentivosConfig.model_validate(raw)
+
+
+def config_hash(cfg: IncentivosConfig) -> str:
+    """Hash estable de la config (sirve como key de caches / coalescing)."""
+    return hashlib.sha256(cfg.model_dump_json().encode("utf-8")).hexdigest()[:16]
+
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Settings del proceso (se leen .env / entorno una sola vez)."""
+    return Settings()
+
+
+class _LoadedConfig(NamedTuple):
+    # (mtime_ns, size) del archivo cuando se validó
+    file_key: Tuple[int, int]
+    cfg: IncentivosConfig
+    hash: str
+
+
+class ConfigProvider:
+    """Config validada en memoria con hot reload por mtime/tamaño.
+
+    A lo más cada `check_every_s` se hace un `stat()` del archivo; si cambió
+    (mtime o tamaño) se relee, se valida y se reemplaza la config en una sola
+    asignación. Si el archivo nuevo es inválido se sigue sirviendo la anterior
+    y el error queda en `last_error`. Entre chequeos no hay I/O ni validación.
+    """
+
+    def __init__(self, path: str | Path, check_every_s: float = 30.0):
+        self.path = Path(path)
+        self.check_every_s = float(check_every_s)
+        self._loaded: Optional[_LoadedConfig] = None
+        self._checked_mono = 0.0
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    def _file_key(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self, file_key: Tuple[int, int]) -> _LoadedConfig:
+        cfg = load_incentivos_config(self.path)
+        return _LoadedConfig(file_key=file_key, cfg=cfg, hash=config_hash(cfg))
+
+    def _current(self) -> _LoadedConfig:
+        loaded = self._loaded
+        now = time.monotonic()
+        if loaded is not None and now - self._checked_mono < self.check_every_s:
+            return loaded
+
+        self._checked_mono = now
+        try:
+            file_key = self._file_key()
+            if loaded is not None and file_key == loaded.file_key:
+                return loaded
+            fresh = self._load(file_key)
+        except Exception as e:
+            if loaded is None:
+                raise
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.warning("Config %s inválida; se mantiene la anterior (%s)", self.path, self.last_error)
+            return loaded
+
+        # Swap atómico: los lectores ven la config vieja o la nueva, nunca una mezcla
+        self._loaded = fresh
+        self.last_error = None
+        if loaded is not None:
+            self.reloads += 1
+        return fresh
+
+    def get(self) -> IncentivosConfig:
+        return self._current().cfg
+
+    def get_with_hash(self) -> Tuple[IncentivosConfig, str]:
+        loaded = self._current()
+        return loaded.cfg, loaded.hash
+
+    @property
+    def config_hash(self) -> str:
+        return self._current().hash
+
+    def status(self) -> Dict[str, Any]:
+        loaded = self._loaded
+        return {
+            "path": str(self.path),
+            "config_hash": loaded.hash if loaded else None,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import sys
+from datetime import date
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .rules import RulePlan
+from .utils import normalize_list_value
+
+# Deal compacto para lo que queda en memoria (DealStore): al ingresar, el payload
+# v2 completo (todos los custom_fields, tags, direcciones...) se proyecta a lo que
+# lee el cálculo, ya normalizado: fecha de cirugía parseada, los 6 códigos BAR como
+# int y los colaboradores como tuplas (id, label). Normalizar/parsear pasa una vez
+# por deal y no en cada cálculo.
+
+# Campos de primer nivel del payload que se conservan tal cual
+PAYLOAD_KEYS = ("id", "name", "stage_id", "created_at", "updated_at")
+
+
+# Tuplas de códigos, colaboradores y fechas se repiten en miles de deals: se
+# comparte una sola copia de cada valor (tabla acotada; pasado el tope, sin compartir).
+_SHARED: Dict[Any, Any] = {}
+_SHARED_MAX = 65_536
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+def _share(value: Any) -> Any:
+    found = _SHARED.get(value)
+    if found is not None:
+        return found
+    if len(_SHARED) < _SHARED_MAX:
+        _SHARED[value] = value
+    return value
+
+
+class DealRecord:
+    """Deal de Sell reducido a lo que usa el cálculo.
+
+    `fields` es la firma de campos del plan con que se proyectó (RulePlan.fields);
+    un plan que lee otros custom_fields no puede usar el record.
+    """
+
+    __slots__ = (*PAYLOAD_KEYS, "fecha", "codes", "collaborators", "fields")
+
+    def __init__(
+        self,
+        id: Any,
+        name: Optional[str],
+        stage_id: Optional[int],
+        created_at: Optional[str],
+        updated_at: Optional[str],
+        fecha: Optional[date],
+        codes: Tuple[Optional[int], ...],
+        collaborators: Tuple[Tuple[Optional[str], Optional[str]], ...],
+        fields: Tuple[Any, ...],
+    ):
+        self.id = id
+        self.name = name
+        self.stage_id = stage_id
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.fecha = fecha
+        self.codes = codes
+        self.collaborators = collaborators
+        self.fields = fields
+
+    @classmethod
+    def from_payload(cls, plan: RulePlan, deal: Dict[str, Any]) -> "DealRecord":
+        cf = deal.get("custom_fields") or {}
+        collaborators = []
+        for _role, key in plan.collaborator_keys:
+            oid, label = normalize_list_value(cf.get(key))
+            collaborators.append((_intern(oid), _intern(label or oid)))
+        fecha = plan.fecha(cf)
+        return cls(
+            deal.get("id"),
+            deal.get("name"),
+            deal.get("stage_id"),
+            deal.get("created_at"),
+            deal.get("updated_at"),
+            _share(fecha) if fecha is not None else None,
+            _share(tuple(bar.code(cf) for bar in plan.bars)),
+            _share(tuple(collaborators)),
+            plan.fields,
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Como `dict.get` para los campos de primer nivel (id, stage_id, updated_at...)."""
+        if key in PAYLOAD_KEYS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return default
+
+    def check(self, plan: RulePlan) -> None:
+        if self.fields is not plan.fields and self.fields != plan.fields:
+            raise ValueError(f"Deal {self.id} proyectado con otros campos que la config actual")
+
+    def collaborators_for(self, plan: RulePlan) -> Dict[str, Dict[str, Optional[str]]]:
+        """Mismo formato que `RulePlan.collaborators`."""
+        return {
+            role: {"id": oid, "label": label}
+            for (role, _key), (oid, label) in zip(plan.collaborator_keys, self.collaborators)
+        }
+
+    def __repr__(self) -> str:
+        return f"DealRecord(id={self.id!r}, fecha={self.fecha!r}, codes={self.codes!r})"
+
+
+Deal = Union[Dict[str, Any], DealRecord]
+
+
+def deal_fecha(plan: RulePlan, deal: Deal) -> Optional[date]:
+    """fecha_cirugia de un payload o de un record ya proyectado."""
+    if isinstance(deal, DealRecord):
+        deal.check(plan)
+        return deal.fecha
+    return plan.fecha(deal.get("custom_fields") or {})
+
+
+def deal_fields(
+    plan: RulePlan, deal: Deal
+) -> Tuple[Tuple[Optional[int], ...], Dict[str, Dict[str, Optional[str]]]]:
+    """(códigos BAR, colaboradores) de un payload o de un record ya proyectado."""
+    if isinstance(deal, DealRecord):
+        deal.check(plan)
+        return deal.codes, deal.collaborators_for(plan)
+    cf = deal.get("custom_fields") or {}
+    return tuple(bar.code(cf) for bar in plan.bars), plan.collaborators(cf)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from dateutil.parser import isoparse
+
+from .deal_record import Deal, DealRecord
+from .rules import RulePlan
+from .sell_client import SellClient
+
+
+def _updated_at(deal: Deal) -> Optional[datetime]:
+    raw = deal.get("updated_at")
+    if not raw:
+        return None
+    try:
+        return isoparse(str(raw))
+    except ValueError:
+        return None
+
+
+@dataclass
+class SyncResult:
+    """Qué cambió en una sincronización (para mantener agregados incrementales)."""
+
+    full: bool
+    upserted: List[Deal] = field(default_factory=list)
+    removed: List[int] = field(default_factory=list)
+
+
+class DealStore:
+    """Snapshot local de los deals de las etapas configuradas.
+
+    La primera vez (o si cambian las etapas, o cada `full_resync_every_s`) hace una
+    carga completa por stage_id. Después sólo pide los deals con updated_at >= al
+    watermark de la última sincronización:
+      - si siguen/entraron en una etapa configurada => upsert
+      - si salieron de las etapas configuradas => se eliminan del snapshot
+
+    Los deals borrados en Sell no aparecen en el incremental; los limpia la carga
+    completa periódica.
+
+    Con `plan`, cada deal se guarda proyectado a un DealRecord (lo que lee el
+    cálculo, ya normalizado) en vez del payload completo. Si cambian los campos
+    que lee la config (RulePlan.fields), la próxima sync es completa.
+    """
+
+    def __init__(self, *, full_resync_every_s: float = 6 * 3600.0, overlap_s: float = 300.0):
+        self.full_resync_every_s = float(full_resync_every_s)
+        # Margen hacia atrás del watermark: updated_at no es estrictamente monótono
+        # respecto del momento en que leímos cada página.
+        self.overlap_s = float(overlap_s)
+
+        self._deals: Dict[int, Deal] = {}
+        self._stage_ids: Optional[FrozenSet[int]] = None
+        self._plan: Optional[RulePlan] = None
+        self._lock = asyncio.Lock()
+        self._last_full_mono: Optional[float] = None
+
+        self.watermark: Optional[datetime] = None
+        self.last_sync_at: Optional[str] = None
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self.last_changed = 0
+        self.last_removed = 0
+
+    def _needs_full(self, stage_ids: FrozenSet[int], plan: Optional[RulePlan]) -> bool:
+        if self._last_full_mono is None or self.watermark is None:
+            return True
+        if stage_ids != self._stage_ids:
+            return True
+        fields = plan.fields if plan is not None else None
+        if fields != (self._plan.fields if self._plan is not None else None):
+            # Los records guardados no tienen los campos que pide la config nueva
+            return True
+        return time.monotonic() - self._last_full_mono >= self.full_resync_every_s
+
+    def _project(self, deal: Dict[str, Any]) -> Deal:
+        return DealRecord.from_payload(self._plan, deal) if self._plan is not None else deal
+
+    def _advance_watermark(self, deals: Iterable[Deal]) -> None:
+        for d in deals:
+            ts = _updated_at(d)
+            if ts is not None and (self.watermark is None or ts > self.watermark):
+                self.watermark = ts
+
+    async def _full_sync(self, sell: SellClient, stage_ids: FrozenSet[int], per_page: int) -> SyncResult:
+        project = self._project if self._plan is not None else None
+        deals = await sell.list_deals_by_stages(sorted(stage_ids), per_page=per_page, project=project)
+        self._deals = {int(d.get("id")): d for d in deals if d.get("id") is not None}
+        self._stage_ids = stage_ids
+        self.watermark = None
+        self._advance_watermark(deals)
+        if self.watermark is None:
+            # Sin updated_at en el payload: el próximo incremental parte desde ahora
+            self.watermark = datetime.now(timezone.utc)
+        self._last_full_mono = time.monotonic()
+        self.full_syncs += 1
+        self.last_changed = len(self._deals)
+        self.last_removed = 0
+        return SyncResult(full=True)
+
+    async def _incremental_sync(self, sell: SellClient, per_page: int) -> SyncResult:
+        assert self.watermark is not None and self._stage_ids is not None
+        since = self.watermark - timedelta(seconds=self.overlap_s)
+        changed = await sell.list_deals_updated_since(since, per_page=per_page)
+
+        result = SyncResult(full=False)
+        for d in changed:
+            if d.get("id") is None:
+                continue
+            stored = self.apply(d)
+            if stored is not None:
+                result.upserted.append(stored)
+            elif self.remove(int(d["id"])):
+                result.removed.append(int(d["id"]))
+
+        self._advance_watermark(changed)
+        self.incremental_syncs += 1
+        self.last_changed = len(changed)
+        self.last_removed = len(result.removed)
+        return result
+
+    async def sync(
+        self,
+        sell: SellClient,
+        stage_ids: Iterable[int],
+        per_page: int = 100,
+        plan: Optional[RulePlan] = None,
+    ) -> SyncResult:
+        wanted = frozenset(int(s) for s in stage_ids)
+        async with self._lock:
+            full = self._needs_full(wanted, plan)
+            self._plan = plan
+            if full:
+                # Si la carga falla, la próxima sync vuelve a ser completa
+                self._last_full_mono = None
+                result = await self._full_sync(sell, wanted, per_page)
+            else:
+                result = await self._incremental_sync(sell, per_page)
+            self.last_sync_at = datetime.now(timezone.utc).isoformat()
+            return result
+
+    @property
+    def loaded(self) -> bool:
+        return self._stage_ids is not None
+
+    def apply(self, deal: Dict[str, Any]) -> Optional[Deal]:
+        """Upsert si el deal está en una etapa configurada.
+
+        Devuelve lo que quedó guardado (el DealRecord, si hay plan) o None si no quedó en el snapshot.
+        """
+        did = deal.get("id")
+        stage_id = deal.get("stage_id")
+        if did is None or self._stage_ids is None:
+            return None
+        if stage_id is None or int(stage_id) not in self._stage_ids:
+            return None
+        stored = self._deals[int(did)] = self._project(deal)
+        return stored
+
+    def remove(self, deal_id: int) -> bool:
+        return self._deals.pop(int(deal_id), None) is not None
+
+    def deals(self) -> List[Deal]:
+        return list(self._deals.values())
+
+    def __len__(self) -> int:
+        return len(self._deals)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "deals": len(self._deals),
+            "stage_ids": sorted(self._stage_ids) if self._stage_ids is not None else None,
+            "compact": self._plan is not None,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "last_sync_at": self.last_sync_at,
+            "full_syncs": self.full_syncs,
+            "incremental_syncs": self.incremental_syncs,
+            "last_changed": self.last_changed,
+            "last_removed": self.last_removed,
+        }
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import re
+from datetime import date
+from typing import Any, Union
+
+from starlette.responses import JSONResponse
+
+# JSON rápido para el camino caliente: páginas de Sell (decode) y respuestas de
+# /v1/monthly y /v1/deals (encode). Con orjson (`pip install orjson`) todo pasa en
+# C, dataclasses con slots incluidas; sin orjson se usa json de la stdlib con la
+# misma salida que JSONResponse de Starlette.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+def orjson_available() -> bool:
+    return orjson is not None
+
+
+def _default(obj: Any) -> Any:
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        # Sin asdict: no copia recursivamente (los campos anidados pasan otra vez por acá)
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# orjson no maneja enteros fuera de 64 bits: al leer los pasa a float (pierde
+# precisión) y al escribir lanza TypeError. Con 19+ dígitos seguidos se usa la stdlib.
+_LONG_DIGITS = re.compile(rb"\d{19,}")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        raw = data.encode("utf-8") if isinstance(data, str) else data
+        if not _LONG_DIGITS.search(raw):
+            return orjson.loads(raw)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            pass
+        try:
+            # Keys no-string (json de la stdlib las convierte): camino lento, mismo resultado
+            return orjson.dumps(obj, default=_default, option=option | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Enteros de más de 64 bits (ej un código BAR "123456789012345678901234")
+            pass
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_default).encode("utf-8")
+    return json.dumps(
+        obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse con `dumps` de este módulo.
+
+    Devolverla directamente desde una ruta evita también el `jsonable_encoder` de FastAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .calculator import DealContribution, MonthAggregator, deal_contribution
+from .config import IncentivosConfig
+from .deal_store import SyncResult
+from .rules import RulePlan, get_plan
+
+YearMonth = Tuple[int, int]
+
+
+class LiveAggregates:
+    """Agregados mensuales mantenidos en vivo sobre el snapshot de deals.
+
+    Guarda el aporte evaluado de cada deal y los totales de cada mes. Cuando un
+    deal cambia, se resta su aporte anterior (de su mes anterior, si cambió
+    fecha_cirugia) y se suma el nuevo: O(1) por deal, sin recalcular el mes.
+    Cada `month_result` es idéntico a `calc_month` sobre el mismo snapshot
+    (salvo el orden de `deal_errors`).
+    """
+
+    def __init__(self) -> None:
+        self.plan: Optional[RulePlan] = None
+        self._contribs: Dict[int, DealContribution] = {}
+        self._months: Dict[YearMonth, MonthAggregator] = {}
+        self.upserts = 0
+        self.removals = 0
+
+    @property
+    def config_hash(self) -> Optional[str]:
+        return self.plan.config_hash if self.plan is not None else None
+
+    def matches(self, cfg: IncentivosConfig) -> bool:
+        return self.plan is not None and self.plan.config_hash == get_plan(cfg).config_hash
+
+    def _month(self, ym: YearMonth) -> MonthAggregator:
+        agg = self._months.get(ym)
+        if agg is None:
+            assert self.plan is not None
+            agg = self._months[ym] = MonthAggregator(self.plan.cfg, *ym, dedupe=False)
+        return agg
+
+    def load(self, cfg: IncentivosConfig, deals: Iterable[Dict[str, Any]]) -> None:
+        """Reconstruye todo desde un snapshot (carga completa o cambio de config)."""
+        self.plan = get_plan(cfg)
+        self._contribs = {}
+        self._months = {}
+        for deal in deals:
+            self.upsert(deal)
+
+    def upsert(self, deal: Dict[str, Any]) -> List[YearMonth]:
+        """Aplica la versión nueva de un deal. Devuelve los meses afectados."""
+        assert self.plan is not None, "LiveAggregates sin cargar"
+        did = deal.get("id")
+        if did is None:
+            return []
+        affected = self.remove(int(did), _count=False)
+
+        c = deal_contribution(self.plan, deal)
+        self._contribs[int(did)] = c
+        if c.fecha is not None:
+            c.evaluate(self.plan, deal)
+            ym = (c.fecha.year, c.fecha.month)
+            self._month(ym).apply(c)
+            if ym not in affected:
+                affected.append(ym)
+        self.upserts += 1
+        return affected
+
+    def remove(self, deal_id: int, _count: bool = True) -> List[YearMonth]:
+        c = self._contribs.pop(int(deal_id), None)
+        if c is None:
+            return []
+        if _count:
+            self.removals += 1
+        if c.fecha is None:
+            return []
+        ym = (c.fecha.year, c.fecha.month)
+        self._months[ym].remove(c)
+        return [ym]
+
+    def apply_sync(self, result: SyncResult) -> List[YearMonth]:
+        affected: List[YearMonth] = []
+        for deal in result.upserted:
+            affected.extend(ym for ym in self.upsert(deal) if ym not in affected)
+        for did in result.removed:
+            affected.extend(ym for ym in self.remove(did) if ym not in affected)
+        return affected
+
+    def month_result(self, year: int, month: int) -> Dict[str, Any]:
+        assert self.plan is not None, "LiveAggregates sin cargar"
+        agg = self._months.get((year, month)) or MonthAggregator(self.plan.cfg, year, month, dedupe=False)
+        out = agg.result()
+        # Copia de los totales: el agregador sigue cambiando con cada sync y el resultado
+        # queda guardado (MonthlyCache, con su JSON ya codificado)
+        out["totals_by_slot"] = dict(agg.totals_by_slot)
+        out["counts_by_slot"] = {slot: dict(counts) for slot, counts in agg.counts_by_slot.items()}
+        out["totals_by_person"] = {pid: dict(tp) for pid, tp in agg.totals_by_person.items()}
+        # processed_deals = todo el snapshot, como calc_month sobre la lista completa
+        out["processed_deals"] = len(self._contribs)
+        return out
+
+    def __len__(self) -> int:
+        return len(self._contribs)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.plan is not None,
+            "config_hash": self.config_hash,
+            "deals": len(self._contribs),
+            "months": len(self._months),
+            "upserts": self.upserts,
+            "removals": self.removals,
+        }
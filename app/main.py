@@ -1,18 +1,122 @@
 from __future__ import annotations
 
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
 from fastapi import FastAPI
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from .config import ConfigProvider, get_settings
+from .deal_memo import DealMemo
+from .deal_store import DealStore
+from .live_aggregates import LiveAggregates
+from .metrics import HTTP_REQUEST_SECONDS
+from .monthly_cache import MonthlyCache
 from .routes import router
+from .sell_client import SellClient
+from .service import compute_months
+
+
+class MetricsMiddleware:
+    """Latencia por ruta (template, ej /v1/monthly/{ym}) para /metrics.
+
+    ASGI puro: sin BaseHTTPMiddleware, no envuelve el body ni agrega una task por request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - t0, scope["method"], path, str(status))
+
+
+def create_app(sell: Optional[SellClient] = None) -> FastAPI:
+    """Crea la app.
+
+    `sell` permite inyectar un cliente ya construido (tests / backend falso);
+    si no se pasa, se crea uno desde `Settings` al arrancar.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        settings = get_settings()
+        app.state.settings = settings
+
+        # Config validada en memoria, con hot reload por mtime
+        config_provider = ConfigProvider(settings.config_path, check_every_s=settings.config_cache_s)
+        app.state.config_provider = config_provider
+
+        # Un solo SellClient (y un solo pool httpx) por proceso: las conexiones
+        # keep-alive a api.getbase.com se reutilizan entre requests.
+        client = sell or SellClient.from_settings(settings)
+        await client.open()
+        app.state.sell = client
+
+        deal_store: Optional[DealStore] = None
+        if settings.deal_store_enabled:
+            deal_store = DealStore(full_resync_every_s=settings.deal_store_full_resync_s)
+        app.state.deal_store = deal_store
+
+        deal_memo: Optional[DealMemo] = None
+        if settings.deal_memo_max_entries > 0:
+            deal_memo = DealMemo(max_entries=settings.deal_memo_max_entries)
+        app.state.deal_memo = deal_memo
+
+        live: Optional[LiveAggregates] = None
+        if deal_store is not None and settings.live_aggregates_enabled:
+            live = LiveAggregates()
+        app.state.live_aggregates = live
+
+        monthly_cache: Optional[MonthlyCache] = None
+        if settings.monthly_cache_enabled:
+            monthly_cache = MonthlyCache(
+                lambda months: compute_months(
+                    client, months, config_provider.get(), settings, deal_store, deal_memo, live
+                ),
+                refresh_every_s=settings.monthly_refresh_every_s,
+                prefetch_months=settings.monthly_prefetch_months,
+                max_months=settings.monthly_cache_max_months,
+                max_age_s=settings.monthly_cache_max_age_s,
+                version=lambda: config_provider.config_hash,
+            )
+            monthly_cache.start()
+        app.state.monthly_cache = monthly_cache
 
+        try:
+            yield
+        finally:
+            if monthly_cache is not None:
+                await monthly_cache.stop()
+            await client.aclose()
 
-def create_app() -> FastAPI:
     app = FastAPI(
         title="INCENTIVOS APP_V2.1",
         version="2.1.0",
         docs_url="/docs",
         redoc_url="/redoc",
+        lifespan=lifespan,
     )
     app.include_router(router)
+    app.add_middleware(MetricsMiddleware)
     return app
 
 
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Métricas en formato texto de Prometheus, sin dependencias.
+#
+# Registro en memoria por proceso: counters e histogramas con labels. En el
+# camino caliente sólo hay un dict lookup + una suma por observación; todo el
+# formateo ocurre al hacer scrape de /metrics.
+
+LabelKey = Tuple[str, ...]
+
+# Latencias HTTP / Sell (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def family(name: str, kind: str, help_text: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> str:
+    """Familia de métricas armada al momento del scrape (gauges/counters leídos de otros objetos)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_num(value)}")
+    return "\n".join(lines)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, *labels: str, value: float = 1.0) -> None:
+        key = tuple(str(v) for v in labels)
+        self._values[key] = self._values.get(key, 0.0) + value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(tuple(str(v) for v in labels), 0.0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_num(value)}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [conteo por bucket (no acumulado) ..., +Inf], suma
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = tuple(str(v) for v in labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def count(self, *labels: str) -> int:
+        return sum(self._counts.get(tuple(str(v) for v in labels), ()))
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key in sorted(self._counts):
+            counts = self._counts[key]
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = f'le="{_num(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(self._sums[key])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[object]:
+        return self._metrics.get(name)
+
+    def render(self, extra: Iterable[str] = ()) -> str:
+        blocks = [m.render() for m in self._metrics.values()]
+        blocks.extend(extra)
+        return "\n".join(blocks) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "incentivos_http_request_duration_seconds", "Latencia de requests HTTP por ruta", ("method", "route", "status")
+)
+SELL_REQUEST_SECONDS = REGISTRY.histogram(
+    "incentivos_sell_request_duration_seconds",
+    "Latencia de llamadas a Sell por endpoint",
+    ("method", "endpoint", "status"),
+)
+SELL_PAGES = REGISTRY.counter("incentivos_sell_pages_total", "Páginas de deals descargadas por etapa", ("stage",))
+SELL_RETRIES = REGISTRY.counter(
+    "incentivos_sell_retries_total", "Reintentos a Sell (hook de tenacity) por motivo", ("call", "reason")
+)
+CALC_SECONDS = REGISTRY.histogram(
+    "incentivos_calc_duration_seconds",
+    "Tiempo de cálculo (sin red) por fase",
+    ("phase",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DEALS_PROCESSED = REGISTRY.counter("incentivos_deals_processed_total", "Deals procesados en cálculos mensuales")
+DEALS_MATCHED = REGISTRY.counter("incentivos_deals_month_matched_total", "Deals que cayeron dentro del mes calculado")
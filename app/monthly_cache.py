@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .fastjson import dumps
+
+# Cache en memoria + refresco periódico de /v1/monthly (equivalente a src/monthlyCache.js).
+#
+# - Meses "trackeados" con desalojo LRU (MONTHLY_CACHE_MAX_MONTHS).
+# - Al arrancar se trackean el mes actual y los anteriores (MONTHLY_PREFETCH_MONTHS).
+# - Un refresh descarga los deals UNA vez y recalcula todos los meses trackeados.
+# - Stale-while-revalidate: una entrada vencida se sirve al tiro y se refresca en background.
+# - Las entradas llevan la versión (hash) de la config con que se calcularon; si la
+#   config cambió, la entrada no se sirve.
+
+ComputeMonths = Callable[[List[str]], Awaitable[Dict[str, Dict[str, Any]]]]
+
+
+@dataclass
+class CacheEntry:
+    data: Dict[str, Any]
+    generated_at: str
+    generated_mono: float
+    version: Optional[str] = None
+    # `data` ya codificado a JSON: se arma en la primera lectura y lo reusan los HIT siguientes
+    body: Optional[bytes] = None
+
+    def encoded(self) -> bytes:
+        if self.body is None:
+            self.body = dumps(self.data)
+        return self.body
+
+
+@dataclass
+class CacheResult:
+    data: Dict[str, Any]
+    # HIT | STALE | MISS
+    cache: str
+    generated_at: Optional[str]
+    entry: Optional[CacheEntry] = None
+
+    def encoded(self) -> bytes:
+        return self.entry.encoded() if self.entry is not None else dumps(self.data)
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _recent_months(n: int) -> List[str]:
+    now = datetime.now(timezone.utc)
+    year, month = now.year, now.month
+    out: List[str] = []
+    for _ in range(n):
+        out.append(f"{year:04d}-{month:02d}")
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return out
+
+
+class MonthlyCache:
+    def __init__(
+        self,
+        compute: ComputeMonths,
+        *,
+        refresh_every_s: float = 600.0,
+        prefetch_months: int = 2,
+        max_months: int = 6,
+        max_age_s: float = 1200.0,
+        version: Optional[Callable[[], str]] = None,
+    ):
+        self._compute = compute
+        self._version = version or (lambda: "")
+        self.refresh_every_s = max(1.0, float(refresh_every_s))
+        self.prefetch_months = max(0, int(prefetch_months))
+        self.max_months = max(1, int(max_months))
+        self.max_age_s = float(max_age_s)
+
+        # ym -> entrada; el orden del OrderedDict es el orden LRU (último usado al final)
+        self._tracked: "OrderedDict[str, Optional[CacheEntry]]" = OrderedDict()
+        self._refreshing: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+        self.last_refresh_at: Optional[str] = None
+        self.last_refresh_error: Optional[str] = None
+        # Lecturas por resultado (HIT / STALE / MISS)
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+
+    # ---------------------------
+    # Tracking LRU
+    # ---------------------------
+
+    def _track(self, ym: str) -> None:
+        if ym in self._tracked:
+            self._tracked.move_to_end(ym)
+        else:
+            self._tracked[ym] = None
+        while len(self._tracked) > self.max_months:
+            self._tracked.popitem(last=False)
+
+    def _is_fresh(self, entry: CacheEntry) -> bool:
+        return time.monotonic() - entry.generated_mono <= self.max_age_s
+
+    # ---------------------------
+    # Refresh
+    # ---------------------------
+
+    async def _do_refresh(self) -> None:
+        months = sorted(self._tracked)
+        version = self._version()
+        try:
+            results = await self._compute(months)
+        except Exception as e:
+            self.last_refresh_error = f"{type(e).__name__}: {e}"
+            raise
+
+        now_iso = _utc_now_iso()
+        now_mono = time.monotonic()
+        for ym, data in results.items():
+            # Un mes pudo salir del tracking mientras se calculaba
+            if ym in self._tracked:
+                self._tracked[ym] = CacheEntry(
+                    data=data, generated_at=now_iso, generated_mono=now_mono, version=version
+                )
+        self.last_refresh_at = now_iso
+        self.last_refresh_error = None
+
+    def refresh_once(self) -> "asyncio.Task[None]":
+        """Lanza un refresh (o devuelve el que ya está en curso)."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._do_refresh())
+            # Evita "Task exception was never retrieved" en refrescos de background
+            self._refreshing.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._refreshing
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_every_s)
+            try:
+                await asyncio.shield(self.refresh_once())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Queda registrado en last_refresh_error
+                pass
+
+    def start(self) -> None:
+        for ym in reversed(_recent_months(self.prefetch_months)):
+            self._track(ym)
+        if self._tracked:
+            self.refresh_once()
+        if self._loop_task is None:
+            self._loop_task = asyncio.ensure_future(self._refresh_loop())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._loop_task, self._refreshing) if t is not None and not t.done()]
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except BaseException:
+                pass
+        self._loop_task = None
+        self._refreshing = None
+
+    # ---------------------------
+    # Lectura
+    # ---------------------------
+
+    def _usable(self, ym: str) -> Optional[CacheEntry]:
+        entry = self._tracked.get(ym)
+        if entry is None or entry.version != self._version():
+            return None
+        return entry
+
+    async def get_month(self, ym: str) -> CacheResult:
+        self._track(ym)
+        existing = self._usable(ym)
+
+        if existing is not None:
+            if self._is_fresh(existing):
+                self.hits += 1
+                return CacheResult(data=existing.data, cache="HIT", generated_at=existing.generated_at, entry=existing)
+            # Stale-while-revalidate
+            self.stale += 1
+            self.refresh_once()
+            return CacheResult(
+                data=existing.data, cache="STALE", generated_at=existing.generated_at, entry=existing
+            )
+
+        self.misses += 1
+        await asyncio.shield(self.refresh_once())
+        entry = self._usable(ym)
+        if entry is None:
+            # El refresh en curso había partido antes de trackear este mes (o con otra config)
+            await asyncio.shield(self.refresh_once())
+            entry = self._usable(ym)
+        if entry is None:
+            raise RuntimeError(f"No se pudo calcular {ym}")
+        return CacheResult(data=entry.data, cache="MISS", generated_at=entry.generated_at, entry=entry)
+
+    def put(self, ym: str, data: Dict[str, Any]) -> bool:
+        """Reemplaza el resultado de un mes trackeado (ej: tras un evento de deal)."""
+        if ym not in self._tracked:
+            return False
+        self._tracked[ym] = CacheEntry(
+            data=data, generated_at=_utc_now_iso(), generated_mono=time.monotonic(), version=self._version()
+        )
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "refresh_every_s": self.refresh_every_s,
+            "cache_max_age_s": self.max_age_s,
+            "max_months": self.max_months,
+            "tracked_months": sorted(self._tracked),
+            "cached_months": sorted(ym for ym, e in self._tracked.items() if e is not None),
+            "last_refresh_at": self.last_refresh_at,
+            "last_refresh_error": self.last_refresh_error,
+            "refreshing": self._refreshing is not None and not self._refreshing.done(),
+            "hits": self.hits,
+            "stale": self.stale,
+            "misses": self.misses,
+        }
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .calculator import RangeAggregator, calc_range, iter_months
+from .columnar import calc_range_columnar, numpy_available
+from .config import IncentivosConfig
+from .snapshot import SnapshotReader
+
+# Recálculo en paralelo (varios procesos) para el CLI: muchos meses o varias
+# variantes de config después de un cambio de reglas. El cálculo es Python puro
+# y CPU-bound, así que se reparte en procesos, no en threads.
+#
+# Shards:
+#   - "deals":  trozos contiguos de deals; cada proceso calcula TODO el rango sobre
+#               su trozo y los parciales se suman en orden (MonthAggregator.merge_result).
+#   - "month":  grupos contiguos de meses; cada proceso recorre todos los deals
+#               (desde el snapshot si hay, para no serializar la lista completa).
+# En ambos casos el resultado es idéntico al `calc_range` serial.
+
+YearMonth = Tuple[int, int]
+Source = Union[str, List[Dict[str, Any]]]  # ruta a snapshot o lista de deals
+
+SHARD_MODES = ("deals", "month")
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def _split(items: Sequence[Any], n: int) -> List[Sequence[Any]]:
+    """`n` trozos contiguos y de tamaño parejo (sin trozos vacíos)."""
+    n = max(1, min(n, len(items)))
+    size, extra = divmod(len(items), n)
+    out, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        out.append(items[start:end])
+        start = end
+    return out
+
+
+def _range_task(
+    cfg_data: Dict[str, Any], source: Source, start: YearMonth, end: YearMonth, columnar: bool
+) -> Dict[str, Any]:
+    # Corre en el proceso hijo: la config viaja como dict (el plan compilado no se serializa)
+    cfg = IncentivosConfig.model_validate(cfg_data)
+    calc = calc_range_columnar if columnar else calc_range
+    if isinstance(source, str):
+        with SnapshotReader(source) as snap:
+            return calc(cfg, snap, start, end)
+    return calc(cfg, source, start, end)
+
+
+def _plan_tasks(
+    source: Source, start: YearMonth, end: YearMonth, workers: int, shard: str
+) -> List[Tuple[Source, YearMonth, YearMonth]]:
+    if shard == "month":
+        groups = _split(list(iter_months(start, end)), workers)
+        return [(source, group[0], group[-1]) for group in groups]
+    if isinstance(source, str):
+        with SnapshotReader(source) as snap:
+            source = list(snap)
+    return [(list(chunk), start, end) for chunk in _split(source, workers)]
+
+
+def _merge(
+    cfg: IncentivosConfig, parts: List[Dict[str, Any]], start: YearMonth, end: YearMonth, shard: str
+) -> Dict[str, Any]:
+    agg = RangeAggregator(cfg, start, end, dedupe=False)
+    for part in parts:
+        for out in part["months"].values():
+            year, month = (int(x) for x in out["month"].split("-"))
+            agg.months[(year, month)].merge_result(out)
+    if shard == "month":
+        # Cada proceso vio todos los deals
+        agg.processed = parts[0]["totals"]["processed_deals"] if parts else 0
+    else:
+        agg.processed = sum(p["totals"]["processed_deals"] for p in parts)
+    return agg.result()
+
+
+def calc_variants_parallel(
+    cfgs: Dict[str, IncentivosConfig],
+    source: Source,
+    start: YearMonth,
+    end: YearMonth,
+    workers: Optional[int] = None,
+    shard: str = "deals",
+    columnar: bool = False,
+    executor: Optional[Executor] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """`calc_range` de cada config de `cfgs` sobre los mismos deals, en paralelo.
+
+    `source` es la lista de deals (ya deduplicada) o la ruta de un snapshot.
+    Todas las variantes comparten el mismo pool; el resultado no depende del
+    número de procesos ni del orden en que terminan.
+    """
+    if shard not in SHARD_MODES:
+        raise ValueError(f"shard inválido: {shard!r} (usa {'/'.join(SHARD_MODES)})")
+    if start > end:
+        raise ValueError("Rango inválido: from > to")
+    workers = max(1, workers or default_workers())
+    columnar = columnar and numpy_available()
+    if not isinstance(source, str) and not source:
+        return {name: calc_range(cfg, [], start, end) for name, cfg in cfgs.items()}
+
+    tasks = _plan_tasks(source, start, end, workers, shard)
+    jobs = [(name, cfg.model_dump(), task) for name, cfg in cfgs.items() for task in tasks]
+
+    if workers == 1 and executor is None:
+        # Sin pool: mismo camino de cálculo/mezcla, en este proceso
+        done = [_range_task(data, *task, columnar) for _name, data, task in jobs]
+    else:
+        pool = executor or ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [pool.submit(_range_task, data, *task, columnar) for _name, data, task in jobs]
+            done = [f.result() for f in futures]
+        finally:
+            if executor is None:
+                pool.shutdown(cancel_futures=True)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for i, (name, cfg) in enumerate(cfgs.items()):
+        parts = done[i * len(tasks) : (i + 1) * len(tasks)]
+        results[name] = _merge(cfg, parts, start, end, shard)
+    return results
+
+
+def calc_range_parallel(
+    cfg: IncentivosConfig,
+    source: Source,
+    start: YearMonth,
+    end: YearMonth,
+    workers: Optional[int] = None,
+    shard: str = "deals",
+    columnar: bool = False,
+) -> Dict[str, Any]:
+    """Igual que `calc_range`, repartido en `workers` procesos."""
+    return calc_variants_parallel({"cfg": cfg}, source, start, end, workers, shard, columnar)["cfg"]
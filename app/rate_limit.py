@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Deque, Dict, Mapping, Optional
+
+# Scheduler compartido por todos los requests de un SellClient:
+#   - tope de concurrencia (adaptativo: baja a la mitad con cada 429, sube de a 1)
+#   - token bucket de requests/s (AIMD: baja a la mitad con 429, sube de a poco con éxitos)
+#   - pausa GLOBAL cuando llega un 429 (Retry-After) o el cupo informado en headers se agota
+# Así los reintentos esperan la pausa en vez de sumarse a la tormenta de 429.
+
+# Sin Retry-After ni headers de cupo: pausa mínima tras un 429
+DEFAULT_PAUSE_S = 1.0
+MAX_PAUSE_S = 120.0
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Retry-After en segundos (acepta segundos o fecha HTTP)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+def _header_float(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    for name in names:
+        raw = headers.get(name)
+        if raw is None:
+            continue
+        try:
+            return float(raw)
+        except ValueError:
+            continue
+    return None
+
+
+def quota_pause(headers: Mapping[str, str]) -> Optional[float]:
+    """Segundos hasta que se renueve el cupo si los headers dicen que se agotó."""
+    remaining = _header_float(headers, "x-ratelimit-remaining", "ratelimit-remaining")
+    if remaining is None or remaining > 0:
+        return None
+    reset = _header_float(headers, "x-ratelimit-reset", "ratelimit-reset")
+    if reset is None:
+        return DEFAULT_PAUSE_S
+    if reset > 1e9:
+        # epoch en segundos
+        reset -= time.time()
+    return max(0.0, reset)
+
+
+class RateScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = 1,
+        rate_per_s: Optional[float] = None,
+        burst: Optional[int] = None,
+        min_rate_per_s: float = 0.5,
+        adaptive: bool = True,
+    ):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.concurrency = self.max_concurrency
+        # None = sin límite de requests/s (hasta el primer 429, si es adaptativo)
+        self.rate: Optional[float] = float(rate_per_s) if rate_per_s else None
+        self.max_rate = self.rate
+        self.min_rate = float(min_rate_per_s)
+        self.burst = max(1, int(burst or self.max_concurrency))
+        self.adaptive = adaptive
+
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._active = 0
+        self._cond = asyncio.Condition()
+        self._bucket = asyncio.Lock()
+        # Momentos de respuestas OK recientes => throughput observado
+        self._ok_times: Deque[float] = deque(maxlen=256)
+
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.pauses = 0
+        self.wait_s = 0.0
+        self.last_pause_s: Optional[float] = None
+
+    # ---------------------------
+    # Espera antes de cada request
+    # ---------------------------
+
+    async def _wait_pause(self) -> None:
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            self.wait_s += delay
+            await asyncio.sleep(delay)
+
+    async def _take_token(self) -> None:
+        async with self._bucket:
+            while self.rate is not None:
+                now = time.monotonic()
+                self._tokens = min(float(self.burst), self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+                self.wait_s += delay
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Turno para un request: respeta pausa global, concurrencia y tasa."""
+        await self._wait_pause()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self.concurrency)
+            self._active += 1
+        try:
+            await self._take_token()
+            # Un 429 pudo llegar mientras esperábamos token
+            await self._wait_pause()
+            self.requests += 1
+            yield
+        finally:
+            async with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    # ---------------------------
+    # Lo que dice Sell
+    # ---------------------------
+
+    def observed_rate(self) -> Optional[float]:
+        """Respuestas OK por segundo en la ventana reciente."""
+        if len(self._ok_times) < 2:
+            return None
+        span = self._ok_times[-1] - self._ok_times[0]
+        return (len(self._ok_times) - 1) / span if span > 0 else None
+
+    def pause(self, seconds: float) -> None:
+        seconds = min(max(0.0, seconds), MAX_PAUSE_S)
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self.pauses += 1
+            self.last_pause_s = seconds
+
+    def on_response(self, status_code: int, headers: Mapping[str, str]) -> None:
+        if status_code == 429:
+            self.throttled += 1
+            # Varios 429 de requests que ya estaban en vuelo cuentan como una sola señal
+            already_paused = time.monotonic() < self._paused_until
+            wait = parse_retry_after(headers.get("retry-after"))
+            if wait is None:
+                wait = quota_pause(headers)
+            self.pause(DEFAULT_PAUSE_S if wait is None else wait)
+            if self.adaptive and not already_paused:
+                self._decrease()
+            return
+
+        wait = quota_pause(headers)
+        if wait is not None:
+            self.pause(wait)
+        if status_code < 400:
+            self._ok_times.append(time.monotonic())
+            if self.adaptive:
+                self._increase()
+
+    def _decrease(self) -> None:
+        self.concurrency = max(1, self.concurrency // 2)
+        current = self.rate if self.rate is not None else self.observed_rate()
+        if current is None:
+            # Todavía no sabemos a qué ritmo íbamos: basta con la pausa de Retry-After
+            return
+        self.rate = max(self.min_rate, current / 2)
+        self._tokens = min(self._tokens, 1.0)
+
+    def _increase(self) -> None:
+        if self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+        if self.rate is not None:
+            # Aumento aditivo: ~+1 req/s por cada segundo de respuestas OK
+            self.rate += 1.0 / self.rate
+            if self.max_rate is not None:
+                self.rate = min(self.rate, self.max_rate)
+
+    def status(self) -> Dict[str, Any]:
+        paused_for = self._paused_until - time.monotonic()
+        observed = self.observed_rate()
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "pauses": self.pauses,
+            "wait_s": round(self.wait_s, 3),
+            "paused_for_s": round(paused_for, 3) if paused_for > 0 else 0.0,
+            "last_pause_s": self.last_pause_s,
+            "concurrency": self.concurrency,
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "rate_per_s": round(self.rate, 3) if self.rate is not None else None,
+            "observed_rate_per_s": round(observed, 3) if observed is not None else None,
+        }
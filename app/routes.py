@@ -1,23 +1,184 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+from typing import Any, Dict, List, Optional
 
-from .calculator import calc_deal, calc_month
-from .config import Settings, load_incentivos_config
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from .calculator import calc_deal, summarize_deals
+from .config import ConfigProvider, IncentivosConfig, Settings
+from .deal_memo import DealMemo
+from .deal_store import DealStore
+from .fastjson import FastJSONResponse
+from .live_aggregates import LiveAggregates
+from .metrics import REGISTRY, family
+from .monthly_cache import MonthlyCache
+from .scenarios import MAX_SCENARIOS, apply_overrides
 from .sell_client import SellClient
+from .service import (
+    compute_months,
+    compute_range,
+    compute_scenarios,
+    format_year_month,
+    parse_year_month,
+    stream_month_deals,
+    sync_live,
+)
+from .singleflight import SingleFlight
 
 router = APIRouter()
 
+# Coalescing de requests idénticos en vuelo: N dashboards abriendo el mismo mes
+# comparten una sola descarga + cálculo (con o sin cache mensual).
+_monthly_flight = SingleFlight()
+_deal_flight = SingleFlight()
+_range_flight = SingleFlight()
+
+# Tope de meses por request en /v1/monthly?from=&to=
+MAX_RANGE_MONTHS = 60
+
+
+def get_sell(request: Request) -> SellClient:
+    """SellClient compartido, creado en el lifespan de la app."""
+    return request.app.state.sell
+
+
+def get_app_settings(request: Request) -> Settings:
+    return request.app.state.settings
+
+
+def get_config_provider(request: Request) -> ConfigProvider:
+    """Config en memoria con hot reload (ver ConfigProvider)."""
+    return request.app.state.config_provider
+
+
+def get_monthly_cache(request: Request) -> Optional[MonthlyCache]:
+    """Cache mensual (None si MONTHLY_CACHE_ENABLED=false)."""
+    return getattr(request.app.state, "monthly_cache", None)
+
+
+def get_deal_store(request: Request) -> Optional[DealStore]:
+    """Snapshot local de deals (None si DEAL_STORE_ENABLED=false)."""
+    return getattr(request.app.state, "deal_store", None)
+
+
+def get_deal_memo(request: Request) -> Optional[DealMemo]:
+    """Memo de aportes por deal (None si DEAL_MEMO_MAX_ENTRIES=0)."""
+    return getattr(request.app.state, "deal_memo", None)
+
+
+def get_live_aggregates(request: Request) -> Optional[LiveAggregates]:
+    """Agregados mensuales en vivo (None si no hay deal store)."""
+    return getattr(request.app.state, "live_aggregates", None)
+
 
 @router.get("/health")
 async def health():
     return {"ok": True}
 
 
+@router.get("/v1/cache/status")
+async def cache_status(
+    monthly_cache: Optional[MonthlyCache] = Depends(get_monthly_cache),
+    deal_store: Optional[DealStore] = Depends(get_deal_store),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+    deal_memo: Optional[DealMemo] = Depends(get_deal_memo),
+    live: Optional[LiveAggregates] = Depends(get_live_aggregates),
+    sell: SellClient = Depends(get_sell),
+):
+    return {
+        "config": config_provider.status(),
+        "sell_scheduler": sell.scheduler.status(),
+        "live_aggregates": live.status() if live is not None else {"enabled": False},
+        "deal_memo": deal_memo.status() if deal_memo is not None else {"enabled": False},
+        "monthly": monthly_cache.status() if monthly_cache is not None else {"enabled": False},
+        "deal_store": deal_store.status() if deal_store is not None else {"enabled": False},
+        "singleflight": {
+            "monthly": {"started": _monthly_flight.started, "coalesced": _monthly_flight.coalesced},
+            "deals": {"started": _deal_flight.started, "coalesced": _deal_flight.coalesced},
+            "range": {"started": _range_flight.started, "coalesced": _range_flight.coalesced},
+        },
+    }
+
+
+def _scrape_families(
+    monthly_cache: Optional[MonthlyCache], deal_memo: Optional[DealMemo], sell: SellClient
+) -> List[str]:
+    # Contadores que ya llevan los objetos de la app: se leen recién al hacer scrape
+    out: List[str] = []
+    if monthly_cache is not None:
+        reads = {"hit": monthly_cache.hits, "stale": monthly_cache.stale, "miss": monthly_cache.misses}
+        out.append(
+            family(
+                "incentivos_monthly_cache_reads_total",
+                "counter",
+                "Lecturas del cache mensual por resultado",
+                [({"result": k}, v) for k, v in reads.items()],
+            )
+        )
+    if deal_memo is not None:
+        out.append(
+            family(
+                "incentivos_deal_memo_lookups_total",
+                "counter",
+                "Búsquedas en el memo de aportes por deal",
+                [({"result": "hit"}, deal_memo.hits), ({"result": "miss"}, deal_memo.misses)],
+            )
+        )
+        out.append(
+            family(
+                "incentivos_deal_memo_evictions_total",
+                "counter",
+                "Entradas desalojadas del memo",
+                [({}, deal_memo.evictions)],
+            )
+        )
+    flights = {"monthly": _monthly_flight, "deals": _deal_flight, "range": _range_flight}
+    out.append(
+        family(
+            "incentivos_singleflight_total",
+            "counter",
+            "Cálculos iniciados vs requests que se sumaron a uno en vuelo",
+            [({"key": k, "result": "started"}, f.started) for k, f in flights.items()]
+            + [({"key": k, "result": "coalesced"}, f.coalesced) for k, f in flights.items()],
+        )
+    )
+    sched = sell.scheduler
+    out.append(
+        family(
+            "incentivos_sell_throttled_total", "counter", "Respuestas 429 de Sell", [({}, sched.throttled)]
+        )
+    )
+    out.append(
+        family(
+            "incentivos_sell_concurrency", "gauge", "Concurrencia actual hacia Sell", [({}, sched.concurrency)]
+        )
+    )
+    if sched.rate is not None:
+        out.append(family("incentivos_sell_rate_per_s", "gauge", "Tasa permitida hacia Sell", [({}, sched.rate)]))
+    return out
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(
+    monthly_cache: Optional[MonthlyCache] = Depends(get_monthly_cache),
+    deal_memo: Optional[DealMemo] = Depends(get_deal_memo),
+    sell: SellClient = Depends(get_sell),
+):
+    """Métricas en formato texto de Prometheus."""
+    body = REGISTRY.render(extra=_scrape_families(monthly_cache, deal_memo, sell))
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @router.get("/v1/config")
-async def get_config():
-    settings = Settings()
-    cfg = load_incentivos_config(settings.config_path)
+async def get_config(
+    settings: Settings = Depends(get_app_settings),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+):
+    cfg, cfg_hash = config_provider.get_with_hash()
     return {
         "sell_base_url": settings.sell_base_url,
         "pipeline_id": cfg.pipeline_id,
@@ -36,58 +197,321 @@ async def get_config():
         },
         "extras_enabled": cfg.extras_enabled,
         "timezone": cfg.timezone,
-        "notes": "Monthly endpoint uses v2 deals by stage_id and filters by FECHA DE CIRUGÍA locally.",
+        "monthly_fetch_mode": settings.monthly_fetch_mode,
+        "config_hash": cfg_hash,
+        "notes": (
+            "Monthly endpoint uses v2 deals by stage_id and filters by FECHA DE CIRUGÍA locally, "
+            "or Search API v3 with a server-side date filter when MONTHLY_FETCH_MODE=search."
+        ),
     }
 
 
-@router.get("/v1/deals/{deal_id}")
-async def incentives_for_deal(deal_id: int):
-    settings = Settings()
-    cfg = load_incentivos_config(settings.config_path)
+MAX_BATCH_IDS = 500
+
+
+class DealsBatchRequest(BaseModel):
+    ids: List[Any]
+    summary: bool = False
+
+
+def _batch_id(raw: Any) -> Any:
+    """id entero si se puede parsear ("01" == 1), o el texto tal cual para reportarlo inválido."""
+    text = str(raw).strip()
+    try:
+        return int(text)
+    except ValueError:
+        return text
 
-    async with SellClient(settings.sell_base_url, settings.sell_access_token, settings.timeout_s) as sell:
+
+async def _deals_batch(
+    raw_ids: List[Any], summary: bool, sell: SellClient, settings: Settings, cfg: IncentivosConfig
+) -> Dict[str, Any]:
+    # Dedupe por id ya parseado: "1" y "01" son el mismo deal
+    ids = list(dict.fromkeys(_batch_id(i) for i in raw_ids if str(i).strip()))
+    if not ids:
+        raise HTTPException(status_code=400, detail="Sin ids")
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_IDS} ids por request")
+
+    sem = asyncio.Semaphore(max(1, settings.deals_batch_concurrency))
+    deals: Dict[int, Dict[str, Any]] = {}
+
+    async def one(deal_id: Any) -> Dict[str, Any]:
+        if not isinstance(deal_id, int):
+            return {"id": deal_id, "ok": False, "status": 400, "error": "id inválido"}
         try:
-            deal = await sell.get_deal(deal_id)
+            async with sem:
+                deal = await sell.get_deal(deal_id)
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            if status == 404:
+                return {"id": deal_id, "ok": False, "status": 404, "error": "Deal no encontrado"}
+            return {"id": deal_id, "ok": False, "status": 502, "error": f"Sell respondió {status}"}
         except Exception as e:
-            raise HTTPException(status_code=502, detail=f"Error consultando Sell: {type(e).__name__}: {e}")
+            return {"id": deal_id, "ok": False, "status": 502, "error": f"{type(e).__name__}: {e}"}
+        if not deal or not deal.get("id"):
+            return {"id": deal_id, "ok": False, "status": 404, "error": "Deal no encontrado"}
+        deals[deal_id] = deal
+        return {"id": deal_id, "ok": True, "result": calc_deal(cfg, deal)}
+
+    results = await asyncio.gather(*(one(deal_id) for deal_id in ids))
+    out: Dict[str, Any] = {
+        "count": len(results),
+        "ok": sum(1 for r in results if r["ok"]),
+        "errors": sum(1 for r in results if not r["ok"]),
+        "results": results,
+    }
+    if summary:
+        found = [deals[deal_id] for deal_id in ids if deal_id in deals]
+        out["summary"] = summarize_deals(cfg, found)
+    return out
+
+
+@router.get("/v1/deals/batch")
+async def incentives_for_deals_batch(
+    ids: List[str] = Query(..., description="ids separados por coma (o repetidos: ids=1&ids=2)"),
+    summary: bool = Query(False, description="Agregar los deals por mes de fecha_cirugia (como calc_month)"),
+    sell: SellClient = Depends(get_sell),
+    settings: Settings = Depends(get_app_settings),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+):
+    raw_ids = [part for value in ids for part in value.split(",")]
+    return FastJSONResponse(await _deals_batch(raw_ids, summary, sell, settings, config_provider.get()))
+
+
+@router.post("/v1/deals/batch")
+async def incentives_for_deals_batch_post(
+    body: DealsBatchRequest,
+    sell: SellClient = Depends(get_sell),
+    settings: Settings = Depends(get_app_settings),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+):
+    return FastJSONResponse(await _deals_batch(body.ids, body.summary, sell, settings, config_provider.get()))
+
 
-    if not deal or not deal.get("id"):
+@router.get("/v1/deals/{deal_id}")
+async def incentives_for_deal(
+    deal_id: int,
+    sell: SellClient = Depends(get_sell),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+):
+    cfg, cfg_hash = config_provider.get_with_hash()
+
+    async def fetch_and_calc():
+        deal = await sell.get_deal(deal_id)
+        if not deal or not deal.get("id"):
+            return None
+        return calc_deal(cfg, deal)
+
+    try:
+        result = await _deal_flight.do((deal_id, cfg_hash), fetch_and_calc)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Error consultando Sell: {type(e).__name__}: {e}")
+
+    if result is None:
         raise HTTPException(status_code=404, detail="Deal no encontrado")
 
-    return calc_deal(cfg, deal)
+    return FastJSONResponse(result)
+
+
+@router.get("/v1/monthly")
+async def incentives_for_range(
+    from_: str = Query(..., alias="from", description="YYYY-MM"),
+    to: str = Query(..., description="YYYY-MM (inclusive)"),
+    sell: SellClient = Depends(get_sell),
+    deal_store: Optional[DealStore] = Depends(get_deal_store),
+    deal_memo: Optional[DealMemo] = Depends(get_deal_memo),
+    settings: Settings = Depends(get_app_settings),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+):
+    try:
+        start = parse_year_month(from_)
+        end = parse_year_month(to)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Formato inválido. Usa from=YYYY-MM&to=YYYY-MM")
+
+    n_months = (end[0] - start[0]) * 12 + (end[1] - start[1]) + 1
+    if n_months < 1:
+        raise HTTPException(status_code=400, detail="Rango inválido: from > to")
+    if n_months > MAX_RANGE_MONTHS:
+        raise HTTPException(status_code=400, detail=f"Rango demasiado largo (máx {MAX_RANGE_MONTHS} meses)")
+
+    cfg, cfg_hash = config_provider.get_with_hash()
+    key = (start, end, cfg_hash)
+
+    try:
+        result = await _range_flight.do(
+            key, lambda: compute_range(sell, start, end, cfg, settings, deal_store, deal_memo)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Error consultando deals: {type(e).__name__}: {e}",
+        )
+    return FastJSONResponse(result)
 
 
 @router.get("/v1/monthly/{year_month}")
-async def incentives_for_month(year_month: str):
+async def incentives_for_month(
+    year_month: str,
+    sell: SellClient = Depends(get_sell),
+    monthly_cache: Optional[MonthlyCache] = Depends(get_monthly_cache),
+    deal_store: Optional[DealStore] = Depends(get_deal_store),
+    deal_memo: Optional[DealMemo] = Depends(get_deal_memo),
+    live: Optional[LiveAggregates] = Depends(get_live_aggregates),
+    settings: Settings = Depends(get_app_settings),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+):
     # year_month: YYYY-MM
     try:
-        year_s, month_s = year_month.split("-")
-        year = int(year_s)
-        month = int(month_s)
-        if not (1 <= month <= 12):
-            raise ValueError
+        year_month = format_year_month(*parse_year_month(year_month))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Formato inválido. Usa YYYY-MM")
+
+    cfg, cfg_hash = config_provider.get_with_hash()
+    key = (year_month, cfg_hash)
+
+    try:
+        if monthly_cache is None:
+            months = await _monthly_flight.do(
+                key, lambda: compute_months(sell, [year_month], cfg, settings, deal_store, deal_memo, live)
+            )
+            return FastJSONResponse(months[year_month])
+
+        result = await _monthly_flight.do(key, lambda: monthly_cache.get_month(year_month))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Error consultando deals: {type(e).__name__}: {e}",
+        )
+
+    # El JSON del mes se codifica una vez por entrada de cache; los HIT devuelven esos bytes
+    headers = {"X-Cache": result.cache}
+    if result.generated_at:
+        headers["X-Generated-At"] = result.generated_at
+    return Response(content=result.encoded(), media_type="application/json", headers=headers)
+
+
+class ScenariosRequest(BaseModel):
+    # nombre -> overrides parciales de la config, ej {"extras_enabled": false}
+    scenarios: Dict[str, Dict[str, Any]]
+
+
+@router.post("/v1/monthly/{year_month}/scenarios")
+async def monthly_scenarios(
+    year_month: str,
+    body: ScenariosRequest,
+    sell: SellClient = Depends(get_sell),
+    deal_store: Optional[DealStore] = Depends(get_deal_store),
+    settings: Settings = Depends(get_app_settings),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+):
+    """What-if: el mes con la config actual y con cada escenario, con deltas vs la base."""
+    try:
+        year_month = format_year_month(*parse_year_month(year_month))
     except Exception:
         raise HTTPException(status_code=400, detail="Formato inválido. Usa YYYY-MM")
+    if not body.scenarios:
+        raise HTTPException(status_code=400, detail="Sin escenarios")
+    if len(body.scenarios) > MAX_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_SCENARIOS} escenarios")
 
-    settings = Settings()
-    cfg = load_incentivos_config(settings.config_path)
+    cfg = config_provider.get()
+    try:
+        variants = {name: apply_overrides(cfg, overrides) for name, overrides in body.scenarios.items()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    try:
+        result = await compute_scenarios(sell, year_month, variants, cfg, settings, deal_store)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Error consultando deals: {type(e).__name__}: {e}",
+        )
+    return FastJSONResponse(result)
+
+
+@router.get("/v1/monthly/{year_month}/deals.ndjson")
+async def monthly_deals_export(
+    year_month: str,
+    sell: SellClient = Depends(get_sell),
+    settings: Settings = Depends(get_app_settings),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+):
+    """Detalle por deal del mes (una línea `calc_deal` por deal) y una línea final con el resumen."""
+    try:
+        year_month = format_year_month(*parse_year_month(year_month))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Formato inválido. Usa YYYY-MM")
+    cfg = config_provider.get()
     if not cfg.stage_ids:
         raise HTTPException(status_code=400, detail="Config inválida: stage_ids vacío")
 
-    async with SellClient(settings.sell_base_url, settings.sell_access_token, settings.timeout_s) as sell:
-        deals_by_id: dict[int, dict] = {}
-        for sid in cfg.stage_ids:
-            try:
-                deals = await sell.list_deals_by_stage(int(sid), per_page=settings.per_page)
-            except Exception as e:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Error consultando deals stage_id={sid}: {type(e).__name__}: {e}",
-                )
-            for d in deals:
-                did = d.get("id")
-                if did is not None:
-                    deals_by_id[int(did)] = d
-
-    return calc_month(cfg, list(deals_by_id.values()), year, month)
+    # Siempre directo desde las páginas de Sell (sin DealStore): la primera línea sale con la primera página
+    return StreamingResponse(
+        stream_month_deals(sell, year_month, cfg, settings),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="incentivos-{year_month}.ndjson"'},
+    )
+
+
+class DealUpdatedEvent(BaseModel):
+    deal_id: int
+
+
+@router.post("/v1/events/deal-updated")
+async def deal_updated(
+    event: DealUpdatedEvent,
+    sell: SellClient = Depends(get_sell),
+    settings: Settings = Depends(get_app_settings),
+    config_provider: ConfigProvider = Depends(get_config_provider),
+    deal_store: Optional[DealStore] = Depends(get_deal_store),
+    live: Optional[LiveAggregates] = Depends(get_live_aggregates),
+    monthly_cache: Optional[MonthlyCache] = Depends(get_monthly_cache),
+):
+    """Un deal cambió en Sell: se vuelve a pedir SÓLO ese deal y se actualizan
+    los totales de su mes (y del mes anterior si cambió fecha_cirugia)."""
+    if deal_store is None or live is None:
+        raise HTTPException(
+            status_code=409,
+            detail="Requiere DEAL_STORE_ENABLED=true y LIVE_AGGREGATES_ENABLED=true",
+        )
+
+    cfg, cfg_hash = config_provider.get_with_hash()
+    try:
+        if not deal_store.loaded or not live.matches(cfg):
+            await sync_live(sell, cfg, settings, deal_store, live)
+        try:
+            deal = await sell.get_deal(event.deal_id)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                raise
+            deal = {}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Error consultando Sell: {type(e).__name__}: {e}")
+
+    stored = deal_store.apply(deal) if deal.get("id") else None
+    if stored is not None:
+        action = "upserted"
+        affected = live.upsert(stored)
+    else:
+        # Borrado en Sell o fuera de las etapas configuradas
+        action = "removed"
+        deal_store.remove(event.deal_id)
+        affected = live.remove(event.deal_id)
+
+    months = [format_year_month(*ym) for ym in affected]
+    if monthly_cache is not None:
+        for ym, (year, month) in zip(months, affected):
+            monthly_cache.put(ym, live.month_result(year, month))
+
+    return {"deal_id": event.deal_id, "action": action, "months": months, "config_hash": cfg_hash}
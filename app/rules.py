@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from .config import IncentivosConfig, config_hash
+from .utils import normalize_int, normalize_list_value, parse_iso_date
+
+# Plan de evaluación compilado desde IncentivosConfig: acá viven las reglas de
+# BAR / colaboradores. Se compila una vez por config y se reutiliza en cada deal
+# (keys de custom_fields ya resueltas, códigos "paga" como frozenset, rol -> slots).
+
+# Pago por rol: (slot base, slot extra)
+ROLE_SLOTS: Tuple[Tuple[str, str, str], ...] = (
+    ("c1", "1", "4"),
+    ("c2", "2", "5"),
+    ("c3", "3", "6"),
+)
+EXTRA_SLOTS = frozenset((4, 5, 6))
+
+
+@dataclass(slots=True)
+class BarResult:
+    slot: int
+    codigo: Optional[int]
+    paga: Optional[bool]
+    monto: Optional[int]
+    error: Optional[str]
+    missing: bool = False
+
+
+class CompiledBar:
+    __slots__ = ("slot", "key", "min", "paga_codes", "extras_off", "invalid_error")
+
+    def __init__(self, slot: int, cfg: IncentivosConfig):
+        r = cfg.bars[str(slot)]
+        self.slot = slot
+        self.key = r.field_id
+        self.min = r.min
+        self.paga_codes: FrozenSet[int] = frozenset(r.max_values or [r.max])
+        self.extras_off = slot in EXTRA_SLOTS and not cfg.extras_enabled
+        self.invalid_error = f"Valor inválido (esperado {r.min} o {r.max})"
+
+    def code(self, custom_fields: Dict[str, Any]) -> Optional[int]:
+        raw_id, raw_label = normalize_list_value(custom_fields.get(self.key))
+        return normalize_int(raw_id or raw_label)
+
+    def evaluate_code(self, raw_int: Optional[int]) -> BarResult:
+        slot = self.slot
+        if raw_int is None:
+            # Regla solicitada: si falta BAR en un deal, no se "cancela" el deal.
+            # Simplemente se omite este BAR del conteo/suma.
+            return BarResult(slot=slot, codigo=None, paga=None, monto=None, error=None, missing=True)
+
+        if self.extras_off:
+            # Extras apagados => no cuentan para monto
+            return BarResult(slot=slot, codigo=raw_int, paga=False, monto=0, error=None)
+
+        # Regla solicitada (última): los montos reales son el MISMO código en pesos.
+        # - Si viene el código mínimo (ej 1,2,3,4,5,6) => monto = ese código (pesos)
+        # - Si viene un código "paga" (ej 8001,5002,...) => monto = ese código (pesos)
+        # - Si el campo no viene / null => missing (se omite del conteo y suma)
+        if raw_int in self.paga_codes:
+            return BarResult(slot=slot, codigo=raw_int, paga=True, monto=raw_int, error=None)
+
+        if raw_int == self.min:
+            return BarResult(slot=slot, codigo=raw_int, paga=False, monto=raw_int, error=None)
+
+        return BarResult(slot=slot, codigo=raw_int, paga=None, monto=None, error=self.invalid_error)
+
+    def evaluate(self, custom_fields: Dict[str, Any]) -> BarResult:
+        return self.evaluate_code(self.code(custom_fields))
+
+
+class RulePlan:
+    __slots__ = (
+        "cfg",
+        "fecha_key",
+        "missing_fecha_error",
+        "bars",
+        "collaborator_keys",
+        "role_slots",
+        "fields",
+        "_hash",
+    )
+
+    def __init__(self, cfg: IncentivosConfig):
+        self.cfg = cfg
+        self.fecha_key = cfg.fecha_cirugia_field_id
+        self.missing_fecha_error = f"Falta fecha_cirugia (campo '{cfg.fecha_cirugia_field_id}')"
+        self.bars: Tuple[CompiledBar, ...] = tuple(CompiledBar(slot, cfg) for slot in range(1, 7))
+        self.collaborator_keys: Tuple[Tuple[str, str], ...] = tuple(cfg.collaborator_field_ids.items())
+        self.role_slots = ROLE_SLOTS
+        # Qué custom_fields se leen: dos planes con los mismos `fields` parsean igual un deal
+        self.fields: Tuple[Any, ...] = (
+            self.fecha_key,
+            tuple(bar.key for bar in self.bars),
+            self.collaborator_keys,
+        )
+        self._hash: Optional[str] = None
+
+    @property
+    def config_hash(self) -> str:
+        if self._hash is None:
+            self._hash = config_hash(self.cfg)
+        return self._hash
+
+    def fecha(self, custom_fields: Dict[str, Any]) -> Optional[date]:
+        return parse_iso_date(custom_fields.get(self.fecha_key))
+
+    def collaborators(self, custom_fields: Dict[str, Any]) -> Dict[str, Dict[str, Optional[str]]]:
+        out: Dict[str, Dict[str, Optional[str]]] = {}
+        for role, key in self.collaborator_keys:
+            oid, label = normalize_list_value(custom_fields.get(key))
+            out[role] = {"id": oid, "label": label or oid}
+        return out
+
+
+def compile_config(cfg: IncentivosConfig) -> RulePlan:
+    return RulePlan(cfg)
+
+
+def get_plan(cfg: IncentivosConfig) -> RulePlan:
+    """Plan compilado de `cfg` (se guarda en la propia config)."""
+    plan = cfg._plan
+    # model_copy() copia los atributos privados: validar que el plan sea de ESTA config
+    if plan is None or plan.cfg is not cfg:
+        plan = compile_config(cfg)
+        cfg._plan = plan
+    return plan
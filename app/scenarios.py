@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable
+
+from .calculator import DealContribution, MonthAggregator, month_bounds
+from .config import BarRule, IncentivosConfig
+from .deal_record import Deal, deal_fecha, deal_fields
+from .rules import get_plan
+
+# What-if: el mismo mes evaluado con varias configs ("escenarios") sobre UNA sola
+# descarga. Cada deal se parsea una vez (fecha, códigos BAR, colaboradores) con la
+# config base; por escenario sólo corre la etapa de reglas (CompiledBar.evaluate_code).
+
+MAX_SCENARIOS = 20
+
+# Lo que cambia QUÉ se descarga o parsea no puede variar entre escenarios
+_SHARED_FIELDS = ("pipeline_id", "stage_ids", "fecha_cirugia_field_id", "collaborator_field_ids")
+
+# Claves aceptadas por BAR (incluye el formato Node); lo demás se rechaza en vez de
+# ignorarse, así un typo no pasa por un escenario "sin impacto"
+_BAR_KEYS = frozenset(BarRule.model_fields) | {"field_name", "allowed"}
+
+
+def _merge(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(out.get(key), dict):
+            out[key] = _merge(out[key], value)
+        else:
+            out[key] = value
+    return out
+
+
+def apply_overrides(base: IncentivosConfig, overrides: Dict[str, Any]) -> IncentivosConfig:
+    """Config base + overrides parciales (ej {"extras_enabled": false, "bars": {"2": {"max_values": [5002]}}}).
+
+    Lanza ValueError si el override es inválido o toca campos que cambian la descarga.
+    """
+    changed = [k for k in _SHARED_FIELDS if k in overrides]
+    if changed:
+        raise ValueError(f"Los escenarios sólo pueden cambiar reglas, no {changed}")
+    unknown = sorted(k for k in overrides if k not in IncentivosConfig.model_fields)
+    if unknown:
+        raise ValueError(f"Campos desconocidos en el override: {unknown}")
+    data = base.model_dump()
+    bars = dict(overrides.get("bars") or {})
+    for slot, rule in bars.items():
+        if slot not in data["bars"]:
+            raise ValueError(f"BAR desconocido: {slot!r}")
+        if not isinstance(rule, dict):
+            raise ValueError(f"Override inválido para BAR{slot}")
+        unknown = sorted(k for k in rule if k not in _BAR_KEYS)
+        if unknown:
+            raise ValueError(f"Campos desconocidos en el override de BAR{slot}: {unknown}")
+        if "field_id" in rule or "field_name" in rule:
+            raise ValueError("Los escenarios sólo pueden cambiar reglas, no field_id")
+        if "allowed" in rule:
+            # Formato Node: `allowed` reemplaza min/max/max_values
+            base_rule = {k: v for k, v in data["bars"][slot].items() if k not in ("min", "max", "max_values")}
+            data["bars"][slot] = {**base_rule, **rule}
+            bars[slot] = {}
+    merged = _merge(data, {**overrides, "bars": bars})
+    try:
+        return IncentivosConfig.model_validate(merged)
+    except Exception as e:
+        raise ValueError(f"Override inválido: {e}") from e
+
+
+class ScenarioEngine:
+    """Agrega un mes para la config base y cada escenario en una sola pasada."""
+
+    def __init__(self, baseline: IncentivosConfig, scenarios: Dict[str, IncentivosConfig], year: int, month: int):
+        if len(scenarios) > MAX_SCENARIOS:
+            raise ValueError(f"Máximo {MAX_SCENARIOS} escenarios")
+        self.year = year
+        self.month = month
+        self.start, self.end = month_bounds(year, month)
+        self.plan = get_plan(baseline)
+        self.baseline = MonthAggregator(baseline, year, month, dedupe=False)
+        self.scenarios = {name: MonthAggregator(cfg, year, month, dedupe=False) for name, cfg in scenarios.items()}
+        self.processed = 0
+
+    def add(self, deal: Deal) -> bool:
+        self.processed += 1
+        plan = self.plan
+        fecha = deal_fecha(plan, deal)
+        if fecha is None or not (self.start <= fecha < self.end):
+            return False
+
+        # Parseo compartido: una vez por deal, no por escenario
+        codes, collaborators = deal_fields(plan, deal)
+        deal_id = deal.get("id")
+        for agg in (self.baseline, *self.scenarios.values()):
+            agg.apply(DealContribution(deal_id, fecha).evaluate_parsed(agg.plan, codes, collaborators))
+        return True
+
+    def add_many(self, deals: Iterable[Deal]) -> None:
+        for deal in deals:
+            self.add(deal)
+
+    def result(self) -> Dict[str, Any]:
+        self.baseline.processed = self.processed
+        base = self.baseline.result()
+        out: Dict[str, Any] = {
+            "month": base["month"],
+            "config_hash": self.plan.config_hash,
+            "baseline": base,
+            "scenarios": {},
+        }
+        for name, agg in self.scenarios.items():
+            agg.processed = self.processed
+            res = agg.result()
+            out["scenarios"][name] = {
+                "config_hash": agg.plan.config_hash,
+                "result": res,
+                "delta": month_delta(base, res),
+            }
+        return out
+
+
+def month_delta(base: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    """Diferencia `other - base` entre dos resultados de calc_month."""
+    totals = {s: other["totals_by_slot"][s] - base["totals_by_slot"][s] for s in base["totals_by_slot"]}
+    counts = {
+        s: {k: other["counts_by_slot"][s][k] - n for k, n in base["counts_by_slot"][s].items()}
+        for s in base["counts_by_slot"]
+    }
+    empty = {"base": 0, "extra": 0, "total": 0, "deals": 0}
+    persons: Dict[str, Dict[str, Any]] = {}
+    for pid in dict.fromkeys([*base["totals_by_person"], *other["totals_by_person"]]):
+        b = base["totals_by_person"].get(pid) or empty
+        o = other["totals_by_person"].get(pid) or empty
+        diff = {k: o[k] - b[k] for k in ("base", "extra", "total")}
+        if any(diff.values()):
+            label = (other["totals_by_person"].get(pid) or base["totals_by_person"][pid])["label"]
+            persons[pid] = {"label": label, **diff}
+    return {
+        "total": sum(totals.values()),
+        "totals_by_slot": totals,
+        "counts_by_slot": counts,
+        "totals_by_person": persons,
+        "deal_errors": len(other["deal_errors"]) - len(base["deal_errors"]),
+    }
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from .config import IncentivosConfig
+from .sell_client import SellClient
+
+# Fetch mensual vía Search API v3: el servidor filtra por etapa y por ventana de
+# FECHA DE CIRUGÍA, y sólo devuelve los campos que usa la config. Los hits se
+# reconstruyen con la forma de un deal v2 ({"custom_fields": {nombre: valor}})
+# para que el calculador no cambie.
+
+BASE_PROJECTION = ["id", "name", "stage_id", "created_at", "updated_at"]
+CF_PREFIX = "custom_fields."
+
+
+def config_field_names(cfg: IncentivosConfig) -> List[str]:
+    """Custom fields que usa la config (fecha, colaboradores, BAR1..6), sin repetir."""
+    names = [cfg.fecha_cirugia_field_id]
+    names.extend(cfg.collaborator_field_ids.values())
+    names.extend(cfg.bars[k].field_id for k in sorted(cfg.bars, key=int))
+    return list(dict.fromkeys(names))
+
+
+def _search_attr(search_api_id: str) -> str:
+    return search_api_id if search_api_id.startswith(CF_PREFIX) else f"{CF_PREFIX}{search_api_id}"
+
+
+async def resolve_search_fields(sell: SellClient, names: List[str]) -> Dict[str, str]:
+    """nombre de custom field -> atributo Search API ('custom_fields.xxx')."""
+    mapping = await sell.get_deal_custom_fields_mapping()
+    by_name = {m.get("name"): m.get("search_api_id") for m in mapping if m.get("search_api_id")}
+    missing = [n for n in names if n not in by_name]
+    if missing:
+        raise LookupError(f"Custom fields sin search_api_id: {missing}")
+    return {n: _search_attr(str(by_name[n])) for n in names}
+
+
+def month_filter(cfg: IncentivosConfig, fecha_attr: str, start: date, end: date) -> Dict[str, Any]:
+    return {
+        "and": [
+            {"filter": {"attribute": {"name": "stage_id"}, "parameter": {"any": [int(s) for s in cfg.stage_ids]}}},
+            {
+                "filter": {
+                    "attribute": {"name": fecha_attr},
+                    # range es inclusivo en ambos extremos
+                    "parameter": {"range": {"gte": start.isoformat(), "lte": (end - timedelta(days=1)).isoformat()}},
+                }
+            },
+        ]
+    }
+
+
+def hit_to_deal(hit: Dict[str, Any], attr_to_name: Dict[str, str]) -> Dict[str, Any]:
+    """Convierte un hit v3 a la forma v2 que espera calc_deal.
+
+    Los custom fields pueden venir anidados ({"custom_fields": {"xxx": v}}) o
+    planos ({"custom_fields.xxx": v}); soportamos ambos.
+    """
+    deal = {k: hit.get(k) for k in BASE_PROJECTION if k in hit}
+    cf: Dict[str, Any] = {}
+    nested = hit.get("custom_fields") or {}
+    for attr, name in attr_to_name.items():
+        short = attr[len(CF_PREFIX):]
+        if attr in hit:
+            cf[name] = hit[attr]
+        elif short in nested:
+            cf[name] = nested[short]
+        elif name in nested:
+            cf[name] = nested[name]
+    deal["custom_fields"] = cf
+    return deal
+
+
+async def search_deals_in_window(
+    sell: SellClient,
+    cfg: IncentivosConfig,
+    start: date,
+    end: date,
+    per_page: int = 200,
+) -> List[Dict[str, Any]]:
+    """Deals de las etapas configuradas con FECHA DE CIRUGÍA en [start, end)."""
+    names = config_field_names(cfg)
+    name_to_attr = await resolve_search_fields(sell, names)
+    attr_to_name = {a: n for n, a in name_to_attr.items()}
+
+    hits = await sell.search_deals(
+        filter_obj=month_filter(cfg, name_to_attr[cfg.fecha_cirugia_field_id], start, end),
+        projection=BASE_PROJECTION + list(attr_to_name),
+        per_page=per_page,
+    )
+    return [hit_to_deal(h, attr_to_name) for h in hits]
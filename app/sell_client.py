@@ -1,9 +1,22 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import asyncio
+import contextlib
+import re
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
+from dateutil.parser import isoparse
+from tenacity import RetryCallState, retry, retry_if_exception, stop_after_attempt, wait_exponential
+
+from .fastjson import loads
+from .metrics import SELL_PAGES, SELL_REQUEST_SECONDS, SELL_RETRIES
+from .rate_limit import RateScheduler
+
+# /v2/deals/123 -> /v2/deals/{id} (label acotado para las métricas)
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
 
 
 def _is_retryable(exc: Exception) -> bool:
@@ -16,6 +29,50 @@ def _is_retryable(exc: Exception) -> bool:
     return False
 
 
+_backoff = wait_exponential(multiplier=0.5, min=0.5, max=8)
+
+
+def _retry_wait(retry_state: RetryCallState) -> float:
+    exc = retry_state.outcome.exception() if retry_state.outcome else None
+    if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429:
+        # El scheduler ya pausó TODOS los requests según Retry-After; no sumar backoff propio
+        return 0.0
+    return _backoff(retry_state)
+
+
+def _count_retry(retry_state: RetryCallState) -> None:
+    sell = retry_state.args[0] if retry_state.args else None
+    if isinstance(sell, SellClient):
+        sell.scheduler.retries += 1
+    exc = retry_state.outcome.exception() if retry_state.outcome else None
+    if isinstance(exc, httpx.HTTPStatusError):
+        reason = str(exc.response.status_code)
+    else:
+        reason = type(exc).__name__
+    SELL_RETRIES.inc(retry_state.fn.__name__ if retry_state.fn else "?", reason)
+
+
+_sell_retry = retry(
+    retry=retry_if_exception(_is_retryable),
+    wait=_retry_wait,
+    stop=stop_after_attempt(6),
+    before_sleep=_count_retry,
+    reraise=True,
+)
+
+
+def _endpoint(url: str) -> str:
+    return _ID_SEGMENT.sub("/{id}", httpx.URL(url).path)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
 class SellClient:
     def __init__(
         self,
@@ -23,6 +80,15 @@ class SellClient:
         token: str,
         timeout_s: float = 30.0,
         search_base_url: Optional[str] = None,
+        max_concurrency: int = 1,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry_s: float = 30.0,
+        http2: bool = False,
+        rate_per_s: Optional[float] = None,
+        rate_burst: Optional[int] = None,
+        adaptive_rate: bool = True,
     ):
         # Core API (v2)
         self.base_url = base_url.rstrip("/")
@@ -34,49 +100,98 @@ class SellClient:
         }
         self._timeout = timeout_s
         self._client: Optional[httpx.AsyncClient] = None
+        # Permite inyectar un transporte (tests / backend falso local)
+        self._transport = transport
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_s,
+        )
+        # HTTP/2 requiere `pip install httpx[http2]`; si no está, seguimos en HTTP/1.1
+        self._http2 = bool(http2) and _http2_available()
 
-    async def __aenter__(self) -> "SellClient":
-        self._client = httpx.AsyncClient(timeout=self._timeout)
+        # Search API (v3): algunas cuentas responden 403. Una vez visto, no se reintenta.
+        self.search_forbidden = False
+        self._cf_mapping: Optional[List[Dict[str, Any]]] = None
+        # Límite de requests simultáneos contra Sell (1 = secuencial, como antes)
+        self.max_concurrency = max(1, int(max_concurrency))
+        # Concurrencia + tasa + pausa global ante 429, compartidos por todos los requests
+        self.scheduler = RateScheduler(
+            max_concurrency=self.max_concurrency,
+            rate_per_s=rate_per_s,
+            burst=rate_burst,
+            adaptive=adaptive_rate,
+        )
+
+    @classmethod
+    def from_settings(cls, settings: Any, **kwargs: Any) -> "SellClient":
+        return cls(
+            settings.sell_base_url,
+            settings.sell_access_token,
+            settings.timeout_s,
+            search_base_url=settings.sell_search_base_url,
+            max_concurrency=settings.concurrency,
+            max_connections=settings.pool_max_connections,
+            max_keepalive_connections=settings.pool_max_keepalive,
+            keepalive_expiry_s=settings.keepalive_expiry_s,
+            http2=settings.http2,
+            rate_per_s=settings.rate_per_s or None,
+            rate_burst=settings.rate_burst or None,
+            adaptive_rate=settings.rate_adaptive,
+            **kwargs,
+        )
+
+    async def open(self) -> "SellClient":
+        """Crea el pool de conexiones. Idempotente."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                transport=self._transport,
+                limits=self._limits,
+                http2=self._http2,
+            )
         return self
 
-    async def __aexit__(self, exc_type, exc, tb) -> None:
+    async def aclose(self) -> None:
         if self._client:
             await self._client.aclose()
             self._client = None
 
-    @retry(
-        retry=retry_if_exception(_is_retryable),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=8),
-        stop=stop_after_attempt(6),
-        reraise=True,
-    )
-    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        if not self._client:
-            raise RuntimeError("SellClient must be used as an async context manager")
+    async def __aenter__(self) -> "SellClient":
+        return await self.open()
 
-        url = f"{self.base_url}{path}"
-        resp = await self._client.get(url, headers=self._headers, params=params)
-        resp.raise_for_status()
-        return resp.json()
-
-    @retry(
-        retry=retry_if_exception(_is_retryable),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=8),
-        stop=stop_after_attempt(6),
-        reraise=True,
-    )
-    async def _post_search(self, path: str, json_body: Dict[str, Any]) -> Dict[str, Any]:
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    async def _send(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
         if not self._client:
             raise RuntimeError("SellClient must be used as an async context manager")
+        async with self.scheduler.slot():
+            t0 = time.perf_counter()
+            try:
+                resp = await self._client.request(method, url, **kwargs)
+            except Exception:
+                SELL_REQUEST_SECONDS.observe(time.perf_counter() - t0, method, _endpoint(url), "error")
+                raise
+            SELL_REQUEST_SECONDS.observe(time.perf_counter() - t0, method, _endpoint(url), resp.status_code)
+            self.scheduler.on_response(resp.status_code, resp.headers)
+        resp.raise_for_status()
+        return resp
+
+    @_sell_retry
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        resp = await self._send("GET", f"{self.base_url}{path}", headers=self._headers, params=params)
+        return loads(resp.content)
 
-        url = f"{self.search_base_url}{path}"
-        resp = await self._client.post(
-            url,
+    @_sell_retry
+    async def _post_search(self, path: str, json_body: Dict[str, Any]) -> Dict[str, Any]:
+        resp = await self._send(
+            "POST",
+            f"{self.search_base_url}{path}",
             headers={**self._headers, "Content-Type": "application/json"},
             json=json_body,
         )
-        resp.raise_for_status()
-        return resp.json()
+        return loads(resp.content)
 
     # ---------------------------
     # Core API (v2)
@@ -86,40 +201,154 @@ class SellClient:
         payload = await self._get(f"/v2/deals/{deal_id}")
         return payload.get("data") or {}
 
+    async def _list_deals_page(self, stage_id: int, page: int, per_page: int) -> List[Dict[str, Any]]:
+        payload = await self._get(
+            "/v2/deals",
+            params={"stage_id": stage_id, "page": page, "per_page": per_page},
+        )
+        SELL_PAGES.inc(stage_id)
+        items = payload.get("items") or []
+        return [i.get("data") or {} for i in items]
+
+    async def iter_deal_pages_by_stage(self, stage_id: int, per_page: int = 100) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Páginas de deals de una etapa, a medida que llegan.
+
+        La página 1 se pide sola. Si viene llena, las siguientes se piden de forma
+        especulativa en tandas de `max_concurrency` páginas en paralelo. Se corta en
+        la primera página con menos de `per_page` items (las posteriores de esa
+        tanda se descartan).
+        """
+        per_page = min(int(per_page), 100)
+        first = await self._list_deals_page(stage_id, 1, per_page)
+        yield first
+        if len(first) < per_page:
+            return
+
+        page = 2
+        while True:
+            window = range(page, page + self.max_concurrency)
+            pages = await asyncio.gather(*(self._list_deals_page(stage_id, p, per_page) for p in window))
+            for items in pages:
+                yield items
+                if len(items) < per_page:
+                    return
+            page += self.max_concurrency
+
     async def list_deals_by_stage(self, stage_id: int, per_page: int = 100) -> List[Dict[str, Any]]:
         """List deals in a stage. Sell v2 endpoints typically cap per_page at 100."""
+        out: List[Dict[str, Any]] = []
+        async for items in self.iter_deal_pages_by_stage(stage_id, per_page=per_page):
+            out.extend(items)
+        return out
+
+    async def iter_deal_pages_by_stages(
+        self, stage_ids: Iterable[int], per_page: int = 100
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Páginas de varias etapas consultadas en paralelo, en orden de llegada.
+
+        No deduplica: un deal que cambia de etapa durante la descarga puede venir
+        dos veces (el consumidor lleva su set de ids). Las páginas en espera son
+        acotadas: si el consumidor se atrasa (ej un export en streaming a un cliente
+        lento), las descargas esperan en vez de acumular páginas en memoria.
+        """
+        sids = [int(sid) for sid in stage_ids]
+        # Cupos de página; el fin de etapa y los errores van a la cola sin esperar
+        # cupo, así un productor nunca queda bloqueado cuando el consumidor ya paró.
+        slots = asyncio.Semaphore(2 * len(sids) or 1)
+        queue: "asyncio.Queue[Any]" = asyncio.Queue()
+        done = object()
+
+        async def produce(sid: int) -> None:
+            try:
+                async with contextlib.aclosing(self.iter_deal_pages_by_stage(sid, per_page=per_page)) as pages:
+                    async for items in pages:
+                        await slots.acquire()
+                        queue.put_nowait(items)
+            except Exception as e:
+                queue.put_nowait(e)
+            finally:
+                queue.put_nowait(done)
+
+        tasks = [asyncio.ensure_future(produce(sid)) for sid in sids]
+        pending = len(tasks)
+        try:
+            while pending:
+                item = await queue.get()
+                if item is done:
+                    pending -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    slots.release()
+                    yield item
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def list_deals_by_stages(
+        self,
+        stage_ids: Iterable[int],
+        per_page: int = 100,
+        project: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ) -> List[Any]:
+        """List deals of several stages at once, deduped by id.
+
+        Todas las etapas se consultan en paralelo; el límite global de requests
+        lo impone `max_concurrency`. Con `project`, cada deal se proyecta apenas
+        llega su página (ej DealRecord) y el payload completo no se retiene.
+        """
+        deals_by_id: Dict[int, Any] = {}
+        async for items in self.iter_deal_pages_by_stages(stage_ids, per_page=per_page):
+            for d in items:
+                did = d.get("id")
+                if did is not None:
+                    deals_by_id[int(did)] = project(d) if project is not None else d
+        return list(deals_by_id.values())
+
+    async def list_deals_updated_since(self, since: datetime, per_page: int = 100) -> List[Dict[str, Any]]:
+        """Deals con updated_at >= since (todas las etapas).
+
+        Pide /v2/deals ordenado por updated_at descendente y corta en cuanto
+        aparece un deal más antiguo que `since`. `since` debe venir con zona horaria.
+        """
         per_page = min(int(per_page), 100)
         out: List[Dict[str, Any]] = []
         page = 1
         while True:
             payload = await self._get(
                 "/v2/deals",
-                params={"stage_id": stage_id, "page": page, "per_page": per_page},
+                params={"sort_by": "updated_at:desc", "page": page, "per_page": per_page},
             )
+            SELL_PAGES.inc("updated_since")
             items = payload.get("items") or []
-            out.extend([i.get("data") or {} for i in items])
+            for i in items:
+                d = i.get("data") or {}
+                updated_at = d.get("updated_at")
+                if updated_at and isoparse(updated_at) < since:
+                    return out
+                out.append(d)
             if len(items) < per_page:
-                break
+                return out
             page += 1
-        return out
 
     # ---------------------------
     # Search API (v3) - opcional
     # ---------------------------
 
-    async def get_deal_custom_fields_mapping(self) -> List[Dict[str, Any]]:
+    async def get_deal_custom_fields_mapping(self, refresh: bool = False) -> List[Dict[str, Any]]:
         """Mapping de custom fields para Deals (Search API).
 
         Devuelve items[].data con: id, name, type, search_api_id.
+        Se guarda en memoria; `refresh=True` lo vuelve a pedir.
         """
-        if not self._client:
-            raise RuntimeError("SellClient must be used as an async context manager")
-        url = f"{self.search_base_url}/v3/deals/custom_fields"
-        resp = await self._client.get(url, headers=self._headers)
-        resp.raise_for_status()
-        payload = resp.json()
+        if self._cf_mapping is not None and not refresh:
+            return self._cf_mapping
+        resp = await self._send("GET", f"{self.search_base_url}/v3/deals/custom_fields", headers=self._headers)
+        payload = loads(resp.content)
         items = payload.get("items") or []
-        return [i.get("data") or {} for i in items]
+        self._cf_mapping = [i.get("data") or {} for i in items]
+        return self._cf_mapping
 
     async def search_deals(
         self,
@@ -150,6 +379,7 @@ class SellClient:
 
             body = {"items": [{"data": data}]}
             payload = await self._post_search("/v3/deals/search", body)
+            SELL_PAGES.inc("search")
 
             single = (payload.get("items") or [{}])[0]
             items = single.get("items") or []
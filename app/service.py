@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+import httpx
+
+from .calculator import MonthAggregator, RangeAggregator, calc_month, month_bounds
+from .columnar import calc_range_columnar, numpy_available
+from .config import IncentivosConfig, Settings, get_settings, load_incentivos_config
+from .deal_memo import DealMemo
+from .deal_record import Deal
+from .deal_store import DealStore
+from .fastjson import dumps
+from .live_aggregates import LiveAggregates
+from .metrics import CALC_SECONDS, DEALS_MATCHED, DEALS_PROCESSED
+from .rules import get_plan
+from .scenarios import ScenarioEngine
+from .search import search_deals_in_window
+from .sell_client import SellClient
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def format_year_month(year: int, month: int) -> str:
+    return f"{year:04d}-{month:02d}"
+
+
+def parse_year_month(value: str) -> Tuple[int, int]:
+    """Parsea YYYY-MM. Lanza ValueError si el formato no es válido."""
+    year_s, month_s = str(value).split("-")
+    year = int(year_s)
+    month = int(month_s)
+    if not (1 <= month <= 12):
+        raise ValueError(value)
+    return year, month
+
+
+async def iter_deal_pages(
+    sell: SellClient,
+    cfg: IncentivosConfig,
+    settings: Settings,
+    store: Optional[DealStore] = None,
+) -> AsyncIterator[List[Deal]]:
+    """Deals de las etapas configuradas, por páginas a medida que llegan.
+
+    Con `store`, sólo se descargan los deals que cambiaron desde la última sync y
+    se entrega el snapshot completo (DealRecords) como una sola página. Sin store, las páginas
+    pueden repetir ids (el consumidor deduplica).
+    """
+    if not cfg.stage_ids:
+        raise ValueError("Config inválida: stage_ids vacío")
+    if store is not None:
+        await store.sync(sell, cfg.stage_ids, per_page=settings.per_page, plan=get_plan(cfg))
+        yield store.deals()
+        return
+    async with contextlib.aclosing(sell.iter_deal_pages_by_stages(cfg.stage_ids, per_page=settings.per_page)) as pages:
+        async for page in pages:
+            yield page
+
+
+async def sync_live(
+    sell: SellClient,
+    cfg: IncentivosConfig,
+    settings: Settings,
+    store: DealStore,
+    live: LiveAggregates,
+) -> None:
+    """Sincroniza el store y lleva los cambios a los agregados en vivo."""
+    if not cfg.stage_ids:
+        raise ValueError("Config inválida: stage_ids vacío")
+    result = await store.sync(sell, cfg.stage_ids, per_page=settings.per_page, plan=get_plan(cfg))
+    if result.full or not live.matches(cfg):
+        live.load(cfg, store.deals())
+    else:
+        live.apply_sync(result)
+
+
+async def iter_unique_deal_pages(
+    sell: SellClient,
+    cfg: IncentivosConfig,
+    settings: Settings,
+    store: Optional[DealStore] = None,
+) -> AsyncIterator[List[Deal]]:
+    """Como `iter_deal_pages`, sin los deals (por id) que ya vinieron en una página anterior.
+
+    Cerrar este generador (aclose) cierra también la descarga de Sell que tiene abajo.
+    """
+    seen: Set[int] = set()
+    async with contextlib.aclosing(iter_deal_pages(sell, cfg, settings, store)) as pages:
+        async for page in pages:
+            fresh: List[Deal] = []
+            for deal in page:
+                did = deal.get("id")
+                if did is not None:
+                    if did in seen:
+                        continue
+                    seen.add(did)
+                fresh.append(deal)
+            yield fresh
+
+
+async def fold_deals(
+    sell: SellClient,
+    cfg: IncentivosConfig,
+    settings: Settings,
+    store: Optional[DealStore],
+    add: Callable[[Deal], Any],
+) -> None:
+    """Pasa cada deal (deduplicado por id) a `add` apenas llega su página.
+
+    Agregación en streaming: el cálculo se solapa con la red y no se guarda la
+    lista completa de deals.
+    """
+    async with contextlib.aclosing(iter_unique_deal_pages(sell, cfg, settings, store)) as pages:
+        async for page in pages:
+            for deal in page:
+                add(deal)
+
+
+async def _try_search(sell: SellClient, settings: Settings, fn: Callable[[], Awaitable[T]]) -> Optional[T]:
+    """Corre `fn` (ruta Search API v3) si está habilitada. None => usar v2."""
+    if settings.monthly_fetch_mode != "search" or sell.search_forbidden:
+        return None
+    try:
+        return await fn()
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 403:
+            raise
+        logger.warning("Search API v3 respondió 403; se usa v2 en adelante")
+        sell.search_forbidden = True
+    except LookupError as e:
+        logger.warning("Search API v3 no disponible para esta config (%s); se usa v2", e)
+    return None
+
+
+async def compute_months(
+    sell: SellClient,
+    months: List[str],
+    cfg: Optional[IncentivosConfig] = None,
+    settings: Optional[Settings] = None,
+    store: Optional[DealStore] = None,
+    memo: Optional[DealMemo] = None,
+    live: Optional[LiveAggregates] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Calcula varios meses sobre UNA sola descarga (o sync) de deals.
+
+    Con `memo`, los deals que no cambiaron (mismo updated_at y config) reutilizan
+    su aporte ya evaluado y sólo se re-agregan. Con `store` + `live`, sólo se
+    aplican (restar/sumar) los deals que cambiaron desde la última sync.
+    """
+    settings = settings or get_settings()
+    cfg = cfg or load_incentivos_config(settings.config_path)
+
+    found = await _try_search(sell, settings, lambda: _compute_months_search(sell, months, cfg))
+    if found is not None:
+        return _count_deals(found)
+
+    if store is not None and live is not None:
+        await sync_live(sell, cfg, settings, store, live)
+        with CALC_SECONDS.time("live_month"):
+            return _count_deals({ym: live.month_result(*parse_year_month(ym)) for ym in months})
+
+    aggs = [MonthAggregator(cfg, *parse_year_month(ym), dedupe=False, memo=memo) for ym in months]
+    # Sólo el tiempo de CPU de agregación (la red se solapa con el cálculo)
+    calc_s = 0.0
+
+    def add(deal: Deal) -> None:
+        nonlocal calc_s
+        t0 = time.perf_counter()
+        for agg in aggs:
+            agg.add(deal)
+        calc_s += time.perf_counter() - t0
+
+    await fold_deals(sell, cfg, settings, store, add)
+    CALC_SECONDS.observe(calc_s, "calc_month")
+    return _count_deals({ym: agg.result() for ym, agg in zip(months, aggs)})
+
+
+def _count_deals(months: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    for out in months.values():
+        DEALS_PROCESSED.inc(value=out["processed_deals"])
+        DEALS_MATCHED.inc(value=out["month_matched_deals"])
+    return months
+
+
+async def stream_month_deals(
+    sell: SellClient,
+    year_month: str,
+    cfg: IncentivosConfig,
+    settings: Settings,
+) -> AsyncIterator[bytes]:
+    """Export NDJSON de un mes: una línea `calc_deal` por deal del mes y al final `{"summary": ...}`.
+
+    Se emite un trozo por página de Sell, así la respuesta parte con la primera
+    página y la memoria no crece con los deals del mes: el resumen se agrega sin
+    guardar la auditoría (cada línea ya trae sus `errors`; el resumen sólo las
+    cuenta en `deals_with_errors`). Si Sell falla a mitad de camino, la última
+    línea es `{"error": ...}` en vez del resumen; un error propio (cálculo o
+    encoding) no se disfraza de error de Sell y se propaga. Si el cliente corta
+    (aclose o cancelación), la descarga de Sell se cierra antes de salir.
+    """
+    agg = MonthAggregator(cfg, *parse_year_month(year_month), dedupe=False, audit=False)
+    with_errors = 0
+    calc_s = 0.0
+    try:
+        async with contextlib.aclosing(iter_unique_deal_pages(sell, cfg, settings)) as pages:
+            async for page in pages:
+                t0 = time.perf_counter()
+                chunk = bytearray()
+                for deal in page:
+                    detail = agg.add_detail(deal)
+                    if detail is None:
+                        continue
+                    if detail["errors"]:
+                        with_errors += 1
+                    chunk += dumps(detail)
+                    chunk += b"\n"
+                calc_s += time.perf_counter() - t0
+                if chunk:
+                    yield bytes(chunk)
+    except httpx.HTTPError as e:
+        logger.warning("Export de %s cortado: %s: %s", year_month, type(e).__name__, e)
+        yield dumps({"error": f"Error consultando deals: {type(e).__name__}: {e}"}) + b"\n"
+        return
+
+    CALC_SECONDS.observe(calc_s, "export_month")
+    summary = agg.result()
+    del summary["deal_errors"]
+    summary["deals_with_errors"] = with_errors
+    _count_deals({year_month: summary})
+    yield dumps({"summary": summary}) + b"\n"
+
+
+async def compute_scenarios(
+    sell: SellClient,
+    year_month: str,
+    scenarios: Dict[str, IncentivosConfig],
+    cfg: Optional[IncentivosConfig] = None,
+    settings: Optional[Settings] = None,
+    store: Optional[DealStore] = None,
+) -> Dict[str, Any]:
+    """Un mes con la config base y cada escenario, sobre UNA descarga de deals."""
+    settings = settings or get_settings()
+    cfg = cfg or load_incentivos_config(settings.config_path)
+    engine = ScenarioEngine(cfg, scenarios, *parse_year_month(year_month))
+
+    async def via_search() -> Dict[str, Any]:
+        if not cfg.stage_ids:
+            raise ValueError("Config inválida: stage_ids vacío")
+        engine.add_many(await search_deals_in_window(sell, cfg, engine.start, engine.end))
+        return engine.result()
+
+    found = await _try_search(sell, settings, via_search)
+    if found is not None:
+        return found
+
+    await fold_deals(sell, cfg, settings, store, engine.add)
+    return engine.result()
+
+
+async def compute_range(
+    sell: SellClient,
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+    cfg: Optional[IncentivosConfig] = None,
+    settings: Optional[Settings] = None,
+    store: Optional[DealStore] = None,
+    memo: Optional[DealMemo] = None,
+    columnar: bool = False,
+) -> Dict[str, Any]:
+    """Meses [start, end] (inclusive) en una sola descarga y una sola pasada.
+
+    `columnar=True` (auditorías de años de deals) junta el snapshot y lo calcula
+    con el motor por columnas de NumPy; mismo resultado que el cálculo normal.
+    """
+    settings = settings or get_settings()
+    cfg = cfg or load_incentivos_config(settings.config_path)
+    if columnar and not numpy_available():
+        logger.warning("numpy no está instalado: se usa el cálculo normal")
+        columnar = False
+    agg = RangeAggregator(cfg, start, end, dedupe=False, memo=memo)
+
+    async def via_search() -> Dict[str, Any]:
+        if not cfg.stage_ids:
+            raise ValueError("Config inválida: stage_ids vacío")
+        window_start = month_bounds(*start)[0]
+        window_end = month_bounds(*end)[1]
+        deals = await search_deals_in_window(sell, cfg, window_start, window_end)
+        if columnar:
+            return calc_range_columnar(cfg, deals, start, end)
+        agg.add_many(deals)
+        return agg.result()
+
+    found = await _try_search(sell, settings, via_search)
+    if found is not None:
+        return found
+
+    if columnar:
+        deals: List[Dict[str, Any]] = []
+        await fold_deals(sell, cfg, settings, store, deals.append)
+        return calc_range_columnar(cfg, deals, start, end)
+
+    calc_s = 0.0
+
+    def add(deal: Deal) -> None:
+        nonlocal calc_s
+        t0 = time.perf_counter()
+        agg.add(deal)
+        calc_s += time.perf_counter() - t0
+
+    await fold_deals(sell, cfg, settings, store, add)
+    CALC_SECONDS.observe(calc_s, "calc_range")
+    return agg.result()
+
+
+async def _compute_months_search(
+    sell: SellClient, months: List[str], cfg: IncentivosConfig
+) -> Dict[str, Dict[str, Any]]:
+    """Un search por mes (en paralelo); cada uno trae sólo los deals de su ventana."""
+    if not cfg.stage_ids:
+        raise ValueError("Config inválida: stage_ids vacío")
+
+    async def one(ym: str) -> Dict[str, Any]:
+        year, month = parse_year_month(ym)
+        start, end = month_bounds(year, month)
+        deals = await search_deals_in_window(sell, cfg, start, end)
+        return calc_month(cfg, deals, year, month)
+
+    results = await asyncio.gather(*(one(ym) for ym in months))
+    return dict(zip(months, results))
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    El primer llamador lanza la tarea; los demás esperan el mismo resultado
+    (o la misma excepción). La tarea compartida corre protegida con `shield`,
+    así que si un cliente se desconecta no se cancela el trabajo de los demás.
+    Al terminar, la key se libera: no es un cache.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def _release(self, key: Hashable, fut: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+        # Marca la excepción como consumida aunque todos los waiters se hayan ido
+        if not fut.cancelled():
+            fut.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda f, k=key: self._release(k, f))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(fut)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List
+
+from .config import IncentivosConfig, config_hash
+from .search import BASE_PROJECTION, config_field_names
+
+# Snapshot offline de deals: NDJSON comprimido con gzip.
+#   línea 1: encabezado {"snapshot": 1, "created_at", "config_hash", "fields", "stage_ids"}
+#   resto:   un deal por línea, recortado a los campos que usa la config
+# Se escribe y se lee en streaming (nunca se arma la lista completa en memoria).
+# El writer escribe a `<path>.partial` y sólo lo renombra a `path` al cerrar sin
+# error: una descarga cortada no deja un snapshot truncado que parezca completo.
+
+SNAPSHOT_VERSION = 1
+
+
+def trim_deal(deal: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Deal con sólo los campos base y los custom fields de `fields`."""
+    out = {k: deal.get(k) for k in BASE_PROJECTION if k in deal}
+    cf = deal.get("custom_fields") or {}
+    out["custom_fields"] = {name: cf[name] for name in fields if name in cf}
+    return out
+
+
+class SnapshotWriter:
+    def __init__(self, path: str, cfg: IncentivosConfig):
+        self.path = path
+        self.fields = config_field_names(cfg)
+        self.count = 0
+        self._partial = f"{path}.partial"
+        self._fh = gzip.open(self._partial, "wt", encoding="utf-8")
+        header = {
+            "snapshot": SNAPSHOT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "config_hash": config_hash(cfg),
+            "fields": self.fields,
+            "stage_ids": [int(s) for s in cfg.stage_ids],
+        }
+        self._fh.write(json.dumps(header, ensure_ascii=False) + "\n")
+
+    def write(self, deal: Dict[str, Any]) -> None:
+        self._fh.write(json.dumps(trim_deal(deal, self.fields), ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self) -> None:
+        """Cierra y publica el snapshot en `path`."""
+        self._fh.close()
+        os.replace(self._partial, self.path)
+
+    def discard(self) -> None:
+        """Cierra y borra lo escrito; `path` queda como estaba."""
+        self._fh.close()
+        try:
+            os.remove(self._partial)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class SnapshotReader:
+    """Itera los deals de un snapshot línea a línea."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = gzip.open(path, "rt", encoding="utf-8")
+        first = self._fh.readline()
+        try:
+            header = json.loads(first) if first else None
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("snapshot") != SNAPSHOT_VERSION:
+            self._fh.close()
+            raise ValueError(f"{path}: no es un snapshot de deals (versión {SNAPSHOT_VERSION})")
+        self.header: Dict[str, Any] = header
+
+    def missing_fields(self, cfg: IncentivosConfig) -> List[str]:
+        """Campos que usa `cfg` y que no se guardaron en el snapshot."""
+        saved = set(self.header.get("fields") or [])
+        return [name for name in config_field_names(cfg) if name not in saved]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for line in self._fh:
+            if line.strip():
+                yield json.loads(line)
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
@@ -1,18 +1,63 @@
 from __future__ import annotations
 
+import re
 from datetime import date, datetime
+from functools import lru_cache
 from typing import Any, Optional
 
 from dateutil import parser
 
+# YYYY-MM-DD, opcionalmente con hora ISO (la zona horaria se ignora, igual que dateutil)
+_ISO_RE = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}(?::?\d{2})?)?)?"
+)
+# A/B/YYYY
+_SLASH_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+
+
+def _fast_parse_date(s: str) -> Optional[date]:
+    """Formatos que realmente manda Sell, sin pasar por dateutil.
+
+    Devuelve None si `s` no calza con ningún formato rápido (=> usar dateutil).
+    """
+    m = _ISO_RE.fullmatch(s)
+    if m:
+        return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    m = _SLASH_RE.fullmatch(s)
+    if m:
+        a, b, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        # Misma desambiguación que dateutil: MM/DD salvo que el primero no pueda ser mes.
+        if a <= 12:
+            return date(year, a, b)
+        return date(year, b, a)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_str(s: str) -> Optional[date]:
+    # Memo acotado: muchos deals comparten la misma fecha de cirugía.
+    try:
+        fast = _fast_parse_date(s.strip())
+    except ValueError:
+        # Fecha imposible (ej 31/02): que decida dateutil, como antes
+        fast = None
+    if fast is not None:
+        return fast
+    try:
+        return parser.parse(s).date()
+    except Exception:
+        return None
+
 
 def parse_iso_date(value: Any) -> Optional[date]:
     """Best-effort date parser.
 
     Sell custom field type 'date' might arrive as:
-      - YYYY-MM-DD
+      - YYYY-MM-DD (o datetime ISO)
       - MM/DD/YYYY
-      - DD/MM/YYYY
+      - DD/MM/YYYY (cuando el día es > 12; si es ambiguo gana MM/DD, como dateutil)
+
+    Esos formatos se parsean sin dateutil; dateutil queda sólo como fallback.
     """
     if value is None or value == "":
         return None
@@ -20,11 +65,7 @@ def parse_iso_date(value: Any) -> Optional[date]:
         return value
     if isinstance(value, datetime):
         return value.date()
-    try:
-        dt = parser.parse(str(value))
-        return dt.date()
-    except Exception:
-        return None
+    return _parse_date_str(str(value))
 
 
 def normalize_list_value(raw: Any) -> tuple[Optional[str], Optional[str]]:
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import httpx
+
+from app.config import get_settings
+from app.main import create_app
+from app.sell_client import SellClient
+
+from .fake_sell import FakeSell
+from .synthetic import BENCH_CONFIG, make_deals
+
+# End-to-end: la app completa (lifespan, rutas, SellClient, cálculo) contra el
+# backend falso, todo en proceso. Cada modo activa distintas capas de cache:
+#   - "cold":  sin cache mensual ni deal store => cada request descarga todo
+#   - "store": deal store (carga completa y después incremental), sin cache mensual
+#   - "cache": cache mensual => el primer request calcula, el resto son HIT
+#   - "prod":  lo que se despliega (defaults de Settings): deal store + agregados
+#              en vivo + cache mensual
+
+E2E_MODES: Dict[str, Dict[str, str]] = {
+    "cold": {"MONTHLY_CACHE_ENABLED": "false", "DEAL_STORE_ENABLED": "false"},
+    "store": {"MONTHLY_CACHE_ENABLED": "false", "DEAL_STORE_ENABLED": "true"},
+    "cache": {"MONTHLY_CACHE_ENABLED": "true", "DEAL_STORE_ENABLED": "false"},
+    "prod": {"MONTHLY_CACHE_ENABLED": "true", "DEAL_STORE_ENABLED": "true", "LIVE_AGGREGATES_ENABLED": "true"},
+}
+
+MONTH = "2024-02"
+
+
+@contextmanager
+def bench_env(overrides: Dict[str, str]) -> Iterator[None]:
+    """Variables de entorno temporales para Settings (y cache de get_settings limpio)."""
+    saved = {k: os.environ.get(k) for k in overrides}
+    os.environ.update(overrides)
+    get_settings.cache_clear()
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        get_settings.cache_clear()
+
+
+@contextmanager
+def config_file(cfg: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "incentivos_config.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(cfg or BENCH_CONFIG, f, ensure_ascii=False)
+        yield path
+
+
+def base_env(config_path: str, per_page: int, concurrency: int) -> Dict[str, str]:
+    return {
+        "SELL_ACCESS_TOKEN": "bench",
+        "SELL_BASE_URL": "http://sell.local",
+        "INCENTIVOS_CONFIG": config_path,
+        "SELL_PER_PAGE": str(per_page),
+        "SELL_CONCURRENCY": str(concurrency),
+        "MONTHLY_PREFETCH_MONTHS": "0",
+        "MONTHLY_FETCH_MODE": "v2",
+    }
+
+
+async def run_case(
+    deals: Sequence[Dict[str, Any]],
+    mode: str,
+    latency_s: float,
+    requests: int,
+    per_page: int = 100,
+    concurrency: int = 4,
+) -> Dict[str, Any]:
+    fake = FakeSell(deals, latency_s=latency_s)
+    with config_file() as path, bench_env({**base_env(path, per_page, concurrency), **E2E_MODES[mode]}):
+        sell = SellClient.from_settings(get_settings(), transport=fake.transport())
+        app = create_app(sell=sell)
+        latencies: List[float] = []
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+                for _ in range(requests):
+                    t0 = time.perf_counter()
+                    r = await client.get(f"/v1/monthly/{MONTH}")
+                    latencies.append(time.perf_counter() - t0)
+                    r.raise_for_status()
+        matched = r.json()["month_matched_deals"]
+
+    return {
+        "name": f"e2e_monthly_{mode}",
+        "mode": mode,
+        "deals": len(deals),
+        "latency_ms": round(latency_s * 1000, 3),
+        "per_page": per_page,
+        "requests": requests,
+        "first_s": round(latencies[0], 6),
+        "median_s": round(statistics.median(latencies), 6),
+        "max_s": round(max(latencies), 6),
+        "sell_calls": fake.total_calls,
+        "sell_calls_per_request": round(fake.total_calls / requests, 3),
+        "month_matched_deals": matched,
+    }
+
+
+async def run_e2e(
+    sizes: Sequence[int] = (1_000, 10_000),
+    latencies_ms: Sequence[float] = (0.0, 20.0),
+    modes: Sequence[str] = tuple(E2E_MODES),
+    requests: int = 5,
+    seed: int = 0,
+    per_page: int = 100,
+    concurrency: int = 4,
+) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    all_deals = make_deals(max(sizes), seed=seed)
+    for n in sorted(sizes):
+        for latency_ms in latencies_ms:
+            for mode in modes:
+                rows.append(
+                    await run_case(all_deals[:n], mode, latency_ms / 1000, requests, per_page, concurrency)
+                )
+    return rows
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from collections import Counter
+from typing import Any, Dict, List, Sequence
+
+import httpx
+
+# Backend Sell falso, en proceso (httpx.MockTransport): /v2/deals paginado por
+# stage_id o por updated_at, y /v2/deals/{id}. Cada respuesta espera `latency_s`
+# con asyncio.sleep, así la concurrencia del SellClient se nota igual que contra
+# la API real. Con `throttle_rate` una fracción de las respuestas es 429 con
+# Retry-After (sorteo con semilla, reproducible).
+
+
+class FakeSell:
+    def __init__(
+        self,
+        deals: Sequence[Dict[str, Any]],
+        latency_s: float = 0.0,
+        max_per_page: int = 100,
+        throttle_rate: float = 0.0,
+        retry_after_s: float = 1.0,
+        seed: int = 0,
+    ):
+        self.latency_s = float(latency_s)
+        self.max_per_page = int(max_per_page)
+        self.throttle_rate = float(throttle_rate)
+        self.retry_after_s = float(retry_after_s)
+        self._rng = random.Random(seed)
+        self.throttled = 0
+        self._by_id = {d["id"]: d for d in deals}
+        self._by_stage: Dict[int, List[Dict[str, Any]]] = {}
+        for d in deals:
+            self._by_stage.setdefault(d.get("stage_id"), []).append(d)
+        self._by_updated = sorted(deals, key=lambda d: d.get("updated_at") or "", reverse=True)
+        self.calls: Counter = Counter()
+
+    @property
+    def total_calls(self) -> int:
+        """Requests recibidos, incluidos los respondidos con 429."""
+        return sum(self.calls.values()) + self.throttled
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.throttled = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def _page(self, items: List[Dict[str, Any]], params: httpx.QueryParams) -> httpx.Response:
+        page = int(params.get("page", "1"))
+        per_page = min(int(params.get("per_page", "25")), self.max_per_page)
+        chunk = items[(page - 1) * per_page : page * per_page]
+        return httpx.Response(200, json={"items": [{"data": d} for d in chunk], "meta": {"count": len(chunk)}})
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        if self.throttle_rate and self._rng.random() < self.throttle_rate:
+            self.throttled += 1
+            return httpx.Response(429, headers={"Retry-After": f"{self.retry_after_s:g}"}, json={})
+        path = request.url.path
+        params = request.url.params
+        if path == "/v2/deals":
+            self.calls["/v2/deals"] += 1
+            if "stage_id" in params:
+                return self._page(self._by_stage.get(int(params["stage_id"]), []), params)
+            return self._page(self._by_updated, params)
+        if path.startswith("/v2/deals/"):
+            self.calls["/v2/deals/{id}"] += 1
+            try:
+                deal = self._by_id.get(int(path.rsplit("/", 1)[-1]))
+            except ValueError:
+                deal = None
+            if deal is None:
+                return httpx.Response(404, json={"errors": [{"error": {"code": "not_found"}}]})
+            return httpx.Response(200, json={"data": deal})
+        self.calls["other"] += 1
+        return httpx.Response(404, json={})
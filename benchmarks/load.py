@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.config import get_settings
+from app.main import create_app
+from app.sell_client import SellClient
+
+from .e2e import E2E_MODES, base_env, bench_env, config_file
+from .fake_sell import FakeSell
+from .synthetic import make_deals
+
+# Prueba de carga de /v1/monthly/{ym} y /v1/deals/{id} con tráfico concurrente de
+# dashboards, contra el Sell falso (latencia y 429 inyectados).
+#
+#   python -m benchmarks.load --concurrency 20 --duration 30 --mix monthly=0.8,deal=0.2 \
+#       --sell-latency-ms 150 --sell-429-rate 0.02 --out carga.json
+#   python -m benchmarks.load --server uvicorn ...   # HTTP real vía uvicorn en 127.0.0.1
+#
+# Para acercarse a una instancia starter de Render (0.5 CPU) conviene correrlo con
+# la CPU limitada (ej `taskset -c 0` o `docker run --cpus 0.5`) y los mismos
+# SELL_CONCURRENCY / SELL_PER_PAGE que en producción (--sell-concurrency, --per-page).
+
+SERVERS = ("inproc", "uvicorn")
+REQUEST_KINDS = ("monthly", "deal")
+DEFAULT_MONTHS = ("2024-01", "2024-02", "2024-03")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """"monthly=0.8,deal=0.2" -> pesos normalizados."""
+    mix: Dict[str, float] = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        kind, sep, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in REQUEST_KINDS:
+            raise ValueError(f"Tipo de request desconocido: {kind!r} (usa {'/'.join(REQUEST_KINDS)})")
+        mix[kind] = float(weight) if sep else 1.0
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("El mix necesita al menos un peso > 0")
+    return {k: w / total for k, w in mix.items()}
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), int(q / 100 * len(sorted_values) + 0.999999)))
+    return sorted_values[rank - 1]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def latency_summary(values: List[float]) -> Dict[str, Any]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean_ms": _ms(sum(values) / len(values)) if values else None,
+        "p50_ms": _ms(percentile(values, 50)),
+        "p95_ms": _ms(percentile(values, 95)),
+        "p99_ms": _ms(percentile(values, 99)),
+        "max_ms": _ms(values[-1]) if values else None,
+    }
+
+
+class LoadRecorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = {k: [] for k in REQUEST_KINDS}
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def record(self, kind: str, seconds: float, status: Optional[int], error: Optional[str] = None) -> None:
+        self.latencies[kind].append(seconds)
+        self.statuses[str(status) if status is not None else "exception"] += 1
+        if error is not None:
+            self.errors[f"{kind}:{error}"] += 1
+        elif status is not None and status >= 400:
+            self.errors[f"{kind}:{status}"] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(len(v) for v in self.latencies.values())
+
+
+def _pick_request(rng: random.Random, mix: Dict[str, float], months: Sequence[str], deal_ids: Sequence[int]):
+    kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+    if kind == "monthly":
+        return kind, f"/v1/monthly/{rng.choice(months)}"
+    return kind, f"/v1/deals/{rng.choice(deal_ids)}"
+
+
+async def _worker(
+    client: httpx.AsyncClient,
+    recorder: LoadRecorder,
+    deadline: float,
+    rng: random.Random,
+    mix: Dict[str, float],
+    months: Sequence[str],
+    deal_ids: Sequence[int],
+) -> None:
+    while time.perf_counter() < deadline:
+        kind, url = _pick_request(rng, mix, months, deal_ids)
+        t0 = time.perf_counter()
+        try:
+            r = await client.get(url)
+        except httpx.HTTPError as e:
+            recorder.record(kind, time.perf_counter() - t0, None, type(e).__name__)
+            continue
+        recorder.record(kind, time.perf_counter() - t0, r.status_code)
+
+
+@asynccontextmanager
+async def _inproc_client(app) -> AsyncIterator[httpx.AsyncClient]:
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=None) as client:
+            yield client
+
+
+@asynccontextmanager
+async def _uvicorn_client(app, port: int, concurrency: int) -> AsyncIterator[httpx.AsyncClient]:
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.ensure_future(server.serve())
+    try:
+        while not server.started:
+            if task.done():
+                task.result()
+                raise RuntimeError("uvicorn terminó antes de arrancar")
+            await asyncio.sleep(0.01)
+        bound = server.servers[0].sockets[0].getsockname()[1]
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{bound}", limits=limits, timeout=None) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def run_load(
+    concurrency: int = 10,
+    duration_s: float = 10.0,
+    mix: Optional[Dict[str, float]] = None,
+    deals: int = 2_000,
+    months: Sequence[str] = DEFAULT_MONTHS,
+    sell_latency_s: float = 0.05,
+    sell_429_rate: float = 0.0,
+    retry_after_s: float = 1.0,
+    mode: str = "cache",
+    server: str = "inproc",
+    port: int = 0,
+    seed: int = 0,
+    per_page: int = 100,
+    sell_concurrency: int = 4,
+    warmup: bool = True,
+) -> Dict[str, Any]:
+    if server not in SERVERS:
+        raise ValueError(f"server inválido: {server!r} (usa {'/'.join(SERVERS)})")
+    mix = mix or {"monthly": 0.8, "deal": 0.2}
+    all_deals = make_deals(deals, seed=seed)
+    deal_ids = [d["id"] for d in all_deals]
+    fake = FakeSell(
+        all_deals, latency_s=sell_latency_s, throttle_rate=sell_429_rate, retry_after_s=retry_after_s, seed=seed
+    )
+
+    with config_file() as path, bench_env({**base_env(path, per_page, sell_concurrency), **E2E_MODES[mode]}):
+        settings = get_settings()
+        sell = SellClient.from_settings(settings, transport=fake.transport())
+        app = create_app(sell=sell)
+        recorder = LoadRecorder()
+        opened = _inproc_client(app) if server == "inproc" else _uvicorn_client(app, port, concurrency)
+        async with opened as client:
+            if warmup:
+                # Primer cálculo de cada mes fuera de la medición (como un cache ya caliente)
+                for ym in months:
+                    (await client.get(f"/v1/monthly/{ym}")).raise_for_status()
+            fake.reset()
+            retries_before = sell.scheduler.retries
+
+            started = time.perf_counter()
+            deadline = started + duration_s
+            workers = [
+                _worker(client, recorder, deadline, random.Random(seed * 1000 + i), mix, months, deal_ids)
+                for i in range(concurrency)
+            ]
+            await asyncio.gather(*workers)
+            elapsed = time.perf_counter() - started
+            scheduler = sell.scheduler.status()
+
+    total = recorder.total
+    errors = sum(recorder.errors.values())
+    all_latencies = [v for values in recorder.latencies.values() for v in values]
+    return {
+        "config": {
+            "server": server,
+            "mode": mode,
+            "concurrency": concurrency,
+            "duration_s": duration_s,
+            "mix": mix,
+            "deals": deals,
+            "months": list(months),
+            "sell_latency_ms": round(sell_latency_s * 1000, 3),
+            "sell_429_rate": sell_429_rate,
+            "retry_after_s": retry_after_s,
+            "sell_concurrency": settings.concurrency,
+            "per_page": settings.per_page,
+            "monthly_cache": settings.monthly_cache_enabled,
+            "deal_store": settings.deal_store_enabled,
+            "warmup": warmup,
+            "seed": seed,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else None,
+        "latency": {
+            "all": latency_summary(all_latencies),
+            **{kind: latency_summary(values) for kind, values in recorder.latencies.items() if kind in mix},
+        },
+        "status": dict(sorted(recorder.statuses.items())),
+        "errors": dict(sorted(recorder.errors.items())),
+        "error_rate": round(errors / total, 4) if total else None,
+        "sell": {
+            "calls": fake.total_calls,
+            "throttled": fake.throttled,
+            "by_endpoint": dict(fake.calls),
+            # Amplificación: requests a Sell por request de cliente
+            "calls_per_request": round(fake.total_calls / total, 3) if total else None,
+            "retries": scheduler["retries"] - retries_before,
+        },
+        "scheduler": scheduler,
+    }
+
+
+def _parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Prueba de carga de /v1/monthly y /v1/deals contra un Sell falso.")
+    p.add_argument("--concurrency", type=int, default=10, help="clientes simultáneos")
+    p.add_argument("--duration", type=float, default=10.0, help="segundos de carga (sin contar warmup)")
+    p.add_argument("--mix", default="monthly=0.8,deal=0.2", help="pesos por tipo de request")
+    p.add_argument("--months", default=",".join(DEFAULT_MONTHS), help="meses que piden los dashboards")
+    p.add_argument("--deals", type=int, default=2_000, help="deals en el Sell falso")
+    p.add_argument("--sell-latency-ms", type=float, default=50.0, help="latencia por request del Sell falso")
+    p.add_argument("--sell-429-rate", type=float, default=0.0, help="fracción de requests a Sell que responden 429")
+    p.add_argument("--retry-after", type=float, default=1.0, help="Retry-After (s) de los 429 inyectados")
+    p.add_argument("--mode", choices=list(E2E_MODES), default="cache", help="capas de cache activas")
+    p.add_argument("--server", choices=SERVERS, default="inproc", help="ASGI en proceso o HTTP real vía uvicorn")
+    p.add_argument("--port", type=int, default=0, help="puerto de uvicorn (0 = libre)")
+    p.add_argument("--per-page", type=int, default=100, help="SELL_PER_PAGE")
+    p.add_argument("--sell-concurrency", type=int, default=4, help="SELL_CONCURRENCY")
+    p.add_argument("--no-warmup", action="store_true", help="medir también el primer cálculo de cada mes")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="archivo JSON de salida (por defecto stdout)")
+    return p
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parser().parse_args(argv)
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    months: Tuple[str, ...] = tuple(m for m in args.months.split(",") if m)
+
+    report = asyncio.run(
+        run_load(
+            concurrency=max(1, args.concurrency),
+            duration_s=args.duration,
+            mix=mix,
+            deals=args.deals,
+            months=months,
+            sell_latency_s=args.sell_latency_ms / 1000,
+            sell_429_rate=args.sell_429_rate,
+            retry_after_s=args.retry_after,
+            mode=args.mode,
+            server=args.server,
+            port=args.port,
+            seed=args.seed,
+            per_page=args.per_page,
+            sell_concurrency=args.sell_concurrency,
+            warmup=not args.no_warmup,
+        )
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
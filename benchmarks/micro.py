@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app import utils
+from app.calculator import calc_deal, calc_month
+from app.config import IncentivosConfig
+
+from .synthetic import BENCH_CONFIG, bench_config, make_deals
+
+# Micro-benchmarks de las piezas del cálculo, sin red. Cada caso se corre
+# `repeat` veces y se reporta el mejor tiempo (el menos afectado por ruido).
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def best_of(fn: Callable[[], Any], repeat: int, setup: Optional[Callable[[], None]] = None) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _row(name: str, n: int, seconds: float, **extra: Any) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "n": n,
+        "seconds": round(seconds, 6),
+        "us_per_item": round(seconds / n * 1e6, 3) if n else None,
+        "items_per_s": round(n / seconds) if seconds > 0 else None,
+        **extra,
+    }
+
+
+def _raw_values(deals: Sequence[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    bar_fields = [r["field_name"] for r in BENCH_CONFIG["bars"].values()]
+    fecha_field = BENCH_CONFIG["fecha_cirugia_field_name"]
+    bars = [d["custom_fields"].get(f) for d in deals for f in bar_fields]
+    normalized = [utils.normalize_list_value(v) for v in bars]
+    return {
+        "bars": bars,
+        "ints": [oid or label for oid, label in normalized],
+        "fechas": [d["custom_fields"].get(fecha_field) for d in deals],
+    }
+
+
+def run_micro(
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    seed: int = 0,
+    repeat: int = 3,
+    cfg: Optional[IncentivosConfig] = None,
+) -> List[Dict[str, Any]]:
+    cfg = cfg or bench_config()
+    all_deals = make_deals(max(sizes), seed=seed)
+    rows: List[Dict[str, Any]] = []
+    for n in sorted(sizes):
+        deals = all_deals[:n]
+        raw = _raw_values(deals)
+
+        def normalize_list() -> None:
+            for v in raw["bars"]:
+                utils.normalize_list_value(v)
+
+        def normalize_ints() -> None:
+            for v in raw["ints"]:
+                utils.normalize_int(v)
+
+        def parse_dates() -> None:
+            for v in raw["fechas"]:
+                utils.parse_iso_date(v)
+
+        def deal_by_deal() -> None:
+            for d in deals:
+                calc_deal(cfg, d)
+
+        rows.append(_row("normalize_list_value", len(raw["bars"]), best_of(normalize_list, repeat)))
+        rows.append(_row("normalize_int", len(raw["ints"]), best_of(normalize_ints, repeat)))
+        rows.append(
+            _row(
+                "parse_iso_date",
+                len(raw["fechas"]),
+                best_of(parse_dates, repeat, setup=utils._parse_date_str.cache_clear),
+                note="memo de fechas vacío al inicio de cada corrida",
+            )
+        )
+        rows.append(_row("calc_deal", n, best_of(deal_by_deal, repeat)))
+        rows.append(_row("calc_month", n, best_of(lambda: calc_month(cfg, deals, 2024, 2), repeat)))
+    return rows
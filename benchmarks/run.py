@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .e2e import E2E_MODES, run_e2e
+from .micro import DEFAULT_SIZES, run_micro
+
+# Uso (desde la raíz del repo):
+#   python -m benchmarks.run --out bench.json
+#   python -m benchmarks.run --skip-e2e --sizes 1000,10000
+#   python -m benchmarks.run --baseline bench-v2.1.0.json   # compara y sale con 1 si hay regresión
+
+
+def _ints(value: str) -> List[int]:
+    return [int(x) for x in value.split(",") if x.strip()]
+
+
+def _floats(value: str) -> List[float]:
+    return [float(x) for x in value.split(",") if x.strip()]
+
+
+def _parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmarks de cálculo y de /v1/monthly contra un Sell falso.")
+    p.add_argument("--sizes", type=_ints, default=list(DEFAULT_SIZES), help="deals para micro-benchmarks")
+    p.add_argument("--repeat", type=int, default=3, help="corridas por micro-benchmark (se reporta la mejor)")
+    p.add_argument("--e2e-sizes", type=_ints, default=[1_000, 10_000], help="deals para end-to-end")
+    p.add_argument("--latency-ms", type=_floats, default=[0.0, 20.0], help="latencia del Sell falso por request")
+    p.add_argument("--modes", default=",".join(E2E_MODES), help=f"modos e2e ({'/'.join(E2E_MODES)})")
+    p.add_argument("--requests", type=int, default=5, help="requests a /v1/monthly por caso e2e")
+    p.add_argument("--per-page", type=int, default=100, help="SELL_PER_PAGE (define cuántas páginas hay)")
+    p.add_argument("--concurrency", type=int, default=4, help="SELL_CONCURRENCY")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--skip-micro", action="store_true")
+    p.add_argument("--skip-e2e", action="store_true")
+    p.add_argument("--out", help="archivo JSON de salida (por defecto stdout)")
+    p.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    p.add_argument(
+        "--max-regression",
+        type=float,
+        default=1.25,
+        help="con --baseline: sale con 1 si algún caso es más lento que baseline × este factor",
+    )
+    return p
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _key(row: Dict[str, Any]) -> Tuple[Any, ...]:
+    if row["name"].startswith("e2e_"):
+        return (row["name"], row["deals"], row["latency_ms"], row["per_page"])
+    return (row["name"], row["n"])
+
+
+def _metric(row: Dict[str, Any]) -> float:
+    return row["median_s"] if "median_s" in row else row["seconds"]
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[Dict[str, Any]]:
+    """Casos presentes en ambas corridas con su razón actual/baseline (>1 = más lento)."""
+    before = {_key(r): r for r in baseline.get("micro", []) + baseline.get("e2e", [])}
+    out: List[Dict[str, Any]] = []
+    for row in current.get("micro", []) + current.get("e2e", []):
+        old = before.get(_key(row))
+        if old is None or _metric(old) <= 0:
+            continue
+        ratio = _metric(row) / _metric(old)
+        out.append({"key": list(_key(row)), "ratio": round(ratio, 3), "regression": ratio > max_regression})
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parser().parse_args(argv)
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = [m for m in modes if m not in E2E_MODES]
+    if unknown:
+        print(f"Modos desconocidos: {unknown}", file=sys.stderr)
+        return 2
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "micro": [],
+        "e2e": [],
+    }
+    if not args.skip_micro:
+        report["micro"] = run_micro(args.sizes, seed=args.seed, repeat=args.repeat)
+    if not args.skip_e2e:
+        report["e2e"] = asyncio.run(
+            run_e2e(
+                args.e2e_sizes,
+                args.latency_ms,
+                modes,
+                requests=args.requests,
+                seed=args.seed,
+                per_page=args.per_page,
+                concurrency=args.concurrency,
+            )
+        )
+
+    regressions = False
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.max_regression)
+        regressions = any(c["regression"] for c in report["comparison"])
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.config import IncentivosConfig
+
+# Generador de deals sintéticos con la forma real de custom_fields en Sell v2
+# (por NOMBRE de campo, como config/incentivos_config.json). Con la misma semilla
+# siempre sale la misma lista, para comparar corridas entre versiones.
+
+STAGE_IDS = [10693256, 35531166]
+
+BENCH_CONFIG: Dict[str, Any] = {
+    "pipeline_id": 1290779,
+    "stage_ids": STAGE_IDS,
+    "fecha_cirugia_field_name": "FECHA DE CIRUGÍA",
+    "collaborator_field_names": {"c1": "Colaborador1", "c2": "Colaborador2", "c3": "Colaborador3"},
+    "bars": {
+        "1": {"field_name": "ComisionBAR1", "allowed": [1, 8001]},
+        "2": {"field_name": "ComisionBAR2", "allowed": [2, 5002, 8002]},
+        "3": {"field_name": "ComisionBAR3", "allowed": [3, 5003]},
+        "4": {"field_name": "ComisionBAR4", "allowed": [4, 9004]},
+        "5": {"field_name": "ComisionBAR5", "allowed": [5, 6005]},
+        "6": {"field_name": "ComisionBAR6", "allowed": [6, 6006]},
+    },
+}
+
+PEOPLE = [(101, "Ana Pérez"), (102, "Bruno Díaz"), (103, "Carla Soto"), (104, "Diego Rojas"), (105, "Elisa Mora")]
+
+
+def bench_config() -> IncentivosConfig:
+    return IncentivosConfig.model_validate(BENCH_CONFIG)
+
+
+def _bar_value(rng: random.Random, allowed: Sequence[int]) -> Any:
+    roll = rng.random()
+    if roll < 0.12:
+        return None  # BAR faltante
+    if roll < 0.17:
+        return rng.choice(["abc", "", "999", 7777, {"id": None, "name": None}])  # inválido
+    code = rng.choice(allowed)
+    shape = rng.random()
+    if shape < 0.35:
+        return {"id": code, "name": str(code)}  # valor de lista
+    if shape < 0.65:
+        return str(code)
+    if shape < 0.9:
+        return code
+    return float(code)
+
+
+def _fecha_value(rng: random.Random, day: date) -> Any:
+    roll = rng.random()
+    if roll < 0.04:
+        return None
+    if roll < 0.06:
+        return rng.choice(["", "sin fecha", "31/02/2024"])
+    fmt = rng.random()
+    if fmt < 0.5:
+        return day.isoformat()
+    if fmt < 0.7:
+        return f"{day.isoformat()}T{rng.randrange(24):02d}:00:00Z"
+    if fmt < 0.85:
+        return f"{day.month:02d}/{day.day:02d}/{day.year}"  # MM/DD/YYYY
+    if day.day > 12:
+        return f"{day.day:02d}/{day.month:02d}/{day.year}"  # DD/MM/YYYY sin ambigüedad
+    return day.isoformat()
+
+
+def _collaborator_value(rng: random.Random) -> Any:
+    roll = rng.random()
+    if roll < 0.15:
+        return None
+    pid, name = rng.choice(PEOPLE)
+    if roll < 0.55:
+        return {"id": pid, "name": name}
+    if roll < 0.85:
+        return name
+    return pid
+
+
+def make_deal(
+    rng: random.Random,
+    deal_id: int,
+    start: date,
+    days: int,
+    cfg: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Un deal v2 (`items[].data`) con fecha de cirugía en [start, start + days)."""
+    cfg = cfg or BENCH_CONFIG
+    day = start + timedelta(days=rng.randrange(days))
+    cf: Dict[str, Any] = {cfg["fecha_cirugia_field_name"]: _fecha_value(rng, day)}
+    for field in cfg["collaborator_field_names"].values():
+        cf[field] = _collaborator_value(rng)
+    for rule in cfg["bars"].values():
+        value = _bar_value(rng, rule["allowed"])
+        if value is not None or rng.random() < 0.5:
+            cf[rule["field_name"]] = value
+    # Campos que el cálculo no lee, pero que vienen en el payload real
+    cf["Origen"] = {"id": rng.randrange(10), "name": rng.choice(["Web", "Referido", "Campaña"])}
+    cf["Observaciones"] = "x" * rng.randrange(0, 120)
+    created = day - timedelta(days=rng.randrange(5, 90))
+    return {
+        "id": deal_id,
+        "name": f"Deal {deal_id}",
+        "pipeline_id": cfg["pipeline_id"],
+        "stage_id": rng.choice(cfg["stage_ids"]),
+        "value": rng.randrange(100_000, 5_000_000),
+        "currency": "CLP",
+        "created_at": f"{created.isoformat()}T12:00:00Z",
+        "updated_at": f"{(day + timedelta(days=1)).isoformat()}T12:00:00Z",
+        "tags": rng.sample(["vip", "convenio", "isapre", "fonasa", "particular"], k=rng.randrange(3)),
+        "custom_fields": cf,
+    }
+
+
+def make_deals(n: int, seed: int = 0, start: date = date(2024, 1, 1), days: int = 90) -> List[Dict[str, Any]]:
+    """`n` deals con fechas repartidas en `days` días desde `start` (por defecto ene-mar 2024)."""
+    rng = random.Random(seed)
+    return [make_deal(rng, 1_000_000 + i, start, days) for i in range(n)]
@@ -1,49 +1,175 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
 import asyncio
-import json
 import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from app.calculator import calc_month
-from app.config import Settings, load_incentivos_config
+from app.calculator import calc_month, calc_range
+from app.columnar import calc_month_columnar, calc_range_columnar, numpy_available
+from app.config import IncentivosConfig, Settings, load_incentivos_config
+from app.fastjson import dumps
+from app.parallel import SHARD_MODES, Source, calc_variants_parallel
 from app.sell_client import SellClient
+from app.service import compute_months, compute_range, fold_deals, format_year_month, parse_year_month
+from app.snapshot import SnapshotReader, SnapshotWriter
 
 
-async def main() -> int:
-    if len(sys.argv) != 2:
-        print("Uso: python scripts/recalc_month.py YYYY-MM", file=sys.stderr)
-        return 2
+def _parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Recalcula incentivos de un mes o de un rango de meses (inclusive).")
+    p.add_argument("start", metavar="YYYY-MM", help="mes (o primer mes del rango)")
+    p.add_argument("end", metavar="YYYY-MM", nargs="?", help="último mes del rango")
+    p.add_argument("--columnar", action="store_true", help="calcular con el motor por columnas (requiere numpy)")
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="procesos para el cálculo (1 = serial). El resultado es idéntico al serial",
+    )
+    p.add_argument(
+        "--shard",
+        choices=SHARD_MODES,
+        default="deals",
+        help="cómo repartir entre procesos: trozos de deals (default) o grupos de meses",
+    )
+    p.add_argument(
+        "--variant",
+        action="append",
+        default=[],
+        metavar="NOMBRE=CONFIG.json",
+        help="calcular también con otra config (repetible); la salida queda por nombre, con la actual como 'actual'",
+    )
+    source = p.add_mutually_exclusive_group()
+    source.add_argument(
+        "--dump",
+        metavar="ARCHIVO.ndjson.gz",
+        help="guardar los deals de las etapas configuradas (recortados a los campos de la config) "
+        "y calcular desde ese snapshot",
+    )
+    source.add_argument(
+        "--from-snapshot",
+        metavar="ARCHIVO.ndjson.gz",
+        help="calcular desde un snapshot guardado con --dump, sin llamar a Sell",
+    )
+    return p
+
+
+def calc_deals(
+    cfg: IncentivosConfig,
+    deals: Iterable[Dict[str, Any]],
+    start: Tuple[int, int],
+    end: Optional[Tuple[int, int]],
+    columnar: bool = False,
+) -> Dict[str, Any]:
+    """Mes (end=None) o rango sobre un iterable de deals ya deduplicado."""
+    if end is None:
+        if columnar:
+            return calc_month_columnar(cfg, deals, *start)
+        return calc_month(cfg, deals, *start)
+    if columnar:
+        return calc_range_columnar(cfg, deals, start, end)
+    return calc_range(cfg, deals, start, end)
+
+
+def _from_snapshot(path: str, cfg: IncentivosConfig, start, end, columnar: bool) -> Dict[str, Any]:
+    with SnapshotReader(path) as snap:
+        missing = snap.missing_fields(cfg)
+        if missing:
+            print(f"Aviso: el snapshot no tiene los campos {missing}", file=sys.stderr)
+        return calc_deals(cfg, snap, start, end, columnar)
+
+
+def _load_variants(specs: List[str]) -> Dict[str, IncentivosConfig]:
+    variants: Dict[str, IncentivosConfig] = {}
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep or not name or not path:
+            raise ValueError(f"--variant espera NOMBRE=CONFIG.json: {spec!r}")
+        variants[name] = load_incentivos_config(path)
+    return variants
+
+
+def _calc_parallel(
+    cfgs: Dict[str, IncentivosConfig], source: Source, start, end, args, columnar: bool
+) -> Dict[str, Any]:
+    results = calc_variants_parallel(cfgs, source, start, end or start, args.workers, args.shard, columnar)
+    if end is None:
+        # Un solo mes: misma forma que calc_month
+        ym = format_year_month(*start)
+        results = {name: out["months"][ym] for name, out in results.items()}
+    return results["actual"] if len(results) == 1 else results
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    args = _parser().parse_args(argv)
 
-    year_month = sys.argv[1]
     try:
-        y, m = year_month.split("-")
-        year = int(y)
-        month = int(m)
-        if not (1 <= month <= 12):
-            raise ValueError
+        start = parse_year_month(args.start)
+        end = parse_year_month(args.end) if args.end else None
     except Exception:
         print("Formato inválido. Usa YYYY-MM", file=sys.stderr)
         return 2
 
+    if end is not None and end < start:
+        print("Rango inválido: el primer mes es posterior al segundo", file=sys.stderr)
+        return 2
+
+    columnar = args.columnar
+    if columnar and not numpy_available():
+        print("Aviso: numpy no está instalado, se usa el cálculo normal", file=sys.stderr)
+        columnar = False
+
     settings = Settings()
     cfg = load_incentivos_config(settings.config_path)
+    try:
+        variants = _load_variants(args.variant)
+    except (OSError, ValueError) as e:
+        print(f"Config de variante inválida: {e}", file=sys.stderr)
+        return 2
+    cfgs = {"actual": cfg, **variants}
+    parallel = args.workers > 1 or bool(variants)
+
+    if args.from_snapshot:
+        # Sin red: reproducible y sin volver a descargar
+        try:
+            if parallel:
+                out = _calc_parallel(cfgs, args.from_snapshot, start, end, args, columnar)
+            else:
+                out = _from_snapshot(args.from_snapshot, cfg, start, end, columnar)
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer el snapshot: {e}", file=sys.stderr)
+            return 2
+        print(dumps(out, indent=True).decode("utf-8"))
+        return 0
 
     if not cfg.stage_ids:
         print("Config inválida: stage_ids vacío", file=sys.stderr)
         return 2
 
-    async with SellClient(settings.sell_base_url, settings.sell_access_token, settings.timeout_s) as sell:
-        deals_by_id = {}
-        for sid in cfg.stage_ids:
-            deals = await sell.list_deals_by_stage(int(sid), per_page=settings.per_page)
-            for d in deals:
-                did = d.get("id")
-                if did is not None:
-                    deals_by_id[int(did)] = d
-
-    out = calc_month(cfg, list(deals_by_id.values()), year, month)
-    print(json.dumps(out, ensure_ascii=False, indent=2))
+    async with SellClient.from_settings(settings) as sell:
+        if args.dump:
+            # Todas las etapas vía v2 (no sólo la ventana del mes), para poder
+            # recalcular cualquier mes desde el archivo.
+            with SnapshotWriter(args.dump, cfg) as writer:
+                await fold_deals(sell, cfg, settings, None, writer.write)
+            print(f"Snapshot: {writer.count} deals en {args.dump}", file=sys.stderr)
+            if parallel:
+                out = _calc_parallel(cfgs, args.dump, start, end, args, columnar)
+            else:
+                out = _from_snapshot(args.dump, cfg, start, end, columnar)
+        elif parallel:
+            deals: List[Dict[str, Any]] = []
+            await fold_deals(sell, cfg, settings, None, deals.append)
+            out = _calc_parallel(cfgs, deals, start, end, args, columnar)
+        elif end is None:
+            ym = format_year_month(*start)
+            out = (await compute_months(sell, [ym], cfg, settings))[ym]
+        else:
+            # Rango: una sola descarga y una sola pasada para todos los meses
+            out = await compute_range(sell, start, end, cfg, settings, columnar=columnar)
+
+    print(dumps(out, indent=True).decode("utf-8"))
     return 0
 
 
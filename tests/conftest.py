@@ -0,0 +1,21 @@
+import pytest
+
+from app.config import BarRule, IncentivosConfig
+
+
+@pytest.fixture
+def make_cfg():
+    """Config de incentivos de los tests (mismos field ids que los deals de ejemplo); los kwargs la pisan."""
+
+    def make(**overrides):
+        fields = {
+            "pipeline_id": 1290779,
+            "stage_ids": [10693256],
+            "fecha_cirugia_field_id": "FECHA DE CIRUGÍA",
+            "collaborator_field_ids": {"c1": "Colaborador1", "c2": "Colaborador2", "c3": "Colaborador3"},
+            "bars": {str(i): BarRule(field_id=f"ComisionBAR{i}", min=i, max=8000 + i) for i in range(1, 7)},
+            **overrides,
+        }
+        return IncentivosConfig(**fields)
+
+    return make
@@ -0,0 +1,68 @@
+import asyncio
+
+from app.calculator import calc_month
+import pytest
+
+from benchmarks.e2e import run_case
+from benchmarks.load import parse_mix, percentile, run_load
+from benchmarks.run import compare
+from benchmarks.synthetic import bench_config, make_deals
+
+
+def test_synthetic_deals_are_seeded():
+    assert make_deals(50, seed=3) == make_deals(50, seed=3)
+    assert make_deals(50, seed=3) != make_deals(50, seed=4)
+
+
+def test_e2e_case_matches_offline_calc_and_counts_sell_calls():
+    deals = make_deals(300, seed=1)
+    expected = calc_month(bench_config(), deals, 2024, 2)["month_matched_deals"]
+
+    row = asyncio.run(run_case(deals, "cache", latency_s=0.0, requests=3, per_page=50))
+    assert row["month_matched_deals"] == expected
+    # sólo el primer request va a Sell; el resto sale del cache mensual
+    first_calls = row["sell_calls"]
+    row = asyncio.run(run_case(deals, "cold", latency_s=0.0, requests=3, per_page=50))
+    assert row["sell_calls"] == 3 * first_calls
+    # config desplegada: store + cache; los requests siguientes no vuelven a Sell
+    row = asyncio.run(run_case(deals, "prod", latency_s=0.0, requests=3, per_page=50))
+    assert row["month_matched_deals"] == expected
+    assert row["sell_calls"] == first_calls
+
+
+def test_compare_flags_regressions():
+    base = {"micro": [{"name": "calc_month", "n": 10, "seconds": 1.0}], "e2e": []}
+    cur = {"micro": [{"name": "calc_month", "n": 10, "seconds": 1.5}], "e2e": []}
+    assert compare(cur, base, 1.25) == [{"key": ["calc_month", 10], "ratio": 1.5, "regression": True}]
+
+
+def test_percentile_and_mix_parsing():
+    values = [i / 100 for i in range(1, 101)]
+    assert (percentile(values, 50), percentile(values, 99), percentile(values, 100)) == (0.5, 0.99, 1.0)
+    assert percentile([], 50) is None
+    assert parse_mix("monthly=3,deal=1") == {"monthly": 0.75, "deal": 0.25}
+    with pytest.raises(ValueError):
+        parse_mix("range=1")
+
+
+def test_load_run_absorbs_injected_429s():
+    report = asyncio.run(
+        run_load(
+            concurrency=4,
+            duration_s=0.3,
+            deals=200,
+            sell_latency_s=0.0,
+            sell_429_rate=0.1,
+            retry_after_s=0.0,
+            mode="cold",
+            per_page=50,
+        )
+    )
+    assert report["requests"] > 0
+    assert report["error_rate"] == 0
+    assert set(report["status"]) == {"200"}
+    assert report["sell"]["throttled"] > 0
+    assert report["sell"]["retries"] == report["sell"]["throttled"]
+    assert report["sell"]["calls_per_request"] > 1
+    lat = report["latency"]["all"]
+    assert lat["p50_ms"] <= lat["p95_ms"] <= lat["p99_ms"] <= lat["max_ms"]
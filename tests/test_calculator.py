@@ -1,5 +1,10 @@
-from app.calculator import calc_bar
+from dateutil import parser
+
+from app.calculator import MonthAggregator, calc_bar, calc_month, calc_range, summarize_deals
 from app.config import IncentivosConfig, BarRule
+from app.deal_memo import DealMemo
+from app.rules import get_plan
+from app.utils import parse_iso_date
 
 
 def _cfg():
@@ -49,3 +54,144 @@ def test_bar_missing_is_ignored():
     r = calc_bar(1, cfg, cf)
     assert r.missing is True
     assert r.error is None
+
+
+def _deals():
+    return [
+        {"id": 1, "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-05", "ComisionBAR1": "8001", "Colaborador1": "Ana"}},
+        {"id": 2, "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-20", "ComisionBAR2": "2", "ComisionBAR3": "77"}},
+        {"id": 3, "custom_fields": {"FECHA DE CIRUGÍA": "2024-04-01", "ComisionBAR1": "1"}},
+        {"id": 4, "custom_fields": {}},
+    ]
+
+
+def test_month_aggregator_matches_calc_month_page_by_page():
+    cfg = _cfg()
+    deals = _deals()
+    agg = MonthAggregator(cfg, 2024, 3)
+    agg.add_many(deals[:2])
+    agg.add_many(deals[2:])
+    assert agg.result() == calc_month(cfg, deals, 2024, 3)
+
+
+def test_month_aggregator_dedupes_ids_across_pages():
+    cfg = _cfg()
+    deals = _deals()
+    agg = MonthAggregator(cfg, 2024, 3)
+    agg.add_many(deals)
+    agg.add_many(deals[:2])
+    out = agg.result()
+    assert out["processed_deals"] == 4
+    assert out["month_matched_deals"] == 2
+    assert out["totals_by_slot"]["1"] == 8001
+    assert out["counts_by_slot"]["3"]["invalid"] == 1
+
+
+def test_calc_range_buckets_match_calc_month():
+    cfg = _cfg()
+    deals = _deals()
+    out = calc_range(cfg, deals, (2024, 2), (2024, 4))
+    assert list(out["months"]) == ["2024-02", "2024-03", "2024-04"]
+    for ym, (y, m) in zip(out["months"], [(2024, 2), (2024, 3), (2024, 4)]):
+        assert out["months"][ym] == calc_month(cfg, deals, y, m)
+    assert out["totals"]["processed_deals"] == 4
+    assert out["totals"]["month_matched_deals"] == 3
+    assert out["totals"]["totals_by_slot"]["1"] == 8002
+
+
+def test_parse_iso_date_fast_path_matches_dateutil():
+    cases = [
+        "2024-03-05",
+        "2024-03-05T23:30:00-03:00",
+        "2024-03-05T10:00:00.123Z",
+        " 2024-03-05 ",
+        "05/03/2024",
+        "13/02/2024",
+        "02/13/2024",
+        "31/02/2024",
+        "2024-3-5",
+        "no es fecha",
+    ]
+    for s in cases:
+        try:
+            expected = parser.parse(s).date()
+        except Exception:
+            expected = None
+        assert parse_iso_date(s) == expected, s
+
+
+def test_node_format_allowed_list_is_compiled_to_paga_codes():
+    bar = BarRule.model_validate({"field_name": "ComisionBAR2", "allowed": [2, 5002, 8002]})
+    assert bar.field_id == "ComisionBAR2"
+    assert (bar.min, bar.max, bar.max_values) == (2, 5002, [5002, 8002])
+
+    cfg = _cfg().model_copy(update={"bars": {**_cfg().bars, "2": bar}})
+    assert calc_bar(2, cfg, {"ComisionBAR2": "8002"}).paga is True
+    assert calc_bar(2, cfg, {"ComisionBAR2": "2"}).paga is False
+    assert calc_bar(2, cfg, {"ComisionBAR2": "5003"}).error
+
+
+def test_plan_is_compiled_once_per_config():
+    cfg = _cfg()
+    assert get_plan(cfg) is get_plan(cfg)
+    other = cfg.model_copy(update={"extras_enabled": False})
+    assert get_plan(other) is not get_plan(cfg)
+    assert calc_bar(4, other, {"ComisionBAR4": "9004"}).monto == 0
+
+
+def test_memo_reuses_contributions_for_unchanged_deals():
+    cfg = _cfg()
+    deals = [dict(d, updated_at="2024-03-01T00:00:00Z") for d in _deals()]
+    memo = DealMemo(max_entries=100)
+
+    first = calc_month(cfg, deals, 2024, 3, memo=memo)
+    assert memo.misses == 4 and memo.hits == 0
+    second = calc_month(cfg, deals, 2024, 3, memo=memo)
+    assert memo.hits == 4
+    assert first == second == calc_month(cfg, deals, 2024, 3)
+
+    # un deal editado (nuevo updated_at) se re-evalúa
+    edited_cf = {**deals[0]["custom_fields"], "ComisionBAR1": "1"}
+    deals[0] = dict(deals[0], updated_at="2024-03-02T00:00:00Z", custom_fields=edited_cf)
+    third = calc_month(cfg, deals, 2024, 3, memo=memo)
+    assert third["totals_by_slot"]["1"] == 1
+    assert third == calc_month(cfg, deals, 2024, 3)
+
+
+def test_memo_is_bounded():
+    memo = DealMemo(max_entries=2)
+    for i in range(3):
+        memo.put(i, i)
+    assert len(memo) == 2
+    assert memo.evictions == 1
+    assert memo.get(0) is None
+
+
+def test_calc_month_lists_each_error_occurrence_in_order():
+    cfg = _cfg()
+    deals = [
+        {"id": 1, "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-05", "ComisionBAR1": "999"}},
+        {"id": 2, "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-06", "ComisionBAR2": "999"}},
+        {"id": 1, "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-07", "ComisionBAR3": "999"}},
+    ]
+    out = calc_month(cfg, deals, 2024, 3)
+    # sin dedupe, un id repetido se cuenta dos veces y su auditoría también
+    assert out["month_matched_deals"] == 3
+    assert [(e.deal_id, e.errors[0][:4]) for e in out["deal_errors"]] == [(1, "BAR1"), (2, "BAR2"), (1, "BAR3")]
+
+
+def test_summarize_deals_only_builds_months_with_deals():
+    cfg = _cfg()
+    deals = [
+        {"id": 1, "custom_fields": {"FECHA DE CIRUGÍA": "0001-01-15", "ComisionBAR1": "8001"}},
+        {"id": 2, "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-05", "ComisionBAR1": "8001"}},
+        {"id": 3, "custom_fields": {"FECHA DE CIRUGÍA": "9999-12-10", "ComisionBAR1": "8001"}},
+        {"id": 2, "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-05", "ComisionBAR1": "8001"}},
+    ]
+    out = summarize_deals(cfg, deals)
+    # 9999-12 no tiene fin de mes representable: queda fuera, sin tumbar el resumen
+    assert list(out["months"]) == ["0001-01", "2024-03"]
+    assert (out["from"], out["to"]) == ("0001-01", "9999-12")
+    assert out["months"]["2024-03"]["month_matched_deals"] == 1
+    assert out["totals"]["processed_deals"] == 3
+    assert out["totals"]["totals_by_slot"]["1"] == 2 * 8001
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from app.calculator import calc_month, calc_range
+from app.config import BarRule
+
+np = pytest.importorskip("numpy")
+
+from app.columnar import calc_month_columnar, calc_range_columnar  # noqa: E402
+
+# Topes distintos por BAR y un max_values, para cubrir más ramas que la config base
+BARS = {
+    "1": BarRule(field_id="ComisionBAR1", min=1, max=8001),
+    "2": BarRule(field_id="ComisionBAR2", min=2, max=5002, max_values=[5002, 7002]),
+    "3": BarRule(field_id="ComisionBAR3", min=3, max=5003),
+    "4": BarRule(field_id="ComisionBAR4", min=4, max=9004),
+    "5": BarRule(field_id="ComisionBAR5", min=5, max=6005),
+    "6": BarRule(field_id="ComisionBAR6", min=6, max=6006),
+}
+PEOPLE = [None, "Ana", "Beto", {"id": 7, "name": "Carla"}, {"id": None, "name": "Sin id"}, 42, ""]
+
+
+def _bar_value(rng, cfg, slot):
+    rule = cfg.bars[str(slot)]
+    return rng.choice(
+        [
+            None,
+            str(rule.min),
+            str(rule.max),
+            rule.max,
+            {"id": rule.max, "name": "paga"},
+            {"id": None, "name": str(rule.min)},
+            "999",
+            "no-num",
+            " ",
+            str(2**70),
+        ]
+    )
+
+
+def _deals(cfg, seed, n=400):
+    rng = random.Random(seed)
+    fechas = [None, "", "2024-01-15", "2024-02-29", "03/04/2024", "25/03/2024", "2024-03-31T23:00:00Z", "basura"]
+    deals = []
+    for i in range(n):
+        cf = {"FECHA DE CIRUGÍA": rng.choice(fechas)}
+        for slot in range(1, 7):
+            value = _bar_value(rng, cfg, slot)
+            if value is not None or rng.random() < 0.5:
+                cf[f"ComisionBAR{slot}"] = value
+        for role in (1, 2, 3):
+            cf[f"Colaborador{role}"] = rng.choice(PEOPLE)
+        deal_id = None if rng.random() < 0.03 else rng.randint(1, n)  # ids repetidos y sin id
+        deals.append({"id": deal_id, "stage_id": 10693256, "custom_fields": cf})
+    return deals
+
+
+@pytest.mark.parametrize("extras_enabled", [True, False])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_columnar_month_matches_calc_month(seed, extras_enabled, make_cfg):
+    cfg = make_cfg(bars=BARS, extras_enabled=extras_enabled)
+    deals = _deals(cfg, seed)
+    for year, month in ((2024, 1), (2024, 2), (2024, 3), (2024, 4)):
+        assert calc_month_columnar(cfg, deals, year, month) == calc_month(cfg, deals, year, month)
+
+
+@pytest.mark.parametrize("seed", [4, 5])
+def test_columnar_range_matches_calc_range(seed, make_cfg):
+    cfg = make_cfg(bars=BARS)
+    deals = _deals(cfg, seed, n=1000)
+    want = calc_range(cfg, deals, (2023, 12), (2024, 4))
+    got = calc_range_columnar(cfg, deals, (2023, 12), (2024, 4))
+    assert got == want
+    # mismo orden de personas y de auditoría, no sólo mismo contenido
+    for ym, month in want["months"].items():
+        assert list(got["months"][ym]["totals_by_person"]) == list(month["totals_by_person"])
+        assert got["months"][ym]["deal_errors"] == month["deal_errors"]
+
+
+def test_columnar_empty_snapshot(make_cfg):
+    cfg = make_cfg(bars=BARS)
+    assert calc_month_columnar(cfg, [], 2024, 3) == calc_month(cfg, [], 2024, 3)
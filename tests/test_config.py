@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from app.config import ConfigProvider
+
+CONFIG = {
+    "pipeline_id": 1,
+    "stage_ids": [10],
+    "fecha_cirugia_field_id": "FECHA DE CIRUGÍA",
+    "collaborator_field_ids": {"c1": "Colaborador1"},
+    "bars": {str(i): {"field_id": f"ComisionBAR{i}", "min": i, "max": 8000 + i} for i in range(1, 7)},
+}
+
+
+def _write(p, cfg, mtime_ns):
+    p.write_text(json.dumps(cfg), encoding="utf-8")
+    os.utime(p, ns=(mtime_ns, mtime_ns))
+
+
+def test_provider_reuses_config_until_file_changes(tmp_path):
+    p = tmp_path / "cfg.json"
+    _write(p, CONFIG, 1_000_000_000)
+    provider = ConfigProvider(p, check_every_s=0)
+
+    cfg, h = provider.get_with_hash()
+    assert provider.get() is cfg
+
+    _write(p, dict(CONFIG, pipeline_id=2), 2_000_000_000)
+    cfg2, h2 = provider.get_with_hash()
+    assert cfg2.pipeline_id == 2
+    assert h2 != h
+    assert provider.reloads == 1
+
+
+def test_provider_keeps_last_good_config_on_invalid_file(tmp_path):
+    p = tmp_path / "cfg.json"
+    _write(p, CONFIG, 1_000_000_000)
+    provider = ConfigProvider(p, check_every_s=0)
+    cfg = provider.get()
+
+    _write(p, {"pipeline_id": "x"}, 2_000_000_000)
+    assert provider.get() is cfg
+    assert provider.last_error
+
+
+def test_provider_skips_stat_between_checks(tmp_path, monkeypatch):
+    p = tmp_path / "cfg.json"
+    _write(p, CONFIG, 1_000_000_000)
+    provider = ConfigProvider(p, check_every_s=3600)
+    provider.get()
+
+    def no_io(*a, **k):
+        raise AssertionError("no debería haber I/O")
+
+    monkeypatch.setattr(os, "stat", no_io)
+    provider.get()
+
+
+def test_provider_missing_file_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ConfigProvider(tmp_path / "nope.json").get()
@@ -0,0 +1,59 @@
+import pytest
+
+from app.calculator import calc_deal, calc_month, calc_range
+from app.config import IncentivosConfig
+from app.deal_record import DealRecord
+from app.rules import get_plan
+from app.scenarios import ScenarioEngine, apply_overrides
+from benchmarks.synthetic import BENCH_CONFIG, make_deals
+
+
+def _cfg(**overrides):
+    return IncentivosConfig.model_validate({**BENCH_CONFIG, **overrides})
+
+
+def test_records_give_same_results_as_payloads():
+    cfg = _cfg()
+    plan = get_plan(cfg)
+    deals = make_deals(400, seed=7)
+    records = [DealRecord.from_payload(plan, d) for d in deals]
+
+    for deal, record in zip(deals[:100], records):
+        assert calc_deal(cfg, record) == calc_deal(cfg, deal)
+    assert calc_month(cfg, records, 2024, 2) == calc_month(cfg, deals, 2024, 2)
+    assert calc_range(cfg, records, (2024, 1), (2024, 3)) == calc_range(cfg, deals, (2024, 1), (2024, 3))
+
+    # reglas distintas sobre los mismos campos: el record sirve igual
+    other = apply_overrides(cfg, {"extras_enabled": False, "bars": {"2": {"max_values": [5002]}}})
+    assert calc_month(other, records, 2024, 2) == calc_month(other, deals, 2024, 2)
+    engine = ScenarioEngine(cfg, {"b": other}, 2024, 2)
+    engine.add_many(records)
+    assert engine.result()["scenarios"]["b"]["result"] == calc_month(other, deals, 2024, 2)
+
+
+def test_columnar_accepts_records():
+    pytest.importorskip("numpy")
+    from app.columnar import calc_range_columnar
+
+    cfg = _cfg()
+    plan = get_plan(cfg)
+    deals = make_deals(300, seed=2)
+    records = [DealRecord.from_payload(plan, d) for d in deals]
+    assert calc_range_columnar(cfg, records, (2024, 1), (2024, 3)) == calc_range(cfg, deals, (2024, 1), (2024, 3))
+
+
+def test_record_keeps_only_what_the_calculation_reads():
+    plan = get_plan(_cfg())
+    deal = make_deals(1, seed=1)[0]
+    record = DealRecord.from_payload(plan, deal)
+    assert not hasattr(record, "__dict__")
+    assert record.get("id") == deal["id"] and record.get("updated_at") == deal["updated_at"]
+    assert record.get("custom_fields") is None and record.get("tags", []) == []
+    assert len(record.codes) == 6 and len(record.collaborators) == 3
+
+
+def test_record_rejects_plan_with_other_fields():
+    record = DealRecord.from_payload(get_plan(_cfg()), make_deals(1)[0])
+    moved = _cfg(fecha_cirugia_field_name="Otra fecha")
+    with pytest.raises(ValueError):
+        calc_deal(moved, record)
@@ -0,0 +1,110 @@
+import asyncio
+
+import httpx
+
+from app.deal_store import DealStore
+from app.sell_client import SellClient
+
+
+class FakeSell:
+    """Backend /v2/deals mínimo: filtro por stage_id y orden por updated_at desc."""
+
+    def __init__(self, deals):
+        self.deals = {d["id"]: d for d in deals}
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        self.requests.append(dict(params))
+        per_page = int(params["per_page"])
+        page = int(params["page"])
+        if "stage_id" in params:
+            rows = [d for d in self.deals.values() if d["stage_id"] == int(params["stage_id"])]
+        else:
+            rows = sorted(self.deals.values(), key=lambda d: d["updated_at"], reverse=True)
+        chunk = rows[(page - 1) * per_page : page * per_page]
+        return httpx.Response(200, json={"items": [{"data": d} for d in chunk]})
+
+
+def _deal(did, stage_id, updated_at):
+    return {"id": did, "stage_id": stage_id, "updated_at": updated_at}
+
+
+def test_full_load_then_incremental_changes():
+    fake = FakeSell(
+        [
+            _deal(1, 10, "2024-03-01T10:00:00Z"),
+            _deal(2, 10, "2024-03-01T11:00:00Z"),
+            _deal(3, 20, "2024-03-01T12:00:00Z"),
+            _deal(4, 99, "2024-03-01T09:00:00Z"),
+        ]
+    )
+
+    async def go():
+        store = DealStore(overlap_s=0)
+        async with SellClient("http://sell", "t", transport=httpx.MockTransport(fake.handler)) as sell:
+            await store.sync(sell, [10, 20])
+            assert sorted(d["id"] for d in store.deals()) == [1, 2, 3]
+
+            # deal 2 cambia de BAR, deal 3 sale de las etapas, deal 4 entra
+            fake.deals[2] = {**_deal(2, 10, "2024-03-02T10:00:00Z"), "name": "editado"}
+            fake.deals[3] = _deal(3, 99, "2024-03-02T11:00:00Z")
+            fake.deals[4] = _deal(4, 20, "2024-03-02T12:00:00Z")
+            fake.requests.clear()
+
+            await store.sync(sell, [10, 20])
+        return store
+
+    store = asyncio.run(go())
+    by_id = {d["id"]: d for d in store.deals()}
+    assert sorted(by_id) == [1, 2, 4]
+    assert by_id[2]["name"] == "editado"
+    assert store.full_syncs == 1
+    assert store.incremental_syncs == 1
+    assert store.last_removed == 1
+    # el incremental es una sola página ordenada por updated_at, sin stage_id
+    assert len(fake.requests) == 1
+    assert fake.requests[0]["sort_by"] == "updated_at:desc"
+
+
+def test_stage_change_forces_full_load():
+    fake = FakeSell([_deal(1, 10, "2024-03-01T10:00:00Z"), _deal(2, 20, "2024-03-01T10:00:00Z")])
+
+    async def go():
+        store = DealStore()
+        async with SellClient("http://sell", "t", transport=httpx.MockTransport(fake.handler)) as sell:
+            await store.sync(sell, [10])
+            await store.sync(sell, [10, 20])
+        return store
+
+    store = asyncio.run(go())
+    assert store.full_syncs == 2
+    assert sorted(d["id"] for d in store.deals()) == [1, 2]
+
+
+def test_plan_stores_compact_records_and_field_change_forces_full_load(make_cfg):
+    from app.deal_record import DealRecord
+    from app.rules import get_plan
+
+    def cfg(fecha_field):
+        return make_cfg(stage_ids=[10], fecha_cirugia_field_id=fecha_field)
+
+    deal = {**_deal(1, 10, "2024-03-01T10:00:00Z"), "custom_fields": {"F": "2024-03-05", "G": "2024-04-01"}}
+    fake = FakeSell([deal])
+
+    async def go():
+        store = DealStore()
+        async with SellClient("http://sell", "t", transport=httpx.MockTransport(fake.handler)) as sell:
+            await store.sync(sell, [10], plan=get_plan(cfg("F")))
+            first = store.deals()[0]
+            # sólo cambian reglas: incremental
+            await store.sync(sell, [10], plan=get_plan(cfg("F")))
+            # cambia el campo de fecha: los records guardados no sirven => carga completa
+            await store.sync(sell, [10], plan=get_plan(cfg("G")))
+        return store, first
+
+    store, first = asyncio.run(go())
+    assert isinstance(first, DealRecord) and str(first.fecha) == "2024-03-05"
+    assert str(store.deals()[0].fecha) == "2024-04-01"
+    assert (store.full_syncs, store.incremental_syncs) == (2, 1)
+    assert store.status()["compact"] is True
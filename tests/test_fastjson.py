@@ -0,0 +1,54 @@
+import json
+from datetime import date
+
+from app import fastjson
+from app.calculator import BarDetail, DealErrors, calc_deal, calc_month
+from app.config import IncentivosConfig
+from benchmarks.synthetic import BENCH_CONFIG, make_deals
+
+
+def test_dumps_slots_results_like_plain_dicts():
+    detail = BarDetail(codigo=1, paga=True, monto=100, error=None, missing=False)
+    errors = DealErrors(deal_id=7, errors=("sin fecha", "bar_1 inválido"))
+    got = json.loads(fastjson.dumps({"bars": {"1": detail}, "deal_errors": [errors], "day": date(2024, 3, 1)}))
+    assert got == {
+        "bars": {"1": {"codigo": 1, "paga": True, "monto": 100, "error": None, "missing": False}},
+        "deal_errors": [{"deal_id": 7, "errors": ["sin fecha", "bar_1 inválido"]}],
+        "day": "2024-03-01",
+    }
+
+
+def test_dumps_non_string_keys_and_indent():
+    assert json.loads(fastjson.dumps({1: "a", "b": [1, 2]})) == {"1": "a", "b": [1, 2]}
+    text = fastjson.dumps({"ñ": 1}, indent=True).decode("utf-8")
+    assert "\n" in text and "ñ" in text
+
+
+def test_loads_accepts_bytes_and_str():
+    assert fastjson.loads(b'{"items": [1]}') == {"items": [1]}
+    assert fastjson.loads('{"items": [1]}') == {"items": [1]}
+
+
+def test_calc_results_encode_like_stdlib():
+    cfg = IncentivosConfig.model_validate(BENCH_CONFIG)
+    deals = make_deals(300, seed=3)
+    month = calc_month(cfg, deals, 2024, 2)
+    assert month["deal_errors"]
+    deal = calc_deal(cfg, deals[0])
+
+    def plain(obj):
+        return json.loads(json.dumps(obj, default=fastjson._default))
+
+    assert json.loads(fastjson.dumps(month)) == plain(month)
+    assert json.loads(fastjson.dumps(deal)) == plain(deal)
+
+
+def test_ints_beyond_64_bits_round_trip_exactly():
+    big = 123456789012345678901234
+    assert fastjson.loads(b'{"v": 123456789012345678901234, "w": -9999999999999999999}') == {
+        "v": big,
+        "w": -9999999999999999999,
+    }
+    detail = BarDetail(codigo=big, paga=None, monto=None, error="inválido", missing=False)
+    assert json.loads(fastjson.dumps({"bars": {"1": detail}}))["bars"]["1"]["codigo"] == big
+    assert json.loads(fastjson.dumps({1: big}, indent=True)) == {"1": big}
@@ -0,0 +1,69 @@
+import json
+
+from app.calculator import calc_month
+from app.deal_store import SyncResult
+from app.live_aggregates import LiveAggregates
+
+
+def _deal(did, fecha, bar1="8001", colab="Ana", bar4=None):
+    cf = {"FECHA DE CIRUGÍA": fecha, "ComisionBAR1": bar1, "Colaborador1": colab}
+    if bar4 is not None:
+        cf["ComisionBAR4"] = bar4
+    return {"id": did, "stage_id": 10693256, "custom_fields": cf}
+
+
+def _same(live, cfg, deals, y, m):
+    got = live.month_result(y, m)
+    want = calc_month(cfg, deals, y, m)
+    key = lambda e: (str(e.deal_id), str(e))  # noqa: E731
+    got["deal_errors"] = sorted(got["deal_errors"], key=key)
+    want["deal_errors"] = sorted(want["deal_errors"], key=key)
+    assert got == want
+
+
+def test_upsert_remove_and_month_move_match_full_recalc(make_cfg):
+    cfg = make_cfg()
+    snapshot = {
+        1: _deal(1, "2024-03-05"),
+        2: _deal(2, "2024-03-10", bar1="1", colab="Beto", bar4="9004"),
+        3: _deal(3, "2024-04-01", bar1="999"),
+        4: _deal(4, "2024-03-20", colab="Beto"),
+    }
+    live = LiveAggregates()
+    live.load(cfg, snapshot.values())
+    for y, m in ((2024, 3), (2024, 4)):
+        _same(live, cfg, list(snapshot.values()), y, m)
+
+    # deal 1 cambia de BAR, deal 4 se mueve a abril, deal 2 se borra
+    snapshot[1] = _deal(1, "2024-03-05", bar1="1")
+    snapshot[4] = _deal(4, "2024-04-15", colab="Beto")
+    del snapshot[2]
+    affected = live.apply_sync(SyncResult(full=False, upserted=[snapshot[1], snapshot[4]], removed=[2]))
+
+    assert sorted(affected) == [(2024, 3), (2024, 4)]
+    for y, m in ((2024, 3), (2024, 4), (2024, 5)):
+        _same(live, cfg, list(snapshot.values()), y, m)
+    # Beto ya no tiene deals en marzo
+    assert "Beto" not in {p["label"] for p in live.month_result(2024, 3)["totals_by_person"].values()}
+
+
+def test_matches_tracks_config_hash(make_cfg):
+    cfg = make_cfg()
+    live = LiveAggregates()
+    assert not live.matches(cfg)
+    live.load(cfg, [])
+    assert live.matches(cfg)
+    assert not live.matches(cfg.model_copy(update={"extras_enabled": False}))
+
+
+def test_month_result_is_a_snapshot_not_the_live_totals(make_cfg):
+    cfg = make_cfg()
+    live = LiveAggregates()
+    live.load(cfg, [_deal(1, "2024-03-05"), _deal(2, "2024-03-10", colab="Beto")])
+    before = live.month_result(2024, 3)
+    frozen = json.loads(json.dumps(before, default=str))
+
+    live.apply_sync(SyncResult(full=False, upserted=[_deal(3, "2024-03-12")], removed=[2]))
+
+    assert json.loads(json.dumps(before, default=str)) == frozen
+    assert live.month_result(2024, 3)["totals_by_person"]["Ana"]["deals"] == 2
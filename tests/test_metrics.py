@@ -0,0 +1,33 @@
+from app.metrics import Counter, Histogram, Registry, family
+
+
+def test_histogram_buckets_are_cumulative_and_le_inclusive():
+    h = Histogram("t_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    h.observe(0.1, "/a")
+    h.observe(0.5, "/a")
+    h.observe(3.0, "/a")
+    text = h.render()
+    assert 't_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 't_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 't_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 't_seconds_sum{route="/a"} 3.6' in text
+    assert h.count("/a") == 3
+
+
+def test_counter_labels_are_escaped_and_registry_dedupes():
+    reg = Registry()
+    c = reg.counter("t_total", "test", ("reason",))
+    assert reg.counter("t_total", "otra") is c
+    c.inc('a"b')
+    c.inc('a"b', value=2)
+    assert c.value('a"b') == 3
+    text = reg.render(extra=[family("t_gauge", "gauge", "g", [({}, 1.5)])])
+    assert 't_total{reason="a\\"b"} 3' in text
+    assert "# TYPE t_gauge gauge\nt_gauge 1.5" in text
+    assert text.endswith("\n")
+
+
+def test_unlabelled_counter_renders_value():
+    c = Counter("n_total", "test")
+    c.inc(value=4)
+    assert c.render().splitlines()[-1] == "n_total 4"
@@ -0,0 +1,86 @@
+import asyncio
+
+from app.monthly_cache import MonthlyCache
+
+
+def _counting_compute(calls):
+    async def compute(months):
+        calls.append(list(months))
+        return {ym: {"month": ym, "n": len(calls)} for ym in months}
+
+    return compute
+
+
+def test_miss_then_hit():
+    calls = []
+
+    async def go():
+        cache = MonthlyCache(_counting_compute(calls), max_age_s=60)
+        first = await cache.get_month("2024-03")
+        second = await cache.get_month("2024-03")
+        return first, second
+
+    first, second = asyncio.run(go())
+    assert first.cache == "MISS"
+    assert second.cache == "HIT"
+    assert second.data is first.data
+    assert calls == [["2024-03"]]
+
+
+def test_stale_is_served_while_revalidating():
+    calls = []
+
+    async def go():
+        cache = MonthlyCache(_counting_compute(calls), max_age_s=0)
+        await cache.get_month("2024-03")
+        stale = await cache.get_month("2024-03")
+        await cache.refresh_once()
+        return stale, cache.status()
+
+    stale, status = asyncio.run(go())
+    assert stale.cache == "STALE"
+    assert stale.data["n"] == 1
+    assert len(calls) == 2
+    assert status["last_refresh_at"] is not None
+    assert status["last_refresh_error"] is None
+
+
+def test_lru_eviction_of_tracked_months():
+    async def go():
+        cache = MonthlyCache(_counting_compute([]), max_months=2)
+        await cache.get_month("2024-01")
+        await cache.get_month("2024-02")
+        await cache.get_month("2024-01")
+        await cache.get_month("2024-03")
+        return cache.status()["tracked_months"]
+
+    assert asyncio.run(go()) == ["2024-01", "2024-03"]
+
+
+def test_refresh_error_is_reported():
+    async def failing(months):
+        raise RuntimeError("boom")
+
+    async def go():
+        cache = MonthlyCache(failing)
+        try:
+            await cache.get_month("2024-03")
+        except RuntimeError:
+            pass
+        return cache.status()
+
+    assert asyncio.run(go())["last_refresh_error"] == "RuntimeError: boom"
+
+
+def test_encoded_body_is_built_once_per_entry():
+    calls = []
+
+    async def go():
+        cache = MonthlyCache(_counting_compute(calls), max_age_s=60)
+        first = await cache.get_month("2024-03")
+        second = await cache.get_month("2024-03")
+        return first.encoded(), second.encoded()
+
+    first, second = asyncio.run(go())
+    assert first is second
+    assert first == b'{"month":"2024-03","n":1}'
@@ -0,0 +1,450 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import service
+from app.calculator import calc_month
+from app.config import Settings, get_settings
+from app.main import create_app
+from app.rules import CompiledBar
+from app.sell_client import SellClient
+from app.service import stream_month_deals
+from benchmarks.fake_sell import FakeSell
+from benchmarks.synthetic import bench_config, make_deals
+
+CONFIG = {
+    "pipeline_id": 1290779,
+    "stage_ids": [10693256],
+    "fecha_cirugia_field_id": "FECHA DE CIRUGÍA",
+    "collaborator_field_ids": {"c1": "Colaborador1", "c2": "Colaborador2", "c3": "Colaborador3"},
+    "bars": {
+        str(i): {"field_id": f"ComisionBAR{i}", "min": i, "max": 8000 + i} for i in range(1, 7)
+    },
+}
+
+DEALS = [
+    {
+        "id": 1,
+        "name": "Deal 1",
+        "stage_id": 10693256,
+        "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-05", "ComisionBAR1": "8001", "Colaborador1": "Ana"},
+    },
+    {
+        "id": 2,
+        "name": "Deal 2",
+        "stage_id": 10693256,
+        "custom_fields": {"FECHA DE CIRUGÍA": "2024-04-01", "ComisionBAR1": "1"},
+    },
+]
+
+
+def _env(tmp_path, monkeypatch):
+    p = tmp_path / "incentivos_config.json"
+    p.write_text(json.dumps(CONFIG), encoding="utf-8")
+    monkeypatch.setenv("INCENTIVOS_CONFIG", str(p))
+    monkeypatch.setenv("SELL_ACCESS_TOKEN", "test")
+    get_settings.cache_clear()
+    return p
+
+
+def _fake_sell(calls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path == "/v2/deals":
+            page = int(request.url.params.get("page", "1"))
+            items = DEALS if page == 1 else []
+            return httpx.Response(200, json={"items": [{"data": d} for d in items]})
+        deal_id = int(request.url.path.rsplit("/", 1)[-1])
+        for d in DEALS:
+            if d["id"] == deal_id:
+                return httpx.Response(200, json={"data": d})
+        return httpx.Response(404, json={})
+
+    return httpx.MockTransport(handler)
+
+
+def _client(calls):
+    sell = SellClient("http://sell", "test", transport=_fake_sell(calls))
+    return TestClient(create_app(sell=sell)), sell
+
+
+def test_deal_lookups_share_one_pooled_client(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    calls = []
+    client, sell = _client(calls)
+    with client:
+        pool = sell._client
+        for _ in range(3):
+            r = client.get("/v1/deals/1")
+            assert r.status_code == 200
+            assert r.json()["slot_totals"] == {"1": 8001}
+        assert sell._client is pool
+    # el lifespan cierra el pool al apagar
+    assert sell._client is None
+
+
+def test_monthly_filters_by_fecha_cirugia(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    client, _ = _client([])
+    with client:
+        r = client.get("/v1/monthly/2024-03")
+        again = client.get("/v1/monthly/2024-03")
+    assert r.status_code == 200
+    assert again.headers["X-Cache"] == "HIT"
+    assert again.json() == r.json()
+    body = r.json()
+    assert body["processed_deals"] == 2
+    assert body["month_matched_deals"] == 1
+    assert body["totals_by_slot"]["1"] == 8001
+
+
+def test_range_endpoint(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    client, _ = _client([])
+    with client:
+        r = client.get("/v1/monthly", params={"from": "2024-03", "to": "2024-04"})
+        bad = client.get("/v1/monthly", params={"from": "2024-05", "to": "2024-04"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["months"]["2024-03"]["month_matched_deals"] == 1
+    assert body["months"]["2024-04"]["month_matched_deals"] == 1
+    assert body["totals"]["totals_by_slot"]["1"] == 8002
+    assert bad.status_code == 400
+
+
+def test_config_hot_reload_changes_hash_and_results(tmp_path, monkeypatch):
+    p = _env(tmp_path, monkeypatch)
+    monkeypatch.setenv("CONFIG_CACHE_S", "0")
+    get_settings.cache_clear()
+    client, _ = _client([])
+    with client:
+        before = client.get("/v1/config").json()["config_hash"]
+        first = client.get("/v1/monthly/2024-03").json()
+
+        cfg = dict(CONFIG, extras_enabled=False)
+        cfg["bars"] = {**CONFIG["bars"], "1": {"field_id": "ComisionBAR1", "min": 1, "max": 7001}}
+        p.write_text(json.dumps(cfg), encoding="utf-8")
+
+        after = client.get("/v1/config").json()["config_hash"]
+        second = client.get("/v1/monthly/2024-03")
+    assert before != after
+    assert first["totals_by_slot"]["1"] == 8001
+    # la entrada cacheada con la config anterior no se sirve
+    assert second.headers["X-Cache"] == "MISS"
+    assert second.json()["counts_by_slot"]["1"]["invalid"] == 1
+
+
+def test_deal_updated_event_refreshes_only_affected_months(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    calls = []
+    client, _ = _client(calls)
+    with client:
+        assert client.get("/v1/monthly/2024-03").json()["month_matched_deals"] == 1
+
+        # deal 2 pasa de abril a marzo y ahora paga
+        moved = {**DEALS[1], "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-20", "ComisionBAR1": "8001"}}
+        monkeypatch.setitem(globals(), "DEALS", [DEALS[0], moved])
+        calls.clear()
+        r = client.post("/v1/events/deal-updated", json={"deal_id": 2})
+        assert r.status_code == 200
+        assert r.json()["action"] == "upserted"
+        assert sorted(r.json()["months"]) == ["2024-03", "2024-04"]
+        # sólo se pidió ese deal a Sell
+        assert calls == ["/v2/deals/2"]
+
+        march = client.get("/v1/monthly/2024-03")
+        assert march.headers["X-Cache"] == "HIT"
+        assert march.json()["month_matched_deals"] == 2
+        assert march.json()["totals_by_slot"]["1"] == 16002
+
+        gone = client.post("/v1/events/deal-updated", json={"deal_id": 99})
+        assert gone.json()["action"] == "removed"
+        assert gone.json()["months"] == []
+
+
+def test_scenarios_fetch_once_and_return_deltas(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    monkeypatch.setenv("DEAL_STORE_ENABLED", "false")
+    monkeypatch.setenv("MONTHLY_CACHE_ENABLED", "false")
+    get_settings.cache_clear()
+    calls = []
+    client, _ = _client(calls)
+    with client:
+        r = client.post(
+            "/v1/monthly/2024-3/scenarios",
+            json={"scenarios": {"otro_paga": {"bars": {"1": {"max_values": [7001]}}}, "igual": {}}},
+        )
+        bad = client.post("/v1/monthly/2024-03/scenarios", json={"scenarios": {"x": {"stage_ids": [1]}}})
+        typo = client.post("/v1/monthly/2024-03/scenarios", json={"scenarios": {"x": {"extras_enabeld": False}}})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["month"] == "2024-03"
+    assert body["baseline"]["totals_by_slot"]["1"] == 8001
+    assert body["scenarios"]["otro_paga"]["delta"]["total"] == -8001
+    assert body["scenarios"]["igual"]["delta"]["total"] == 0
+    # una sola descarga de deals para la base y los dos escenarios
+    assert calls == ["/v2/deals"]
+    assert bad.status_code == 400
+    assert typo.status_code == 400
+    assert "extras_enabeld" in typo.json()["detail"]
+
+
+def test_deals_batch_returns_per_id_results(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    calls = []
+    client, _ = _client(calls)
+    with client:
+        r = client.get("/v1/deals/batch", params={"ids": "1,99,abc,2", "summary": "true"})
+        post = client.post("/v1/deals/batch", json={"ids": [2, 1, 2]})
+        single = client.get("/v1/deals/1")
+    assert r.status_code == 200
+    body = r.json()
+    assert [x["id"] for x in body["results"]] == [1, 99, "abc", 2]
+    assert [x.get("status") for x in body["results"]] == [None, 404, 400, None]
+    assert body["results"][0]["result"]["slot_totals"] == {"1": 8001}
+    assert (body["ok"], body["errors"]) == (2, 2)
+    # resumen por mes de fecha_cirugia, sólo meses con deals
+    assert sorted(body["summary"]["months"]) == ["2024-03", "2024-04"]
+    assert body["summary"]["totals"]["totals_by_slot"]["1"] == 8002
+
+    assert post.json()["count"] == 2
+    assert "summary" not in post.json()
+    # la ruta /v1/deals/{deal_id} sigue funcionando
+    assert single.status_code == 200
+
+
+def test_deal_with_bar_code_beyond_64_bits(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    # código como texto y como número JSON; el número no debe pasar por float
+    raw = (
+        '{"data": {"id": 7, "stage_id": 10693256, "custom_fields": '
+        '{"FECHA DE CIRUGÍA": "2024-03-05", "ComisionBAR1": "123456789012345678901234", '
+        '"ComisionBAR2": 123456789012345678901235}}}'
+    )
+
+    def handler(request):
+        return httpx.Response(200, content=raw.encode(), headers={"Content-Type": "application/json"})
+
+    sell = SellClient("http://sell", "test", transport=httpx.MockTransport(handler))
+    with TestClient(create_app(sell=sell)) as client:
+        r = client.get("/v1/deals/7")
+        batch = client.get("/v1/deals/batch", params={"ids": "7"})
+    assert r.status_code == 200
+    assert r.json()["bars"]["1"]["codigo"] == 123456789012345678901234
+    assert r.json()["bars"]["2"]["codigo"] == 123456789012345678901235
+    assert batch.status_code == 200 and batch.json()["ok"] == 1
+
+
+def test_deals_batch_dedupes_on_parsed_id(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    calls = []
+    client, _ = _client(calls)
+    with client:
+        r = client.get("/v1/deals/batch", params={"ids": "1,01, 1", "summary": "true"})
+    body = r.json()
+    assert [x["id"] for x in body["results"]] == [1]
+    assert calls.count("/v2/deals/1") == 1
+    assert body["summary"]["totals"]["month_matched_deals"] == 1
+    assert body["summary"]["totals"]["totals_by_slot"]["1"] == 8001
+
+
+def test_metrics_endpoint_reports_routes_sell_calls_and_cache(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    client, _ = _client([])
+    with client:
+        client.get("/v1/monthly/2024-03")
+        client.get("/v1/monthly/2024-03")
+        r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    # la ruta va como template, no con el mes concreto
+    assert 'route="/v1/monthly/{year_month}",status="200"' in text
+    assert 'incentivos_sell_request_duration_seconds_count{method="GET",endpoint="/v2/deals",status="200"}' in text
+    assert 'incentivos_sell_pages_total{stage="10693256"}' in text
+    # con DealStore + agregados en vivo (el default) el mes sale de live_month
+    assert 'incentivos_calc_duration_seconds_count{phase="live_month"}' in text
+    assert 'incentivos_monthly_cache_reads_total{result="hit"} 1' in text
+    assert "incentivos_deals_month_matched_total" in text
+
+
+def test_monthly_deals_ndjson_streams_details_and_summary(tmp_path, monkeypatch):
+    _env(tmp_path, monkeypatch)
+    client, _ = _client([])
+    with client:
+        r = client.get("/v1/monthly/2024-3/deals.ndjson")
+        bad = client.get("/v1/monthly/marzo/deals.ndjson")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    # un calc_deal por deal del mes y el resumen al final
+    assert [x.get("deal_id") for x in lines[:-1]] == [1]
+    assert lines[0]["bars"]["1"] == {"codigo": 8001, "paga": True, "monto": 8001, "error": None, "missing": False}
+    assert lines[0]["person_totals"]["Ana"]["total"] == 8001
+    summary = lines[-1]["summary"]
+    assert summary["month"] == "2024-03"
+    assert (summary["processed_deals"], summary["month_matched_deals"]) == (2, 1)
+    assert summary["totals_by_slot"]["1"] == 8001
+    assert summary["deals_with_errors"] == 0
+    assert bad.status_code == 400
+
+
+def test_monthly_deals_stream_starts_with_first_pages():
+    cfg = bench_config()
+    deals = make_deals(2_000, seed=5, days=60)
+    fake = FakeSell(deals, max_per_page=50)
+    settings = Settings(SELL_ACCESS_TOKEN="t", SELL_PER_PAGE=50)
+
+    async def go():
+        chunks, calls_at_first = [], None
+        async with SellClient("http://sell", "t", transport=fake.transport()) as sell:
+            async for chunk in stream_month_deals(sell, "2024-02", cfg, settings):
+                if calls_at_first is None:
+                    calls_at_first = fake.total_calls
+                chunks.append(chunk)
+        return b"".join(chunks), calls_at_first
+
+    body, calls_at_first = asyncio.run(go())
+    # la primera línea sale sin esperar las ~40 páginas; la cola acotada frena a las etapas
+    assert calls_at_first <= 8 < fake.total_calls
+    lines = [json.loads(line) for line in body.splitlines()]
+    want = calc_month(cfg, deals, 2024, 2)
+    summary = lines[-1]["summary"]
+    assert len(lines) - 1 == want["month_matched_deals"] == summary["month_matched_deals"]
+    assert summary["deals_with_errors"] == len(want["deal_errors"]) > 0
+    assert summary["totals_by_person"] == want["totals_by_person"]
+    assert sum(x["slot_totals"].get("1", 0) for x in lines[:-1]) == want["totals_by_slot"]["1"]
+
+
+def test_monthly_deals_stream_ends_with_error_line_when_sell_fails():
+    cfg = bench_config()
+    fake = FakeSell(make_deals(500, seed=1), max_per_page=50)
+    settings = Settings(SELL_ACCESS_TOKEN="t", SELL_PER_PAGE=50)
+
+    async def handle(request):
+        if request.url.params.get("page") == "3":
+            return httpx.Response(401, json={})
+        return await fake.handle(request)
+
+    async def go():
+        sell = SellClient("http://sell", "t", transport=httpx.MockTransport(handle))
+        async with sell:
+            return [c async for c in stream_month_deals(sell, "2024-01", cfg, settings)]
+
+    lines = b"".join(asyncio.run(go())).splitlines()
+    assert len(lines) > 1
+    assert "summary" not in json.loads(lines[-1])
+    assert "401" in json.loads(lines[-1])["error"]
+
+
+def test_monthly_deals_stream_evaluates_each_deal_once(monkeypatch):
+    cfg = bench_config()
+    deals = make_deals(300, seed=2, days=60)
+    fake = FakeSell(deals, max_per_page=50)
+    settings = Settings(SELL_ACCESS_TOKEN="t", SELL_PER_PAGE=50)
+    want = calc_month(cfg, deals, 2024, 2)
+    evaluated = []
+    evaluate_code = CompiledBar.evaluate_code
+
+    def counting(self, raw):
+        evaluated.append(raw)
+        return evaluate_code(self, raw)
+
+    monkeypatch.setattr(CompiledBar, "evaluate_code", counting)
+
+    async def go():
+        async with SellClient("http://sell", "t", transport=fake.transport()) as sell:
+            return b"".join([c async for c in stream_month_deals(sell, "2024-02", cfg, settings)])
+
+    lines = [json.loads(line) for line in asyncio.run(go()).splitlines()]
+    summary = lines[-1]["summary"]
+    assert len(evaluated) == len(cfg.bars) * want["month_matched_deals"]
+    for key in ("month_matched_deals", "totals_by_slot", "totals_by_person", "counts_by_slot"):
+        assert summary[key] == want[key], key
+    assert summary["deals_with_errors"] == len(want["deal_errors"])
+
+
+def test_monthly_deals_stream_propagates_local_errors(monkeypatch):
+    cfg = bench_config()
+    fake = FakeSell(make_deals(200, seed=1), max_per_page=50)
+    settings = Settings(SELL_ACCESS_TOKEN="t", SELL_PER_PAGE=50)
+
+    dumps = service.dumps
+
+    def broken(obj):
+        if "deal_id" in obj:
+            raise TypeError("no serializable")
+        return dumps(obj)
+
+    monkeypatch.setattr(service, "dumps", broken)
+
+    async def go():
+        async with SellClient("http://sell", "t", transport=fake.transport()) as sell:
+            return [c async for c in stream_month_deals(sell, "2024-01", cfg, settings)]
+
+    # un bug propio no sale como "Error consultando deals" de Sell
+    with pytest.raises(TypeError, match="no serializable"):
+        asyncio.run(go())
+
+
+def _sell_downloads():
+    """Descargas por etapa de `iter_deal_pages_by_stages` que siguen vivas."""
+    return [t for t in asyncio.all_tasks() if t.get_coro().__name__ == "produce" and not t.done()]
+
+
+def _four_stages():
+    """Config y deals repartidos en 4 etapas: varias descargas esperando cupo a la vez."""
+    stages = [101, 102, 103, 104]
+    deals = [{**d, "stage_id": stages[i % 4]} for i, d in enumerate(make_deals(2_000, seed=2))]
+    return bench_config().model_copy(update={"stage_ids": stages}), deals
+
+
+def _failing_stage_sell(fake, stage_id, page="3"):
+    async def handle(request):
+        params = request.url.params
+        if params.get("stage_id") == str(stage_id) and params.get("page") == page:
+            return httpx.Response(400, json={})
+        return await fake.handle(request)
+
+    return SellClient("http://sell", "t", transport=httpx.MockTransport(handle))
+
+
+def test_monthly_deals_stream_stage_error_with_slow_consumer_does_not_hang():
+    cfg, deals = _four_stages()
+    fake = FakeSell(deals, max_per_page=10)
+    settings = Settings(SELL_ACCESS_TOKEN="t", SELL_PER_PAGE=10)
+
+    async def go():
+        chunks = []
+        async with _failing_stage_sell(fake, cfg.stage_ids[-1]) as sell:
+            async for chunk in stream_month_deals(sell, "2024-01", cfg, settings):
+                chunks.append(chunk)
+                await asyncio.sleep(0.005)  # cliente lento: las descargas llenan sus cupos
+        return chunks, _sell_downloads()
+
+    chunks, leftover = asyncio.run(asyncio.wait_for(go(), timeout=10))
+    assert "400" in json.loads(chunks[-1])["error"]
+    assert leftover == []
+
+
+def test_monthly_deals_stream_aclose_cancels_sell_downloads():
+    cfg, deals = _four_stages()
+    fake = FakeSell(deals, latency_s=0.001, max_per_page=10)
+    settings = Settings(SELL_ACCESS_TOKEN="t", SELL_PER_PAGE=10)
+
+    async def go():
+        async with SellClient("http://sell", "t", transport=fake.transport()) as sell:
+            stream = stream_month_deals(sell, "2024-01", cfg, settings)
+            first = await stream.__anext__()
+            await stream.aclose()
+            calls = fake.total_calls
+            await asyncio.sleep(0.05)
+            assert fake.total_calls == calls  # nada sigue descargando
+        return first, _sell_downloads()
+
+    first, leftover = asyncio.run(asyncio.wait_for(go(), timeout=10))
+    assert first.endswith(b"\n")
+    assert leftover == []
@@ -0,0 +1,66 @@
+import pytest
+
+from app.calculator import calc_month
+from app.scenarios import ScenarioEngine, apply_overrides
+
+
+def _deals():
+    return [
+        {
+            "id": 1,
+            "custom_fields": {
+                "FECHA DE CIRUGÍA": "2024-03-05",
+                "ComisionBAR1": "8001",
+                "ComisionBAR2": "7002",
+                "ComisionBAR4": "8004",
+                "Colaborador1": "Ana",
+                "Colaborador2": "Beto",
+            },
+        },
+        {"id": 2, "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-09", "ComisionBAR1": "1", "Colaborador1": "Ana"}},
+        {"id": 3, "custom_fields": {"FECHA DE CIRUGÍA": "2024-04-01", "ComisionBAR1": "8001"}},
+    ]
+
+
+def test_each_scenario_matches_calc_month_with_that_config(make_cfg):
+    base = make_cfg()
+    scenarios = {
+        "sin_extras": apply_overrides(base, {"extras_enabled": False}),
+        "bar2_legacy": apply_overrides(base, {"bars": {"2": {"max_values": [8002, 7002]}}}),
+        "bar2_node": apply_overrides(base, {"bars": {"2": {"allowed": [2, 7002]}}}),
+    }
+    engine = ScenarioEngine(base, scenarios, 2024, 3)
+    engine.add_many(_deals())
+    out = engine.result()
+
+    assert out["baseline"] == calc_month(base, _deals(), 2024, 3)
+    for name, cfg in scenarios.items():
+        assert out["scenarios"][name]["result"] == calc_month(cfg, _deals(), 2024, 3)
+
+    sin_extras = out["scenarios"]["sin_extras"]["delta"]
+    assert sin_extras["totals_by_slot"]["4"] == -8004
+    assert sin_extras["totals_by_person"]["Ana"]["extra"] == -8004
+    legacy = out["scenarios"]["bar2_legacy"]["delta"]
+    # 7002 pasa de inválido a "paga"
+    assert legacy["total"] == 7002
+    assert legacy["counts_by_slot"]["2"] == {"pagados": 1, "no_pagados": 0, "missing": 0, "invalid": -1}
+    assert legacy["deal_errors"] == -1
+    assert legacy["totals_by_person"] == {"Beto": {"label": "Beto", "base": 7002, "extra": 0, "total": 7002}}
+
+
+def test_overrides_cannot_change_what_is_fetched(make_cfg):
+    with pytest.raises(ValueError):
+        apply_overrides(make_cfg(), {"stage_ids": [1]})
+    with pytest.raises(ValueError):
+        apply_overrides(make_cfg(), {"bars": {"1": {"field_id": "Otro"}}})
+    with pytest.raises(ValueError):
+        apply_overrides(make_cfg(), {"bars": {"9": {"min": 1}}})
+
+
+def test_unknown_override_keys_are_rejected_by_name(make_cfg):
+    with pytest.raises(ValueError, match="extras_enabeld"):
+        apply_overrides(make_cfg(), {"extras_enabeld": False})
+    with pytest.raises(ValueError, match="max_value"):
+        apply_overrides(make_cfg(), {"bars": {"2": {"max_value": [5002]}}})
+    # formato Node sigue valiendo
+    assert apply_overrides(make_cfg(), {"bars": {"2": {"allowed": [2, 5002]}}}).bars["2"].max == 5002
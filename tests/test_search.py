@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import httpx
+
+from app.config import Settings
+from app.sell_client import SellClient
+from app.service import compute_months
+
+
+MAPPING = [
+    {"name": "FECHA DE CIRUGÍA", "search_api_id": "custom_fields.fecha_de_cirugia"},
+    *({"name": f"Colaborador{i}", "search_api_id": f"colaborador{i}"} for i in range(1, 4)),
+    *({"name": f"ComisionBAR{i}", "search_api_id": f"custom_fields.comisionbar{i}"} for i in range(1, 7)),
+    {"name": "Otro", "search_api_id": "custom_fields.otro"},
+]
+
+
+def _settings():
+    return Settings(SELL_ACCESS_TOKEN="t", MONTHLY_FETCH_MODE="search")
+
+
+def test_search_mode_projects_and_filters_on_server(make_cfg):
+    bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/v3/deals/custom_fields":
+            return httpx.Response(200, json={"items": [{"data": m} for m in MAPPING]})
+        assert request.url.path == "/v3/deals/search"
+        bodies.append(json.loads(request.content))
+        hit = {
+            "id": 7,
+            "stage_id": 10,
+            "custom_fields": {"fecha_de_cirugia": "2024-03-10", "comisionbar1": "8001", "colaborador1": "Ana"},
+        }
+        return httpx.Response(200, json={"items": [{"items": [{"data": hit}], "meta": {"links": {}}}]})
+
+    async def go():
+        async with SellClient("http://sell", "t", transport=httpx.MockTransport(handler)) as sell:
+            return await compute_months(sell, ["2024-03"], make_cfg(stage_ids=[10, 20]), _settings())
+
+    out = asyncio.run(go())["2024-03"]
+    assert out["month_matched_deals"] == 1
+    assert out["totals_by_slot"]["1"] == 8001
+    assert "Ana" in out["totals_by_person"]
+
+    query = bodies[0]["items"][0]["data"]["query"]
+    projected = {p["name"] for p in query["projection"]}
+    assert "custom_fields.otro" not in projected
+    assert {"custom_fields.fecha_de_cirugia", "custom_fields.colaborador1", "custom_fields.comisionbar6"} <= projected
+    stage_f, date_f = query["filter"]["and"]
+    assert stage_f["filter"]["parameter"] == {"any": [10, 20]}
+    assert date_f["filter"]["parameter"] == {"range": {"gte": "2024-03-01", "lte": "2024-03-31"}}
+
+
+def test_search_mode_falls_back_to_v2_on_403(make_cfg):
+    paths = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        if request.url.path.startswith("/v3/"):
+            return httpx.Response(403, json={})
+        deal = {"id": 1, "stage_id": 10, "custom_fields": {"FECHA DE CIRUGÍA": "2024-03-10", "ComisionBAR1": "1"}}
+        items = [{"data": deal}] if request.url.params["stage_id"] == "10" else []
+        return httpx.Response(200, json={"items": items})
+
+    async def go():
+        async with SellClient("http://sell", "t", transport=httpx.MockTransport(handler)) as sell:
+            first = await compute_months(sell, ["2024-03"], make_cfg(stage_ids=[10, 20]), _settings())
+            n_v3 = sum(p.startswith("/v3/") for p in paths)
+            await compute_months(sell, ["2024-03"], make_cfg(stage_ids=[10, 20]), _settings())
+            return first, n_v3, sell.search_forbidden
+
+    first, n_v3, forbidden = asyncio.run(go())
+    assert first["2024-03"]["totals_by_slot"]["1"] == 1
+    assert forbidden is True
+    # el segundo cálculo ya no intenta v3
+    assert sum(p.startswith("/v3/") for p in paths) == n_v3
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from app.rate_limit import RateScheduler, parse_retry_after, quota_pause
+from app.sell_client import SellClient
+
+
+def _fake_sell(deals_by_stage, per_page, calls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        stage_id = int(request.url.params["stage_id"])
+        page = int(request.url.params["page"])
+        calls.append((stage_id, page))
+        deals = deals_by_stage.get(stage_id, [])
+        chunk = deals[(page - 1) * per_page : page * per_page]
+        return httpx.Response(200, json={"items": [{"data": d} for d in chunk]})
+
+    return httpx.MockTransport(handler)
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_list_deals_by_stage_concurrent_pages_stop_on_short_page():
+    deals = {1: [{"id": i} for i in range(25)]}
+    calls = []
+
+    async def go():
+        transport = _fake_sell(deals, 10, calls)
+        async with SellClient("http://sell", "t", max_concurrency=4, transport=transport) as sell:
+            return await sell.list_deals_by_stage(1, per_page=10)
+
+    out = _run(go())
+    assert [d["id"] for d in out] == list(range(25))
+    # página 1 sola + tanda especulativa 2..5
+    assert sorted(p for _, p in calls) == [1, 2, 3, 4, 5]
+
+
+def test_list_deals_by_stages_dedupes_by_id():
+    deals = {1: [{"id": 1}, {"id": 2}], 2: [{"id": 2}, {"id": 3}]}
+    calls = []
+
+    async def go():
+        transport = _fake_sell(deals, 10, calls)
+        async with SellClient("http://sell", "t", max_concurrency=2, transport=transport) as sell:
+            return await sell.list_deals_by_stages([1, 2], per_page=10)
+
+    out = _run(go())
+    assert sorted(d["id"] for d in out) == [1, 2, 3]
+
+
+def test_429_pauses_all_requests_and_honours_retry_after():
+    started = []
+    state = {"throttled": False}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        started.append(time.monotonic())
+        if not state["throttled"]:
+            state["throttled"] = True
+            return httpx.Response(429, headers={"Retry-After": "0.2"}, json={})
+        return httpx.Response(200, json={"data": {"id": 1}})
+
+    async def go():
+        async with SellClient("http://sell", "t", max_concurrency=1, transport=httpx.MockTransport(handler)) as sell:
+            t0 = time.monotonic()
+            out = await asyncio.gather(*(sell.get_deal(1) for _ in range(3)))
+            return sell, t0, out
+
+    sell, t0, out = _run(go())
+    assert [d["id"] for d in out] == [1, 1, 1]
+    # después del 429 nadie sale antes de que venza Retry-After
+    assert all(t - t0 >= 0.19 for t in started[1:])
+    status = sell.scheduler.status()
+    assert status["throttled"] == 1
+    assert status["retries"] == 1
+    assert status["last_pause_s"] == 0.2
+
+
+def test_scheduler_halves_rate_and_concurrency_on_429_then_recovers():
+    async def go():
+        sched = RateScheduler(max_concurrency=8)
+        for _ in range(20):
+            sched.on_response(200, {})
+            await asyncio.sleep(0.005)
+        observed = sched.observed_rate()
+        sched.on_response(429, {"Retry-After": "0"})
+        after_429 = (sched.rate, sched.concurrency)
+        for _ in range(4):
+            sched.on_response(200, {})
+        return observed, after_429, sched
+
+    observed, (rate, concurrency), sched = _run(go())
+    assert concurrency == 4
+    assert rate == pytest.approx(observed / 2)
+    # aumento aditivo tras respuestas OK
+    assert sched.concurrency == 8
+    assert sched.rate > rate
+
+
+def test_token_bucket_limits_rate():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"data": {}})
+
+    async def go():
+        transport = httpx.MockTransport(handler)
+        async with SellClient(
+            "http://sell", "t", max_concurrency=4, transport=transport, rate_per_s=20, rate_burst=1
+        ) as sell:
+            t0 = time.monotonic()
+            await asyncio.gather(*(sell.get_deal(i) for i in range(5)))
+            return time.monotonic() - t0
+
+    # 1 de ráfaga + 4 a 20/s
+    assert _run(go()) >= 0.18
+
+
+def test_retry_after_and_quota_headers():
+    now = datetime(2024, 3, 1, 12, 0, 0, tzinfo=timezone.utc)
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Fri, 01 Mar 2024 12:00:05 GMT", now=now) == 5.0
+    assert parse_retry_after("mañana") is None
+    assert quota_pause({"x-ratelimit-remaining": "0", "x-ratelimit-reset": "2"}) == 2.0
+    assert quota_pause({"x-ratelimit-remaining": "10"}) is None
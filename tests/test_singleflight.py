@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    async def go():
+        sf = SingleFlight()
+        results = await asyncio.gather(*(sf.do("2024-03", work) for _ in range(5)))
+        return sf, results
+
+    sf, results = asyncio.run(go())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert sf.coalesced == 4
+    assert sf.in_flight() == 0
+
+
+def test_errors_propagate_to_all_waiters():
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("429")
+
+    async def go():
+        sf = SingleFlight()
+        return await asyncio.gather(*(sf.do("k", boom) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(go())
+    assert len(results) == 3
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_key_is_released_after_completion():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def go():
+        sf = SingleFlight()
+        return await sf.do("k", work), await sf.do("k", work)
+
+    assert asyncio.run(go()) == (1, 2)
+
+
+def test_waiter_cancellation_does_not_cancel_shared_work():
+    async def go():
+        sf = SingleFlight()
+        done = asyncio.Event()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            done.set()
+            return 1
+
+        first = asyncio.ensure_future(sf.do("k", work))
+        second = asyncio.ensure_future(sf.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, done.is_set()
+
+    assert asyncio.run(go()) == (1, True)
@@ -0,0 +1,84 @@
+import gzip
+
+import pytest
+
+from app.calculator import calc_month
+from app.snapshot import SnapshotReader, SnapshotWriter
+
+
+def _deals():
+    return [
+        {
+            "id": i,
+            "name": f"Deal {i}",
+            "stage_id": 10693256,
+            "updated_at": "2024-03-01T10:00:00Z",
+            "value": 1000,
+            "tags": ["vip"],
+            "custom_fields": {
+                "FECHA DE CIRUGÍA": f"2024-03-{i:02d}",
+                "ComisionBAR1": "8001" if i % 2 else "1",
+                "ComisionBAR4": {"id": 9004, "name": "paga"},
+                "Colaborador1": "Ana",
+                "Notas": "x" * 200,
+            },
+        }
+        for i in range(1, 21)
+    ]
+
+
+def test_dump_is_trimmed_and_replays_the_same_month(tmp_path, make_cfg):
+    cfg = make_cfg()
+    path = str(tmp_path / "deals.ndjson.gz")
+    with SnapshotWriter(path, cfg) as writer:
+        for deal in _deals():
+            writer.write(deal)
+    assert writer.count == 20
+
+    with SnapshotReader(path) as snap:
+        assert snap.header["stage_ids"] == [10693256]
+        assert snap.missing_fields(cfg) == []
+        replayed = list(snap)
+
+    assert "value" not in replayed[0] and "tags" not in replayed[0]
+    assert "Notas" not in replayed[0]["custom_fields"]
+    assert calc_month(cfg, replayed, 2024, 3) == calc_month(cfg, _deals(), 2024, 3)
+
+
+def test_reader_streams_and_reports_missing_fields(tmp_path, make_cfg):
+    cfg = make_cfg()
+    path = str(tmp_path / "deals.ndjson.gz")
+    with SnapshotWriter(path, cfg) as writer:
+        writer.write(_deals()[0])
+
+    other = cfg.model_copy(update={"fecha_cirugia_field_id": "OTRA FECHA"})
+    with SnapshotReader(path) as snap:
+        assert snap.missing_fields(other) == ["OTRA FECHA"]
+        it = iter(snap)
+        assert next(it)["id"] == 1
+
+
+def test_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "otro.ndjson.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        fh.write('{"id": 1}\n')
+    with pytest.raises(ValueError):
+        SnapshotReader(str(path))
+
+
+def test_failed_dump_leaves_no_snapshot(tmp_path, make_cfg):
+    cfg = make_cfg()
+    path = tmp_path / "deals.ndjson.gz"
+    with SnapshotWriter(str(path), cfg) as writer:
+        writer.write(_deals()[0])
+    before = path.read_bytes()
+
+    with pytest.raises(RuntimeError):
+        with SnapshotWriter(str(path), cfg) as writer:
+            for deal in _deals():
+                writer.write(deal)
+            raise RuntimeError("Sell se cayó a mitad de la descarga")
+
+    # el snapshot anterior sigue intacto y no queda el archivo parcial
+    assert path.read_bytes() == before
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["deals.ndjson.gz"]